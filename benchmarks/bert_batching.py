@@ -0,0 +1,107 @@
+"""Benchmark the length-bucketed batching of MycoAI-BERT against fixed-size batches.
+
+Usage:
+    python benchmarks/bert_batching.py [FASTA_FILE] [--n-records N] [--batch-size N]
+        [--max-batch-tokens N] [--repeat N]
+
+Without a FASTA file, ITS sequences of varied lengths are generated like `tests/data/query.fasta`,
+by default 2,000 records taken from `tests/data/database.fasta` and cut to random lengths between
+20% and 100% of the original sequences, as for partial ITS reads.
+"""
+
+from __future__ import annotations
+import argparse
+import os
+import random
+import shutil
+import tempfile
+import time
+import types
+import numpy as np
+from taxotagger import ProjectConfig
+from taxotagger.models import ModelFactory
+from taxotagger.models import MycoAIBERTEmbedModel
+from taxotagger.models import _MycoAIEmbedModel
+from taxotagger.utils import iter_fasta
+from taxotagger.utils import write_fasta
+
+
+DATA_DIR = os.path.join(os.path.dirname(__file__), os.pardir, "tests", "data")
+
+
+def generate_fasta(fasta_file: str, n_records: int = 2000, seed: int = 0) -> None:
+    """Write a FASTA file with the database sequences cut to random lengths."""
+    rng = random.Random(seed)
+    records = list(iter_fasta(os.path.join(DATA_DIR, "database.fasta")))
+    sequences = []
+    for i in range(n_records):
+        header, seq = records[i % len(records)]
+        accession, _, taxonomy = header.partition("|")
+        length = rng.randint(len(seq) // 5, len(seq))
+        start = rng.randint(0, len(seq) - length)
+        sequences.append((f"{accession}_{i}|{taxonomy}", seq[start : start + length]))
+    write_fasta(sequences, fasta_file)
+
+
+def measure(
+    model: MycoAIBERTEmbedModel, fasta_file: str, batch_size: int, repeat: int
+) -> tuple[float, list[np.ndarray]]:
+    """Get the best time of the inference of all sequences, and the embeddings."""
+    _, encoded_data = model.parse_and_encode_fasta(fasta_file)
+    best = float("inf")
+    outputs: list[np.ndarray] = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        outputs = model.infer(encoded_data, batch_size)
+        best = min(best, time.perf_counter() - start)
+    return best, outputs
+
+
+def main() -> None:
+    """Run the benchmark."""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("fasta_file", nargs="?", help="The FASTA file of the query sequences")
+    parser.add_argument("--n-records", type=int, default=2000, help="The synthetic records")
+    parser.add_argument("--batch-size", type=int, default=64, help="The sequences per batch")
+    parser.add_argument("--max-batch-tokens", type=int, help="The token budget per batch")
+    parser.add_argument("--repeat", type=int, default=3, help="The number of repetitions")
+    args = parser.parse_args()
+
+    tmp_dir = tempfile.mkdtemp()
+    try:
+        fasta_file = args.fasta_file
+        if fasta_file is None:
+            fasta_file = os.path.join(tmp_dir, "query.fasta")
+            generate_fasta(fasta_file, args.n_records)
+        n_records = sum(1 for _ in iter_fasta(fasta_file))
+
+        config = ProjectConfig(max_batch_tokens=args.max_batch_tokens)
+        model = ModelFactory.get_model("MycoAI-BERT", config)
+
+        # fixed-size batches, all sequences padded to the longest sequence of the file
+        model._iter_batches = types.MethodType(_MycoAIEmbedModel._iter_batches, model)
+        fixed_seconds, fixed_outputs = measure(model, fasta_file, args.batch_size, args.repeat)
+        del model._iter_batches
+        bucketed_seconds, bucketed_outputs = measure(
+            model, fasta_file, args.batch_size, args.repeat
+        )
+
+        max_diff = max(
+            float(np.abs(fixed - bucketed).max())
+            for fixed, bucketed in zip(fixed_outputs, bucketed_outputs)
+        )
+
+        print(f"{fasta_file}: {n_records} records, batch size {args.batch_size}")
+        print(f"{'batching':<12}{'seconds':>10}{'seqs/s':>10}{'speedup':>10}")
+        for name, seconds in (("fixed", fixed_seconds), ("bucketed", bucketed_seconds)):
+            print(
+                f"{name:<12}{seconds:>10.3f}{n_records / seconds:>10.1f}"
+                f"{fixed_seconds / seconds:>9.1f}x"
+            )
+        print(f"max abs difference of the embeddings: {max_diff:.2e}")
+    finally:
+        shutil.rmtree(tmp_dir)
+
+
+if __name__ == "__main__":
+    main()
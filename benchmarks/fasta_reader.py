@@ -0,0 +1,96 @@
+"""Benchmark the throughput of the FASTA reader against Bio.SeqIO.
+
+Usage:
+    python benchmarks/fasta_reader.py [FASTA_FILE] [--repeat N]
+
+Without a FASTA file, a synthetic file with 100,000 ITS-like records is generated in a
+temporary directory. The gzip-compressed copy of the file is benchmarked as well.
+"""
+
+from __future__ import annotations
+import argparse
+import gzip
+import os
+import random
+import shutil
+import tempfile
+import time
+from typing import Callable
+from typing import Iterator
+from Bio import SeqIO
+from taxotagger.utils import iter_fasta
+
+
+def seqio_iter_fasta(fasta_file: str) -> Iterator[tuple[str, str]]:
+    """The previous `iter_fasta` implementation based on `Bio.SeqIO`."""
+    opener = gzip.open if fasta_file.endswith(".gz") else open
+    with opener(fasta_file, "rt") as fh:
+        for record in SeqIO.parse(fh, "fasta"):
+            yield record.description, str(record.seq)
+
+
+def generate_fasta(fasta_file: str, n_records: int = 100_000, seed: int = 0) -> None:
+    """Write a FASTA file with UNITE-like headers and 60-column wrapped sequences."""
+    rng = random.Random(seed)
+    with open(fasta_file, "w") as fh:
+        for i in range(n_records):
+            seq = "".join(rng.choices("ACGT", k=rng.randint(400, 800)))
+            fh.write(
+                f">SEQ{i:07d}|k__Fungi;p__Ascomycota;c__Class{i % 70};o__Order{i % 231};"
+                f"f__Family{i % 791};g__Genus{i % 3695};s__Species_{i % 14742}|SH{i}.10FU\n"
+            )
+            for start in range(0, len(seq), 60):
+                fh.write(seq[start : start + 60] + "\n")
+
+
+def measure(reader: Callable[[str], Iterator], fasta_file: str, repeat: int) -> tuple[float, int]:
+    """Get the best time of reading all records of the file, and the number of records."""
+    best = float("inf")
+    n_records = 0
+    for _ in range(repeat):
+        start = time.perf_counter()
+        n_records = sum(1 for _ in reader(fasta_file))
+        best = min(best, time.perf_counter() - start)
+    return best, n_records
+
+
+def main() -> None:
+    """Run the benchmark."""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("fasta_file", nargs="?", help="The FASTA file to read")
+    parser.add_argument("--repeat", type=int, default=3, help="The number of repetitions")
+    args = parser.parse_args()
+
+    tmp_dir = tempfile.mkdtemp()
+    try:
+        fasta_file = args.fasta_file
+        if fasta_file is None:
+            fasta_file = os.path.join(tmp_dir, "synthetic.fasta")
+            generate_fasta(fasta_file)
+        gz_file = os.path.join(tmp_dir, os.path.basename(fasta_file) + ".gz")
+        with open(fasta_file, "rb") as src, gzip.open(gz_file, "wb", compresslevel=1) as dst:
+            shutil.copyfileobj(src, dst)
+        size_mb = os.path.getsize(fasta_file) / (1024 * 1024)
+
+        # the readers must give the same records
+        assert list(iter_fasta(fasta_file)) == list(seqio_iter_fasta(fasta_file))
+
+        print(f"{fasta_file}: {size_mb:.1f} MB")
+        print(
+            f"{'reader':<12}{'input':<8}{'records':>10}{'seconds':>10}{'MB/s':>10}{'speedup':>10}"
+        )
+        for label, path in (("plain", fasta_file), ("gzip", gz_file)):
+            baseline = None
+            for name, reader in (("Bio.SeqIO", seqio_iter_fasta), ("iter_fasta", iter_fasta)):
+                seconds, n_records = measure(reader, path, args.repeat)
+                baseline = baseline or seconds
+                print(
+                    f"{name:<12}{label:<8}{n_records:>10}{seconds:>10.3f}"
+                    f"{size_mb / seconds:>10.1f}{baseline / seconds:>9.1f}x"
+                )
+    finally:
+        shutil.rmtree(tmp_dir)
+
+
+if __name__ == "__main__":
+    main()
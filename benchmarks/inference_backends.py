@@ -0,0 +1,100 @@
+"""Benchmark the optimized inference backends of the MycoAI models against eager mode.
+
+Usage:
+    python benchmarks/inference_backends.py [FASTA_FILE] [--model MODEL_ID] [--n-records N]
+        [--num-threads N] [--repeat N]
+
+Without a FASTA file, the 50 sequences of `tests/data/database.fasta` are repeated to 1,000
+records by default. The time of tracing or compiling the model is excluded, it is paid once per
+process.
+"""
+
+from __future__ import annotations
+import argparse
+import itertools
+import os
+import shutil
+import tempfile
+import time
+import numpy as np
+from taxotagger import ProjectConfig
+from taxotagger.models import ModelFactory
+from taxotagger.utils import iter_fasta
+from taxotagger.utils import write_fasta
+
+
+DATA_DIR = os.path.join(os.path.dirname(__file__), os.pardir, "tests", "data")
+
+# (name, inference_backend, inference_dtype)
+VARIANTS = [
+    ("eager", "eager", "float32"),
+    ("trace", "trace", "float32"),
+    ("compile", "compile", "float32"),
+    ("eager bf16", "eager", "bfloat16"),
+    ("trace bf16", "trace", "bfloat16"),
+]
+
+
+def generate_fasta(fasta_file: str, n_records: int = 1000) -> None:
+    """Write a FASTA file with the database sequences repeated to `n_records` records."""
+    records = list(iter_fasta(os.path.join(DATA_DIR, "database.fasta")))
+    write_fasta(
+        [
+            (f"{header.partition('|')[0]}_{i}", seq)
+            for i, (header, seq) in zip(range(n_records), itertools.cycle(records))
+        ],
+        fasta_file,
+    )
+
+
+def main() -> None:
+    """Run the benchmark."""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("fasta_file", nargs="?", help="The FASTA file of the query sequences")
+    parser.add_argument("--model", default="MycoAI-CNN", help="The model identifier")
+    parser.add_argument("--n-records", type=int, default=1000, help="The synthetic records")
+    parser.add_argument("--num-threads", type=int, help="The intra-op threads of PyTorch")
+    parser.add_argument("--repeat", type=int, default=3, help="The number of repetitions")
+    args = parser.parse_args()
+
+    tmp_dir = tempfile.mkdtemp()
+    try:
+        fasta_file = args.fasta_file
+        if fasta_file is None:
+            fasta_file = os.path.join(tmp_dir, "query.fasta")
+            generate_fasta(fasta_file, args.n_records)
+
+        config = ProjectConfig(num_threads=args.num_threads)
+        model = ModelFactory.get_model(args.model, config)
+        _, encoded_data = model.parse_and_encode_fasta(fasta_file)
+        n_records = len(encoded_data)
+
+        print(f"{fasta_file}: {n_records} records, model {args.model}")
+        print(f"{'variant':<14}{'seconds':>10}{'seqs/s':>10}{'speedup':>10}{'max diff':>12}")
+        baseline_seconds, baseline_outputs = None, None
+        for name, backend, dtype in VARIANTS:
+            config.inference_backend = backend
+            config.inference_dtype = dtype
+            # trace or compile the model before the timing
+            outputs = model.infer(encoded_data)
+            best = float("inf")
+            for _ in range(args.repeat):
+                start = time.perf_counter()
+                outputs = model.infer(encoded_data)
+                best = min(best, time.perf_counter() - start)
+            baseline_seconds = baseline_seconds or best
+            baseline_outputs = baseline_outputs or outputs
+            max_diff = max(
+                float(np.abs(output - baseline).max())
+                for output, baseline in zip(outputs, baseline_outputs)
+            )
+            print(
+                f"{name:<14}{best:>10.3f}{n_records / best:>10.1f}"
+                f"{baseline_seconds / best:>9.1f}x{max_diff:>12.2e}"
+            )
+    finally:
+        shutil.rmtree(tmp_dir)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,64 @@
+"""Benchmark the dynamic int8 quantization of the MycoAI models against the float32 models.
+
+Usage:
+    python benchmarks/quantization.py [FASTA_FILE] [--model MODEL_ID] [--repeat N]
+
+Without a FASTA file, the sequences of `tests/data/database.fasta` are used. The top-1 agreement
+is the fraction of sequences whose highest scoring taxon of the quantized model is the same as
+that of the float32 model, at each taxonomy level.
+"""
+
+from __future__ import annotations
+import argparse
+import os
+import time
+import numpy as np
+from taxotagger import ProjectConfig
+from taxotagger.defaults import TAXONOMY_LEVELS
+from taxotagger.models import ModelFactory
+from taxotagger.models import _get_model_memory
+
+
+DATA_DIR = os.path.join(os.path.dirname(__file__), os.pardir, "tests", "data")
+
+
+def main() -> None:
+    """Run the benchmark."""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("fasta_file", nargs="?", help="The FASTA file of the query sequences")
+    parser.add_argument("--model", default="MycoAI-CNN", help="The model identifier")
+    parser.add_argument("--repeat", type=int, default=3, help="The number of repetitions")
+    args = parser.parse_args()
+    fasta_file = args.fasta_file or os.path.join(DATA_DIR, "database.fasta")
+
+    results = {}
+    for quantize in (None, "dynamic-int8"):
+        model = ModelFactory.get_model(args.model, ProjectConfig(quantize=quantize))
+        _, encoded_data = model.parse_and_encode_fasta(fasta_file)
+        best = float("inf")
+        for _ in range(args.repeat):
+            start = time.perf_counter()
+            outputs = model.infer(encoded_data)
+            best = min(best, time.perf_counter() - start)
+        results[quantize] = (best, _get_model_memory(model), outputs)
+
+    n_records = len(encoded_data)
+    print(f"{fasta_file}: {n_records} records, model {args.model}")
+    print(f"{'model':<14}{'seconds':>10}{'seqs/s':>10}{'speedup':>10}{'MB':>10}")
+    baseline = results[None][0]
+    for quantize, (seconds, memory, _) in results.items():
+        print(
+            f"{quantize or 'float32':<14}{seconds:>10.3f}{n_records / seconds:>10.1f}"
+            f"{baseline / seconds:>9.1f}x{memory / 1024 / 1024:>10.1f}"
+        )
+
+    print(f"{'level':<14}{'top-1 agreement':>16}")
+    for level, expected, output in zip(
+        TAXONOMY_LEVELS, results[None][2], results["dynamic-int8"][2]
+    ):
+        agreement = np.mean(output.argmax(axis=1) == expected.argmax(axis=1))
+        print(f"{level:<14}{agreement:>16.2%}")
+
+
+if __name__ == "__main__":
+    main()
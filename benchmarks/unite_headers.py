@@ -0,0 +1,82 @@
+"""Benchmark the bulk UNITE header parser against parsing one header at a time.
+
+Usage:
+    python benchmarks/unite_headers.py [FASTA_FILE] [--n-headers N] [--repeat N]
+
+Without a FASTA file, synthetic UNITE headers are generated, by default 1,000,000 headers where
+the taxonomy is determined by one of 14,742 species, as in the UNITE database.
+"""
+
+from __future__ import annotations
+import argparse
+import time
+from typing import Callable
+from taxotagger.utils import iter_fasta
+from taxotagger.utils import parse_unite_fasta_header
+from taxotagger.utils import parse_unite_fasta_headers
+
+
+def generate_headers(n_headers: int = 1_000_000, n_species: int = 14742) -> list[str]:
+    """Generate UNITE headers, with the higher taxonomy levels derived from the species."""
+    headers = []
+    for i in range(n_headers):
+        species = (i * 7919) % n_species
+        genus = species // 4
+        family = genus // 5
+        order = family // 3
+        class_ = order // 3
+        phylum = class_ // 4
+        headers.append(
+            f"SEQ{i:07d}|k__Fungi;p__Phylum{phylum};c__Class{class_};o__Order{order};"
+            f"f__Family{family};g__Genus{genus};s__Genus{genus}_species{species}|SH{i}.10FU"
+        )
+    return headers
+
+
+def parse_one_by_one(headers: list[str]) -> list[list[str]]:
+    """The previous way of parsing the headers, one `parse_unite_fasta_header` call per header."""
+    return [parse_unite_fasta_header(header) for header in headers]
+
+
+def measure(parser: Callable[[list[str]], object], headers: list[str], repeat: int) -> float:
+    """Get the best time of parsing all headers."""
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        parser(headers)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main() -> None:
+    """Run the benchmark."""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("fasta_file", nargs="?", help="The FASTA file to read the headers from")
+    parser.add_argument("--n-headers", type=int, default=1_000_000, help="The synthetic headers")
+    parser.add_argument("--repeat", type=int, default=3, help="The number of repetitions")
+    args = parser.parse_args()
+
+    if args.fasta_file is None:
+        headers = generate_headers(args.n_headers)
+    else:
+        headers = [header for header, _ in iter_fasta(args.fasta_file)]
+
+    # the parsers must give the same metadata
+    assert parse_unite_fasta_headers(headers).tolist() == parse_one_by_one(headers)
+
+    print(f"{len(headers)} headers")
+    print(f"{'parser':<28}{'seconds':>10}{'headers/s':>14}{'speedup':>10}")
+    baseline = None
+    for name, parse in (
+        ("parse_unite_fasta_header", parse_one_by_one),
+        ("parse_unite_fasta_headers", parse_unite_fasta_headers),
+    ):
+        seconds = measure(parse, headers, args.repeat)
+        baseline = baseline or seconds
+        print(
+            f"{name:<28}{seconds:>10.3f}{len(headers) / seconds:>14,.0f}{baseline / seconds:>9.1f}x"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -1,7 +1,13 @@
+import importlib
 import logging
+from typing import TYPE_CHECKING
+from typing import Any
 from .config import ProjectConfig
-from .logger import setup_logging
-from .taxotagger import TaxoTagger
+
+
+if TYPE_CHECKING:
+    from .logger import setup_logging
+    from .taxotagger import TaxoTagger
 
 
 logging.getLogger(__name__).addHandler(logging.NullHandler())
@@ -11,3 +17,22 @@ __email__ = "c.geng@esciencecenter.nl"
 __version__ = "0.0.1-alpha.7"
 
 __all__ = ["ProjectConfig", "setup_logging", "TaxoTagger"]
+
+# The attributes imported from their modules on first access, so that `import taxotagger` and
+# `from taxotagger import ProjectConfig` stay fast for short-lived jobs and worker processes
+_LAZY_ATTRIBUTES = {
+    "setup_logging": ".logger",
+    "TaxoTagger": ".taxotagger",
+}
+
+
+def __getattr__(name: str) -> Any:
+    if name in _LAZY_ATTRIBUTES:
+        value = getattr(importlib.import_module(_LAZY_ATTRIBUTES[name], __name__), name)
+        globals()[name] = value
+        return value
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+def __dir__() -> list[str]:
+    return sorted([*globals(), *_LAZY_ATTRIBUTES])
@@ -2,6 +2,13 @@ from __future__ import annotations
 from abc import ABC
 from abc import abstractmethod
 from typing import Any
+from typing import Iterator
+from typing import Literal
+from typing import overload
+import numpy as np
+from .embeddings import EmbeddingBatch
+from .utils import iter_fasta_chunks
+from .utils import temporary_fasta
 
 
 class EmbedModelBase(ABC):
@@ -10,12 +17,52 @@ class EmbedModelBase(ABC):
     name: str
     """The name of the pretrained model used for embedding."""
 
+    @overload
+    def embed(
+        self,
+        fasta_file: str,
+        batch_size: int | None = None,
+        as_batch: Literal[False] = False,
+        levels: list[str] | None = None,
+    ) -> dict[str, list[dict[str, Any]]]: ...
+
+    @overload
+    def embed(
+        self,
+        fasta_file: str,
+        batch_size: int | None = None,
+        *,
+        as_batch: Literal[True],
+        levels: list[str] | None = None,
+    ) -> EmbeddingBatch: ...
+
+    @overload
+    def embed(
+        self,
+        fasta_file: str,
+        batch_size: int | None = None,
+        as_batch: bool = False,
+        levels: list[str] | None = None,
+    ) -> dict[str, list[dict[str, Any]]] | EmbeddingBatch: ...
+
     @abstractmethod
-    def embed(self, fasta_file: str) -> dict[str, list[dict[str, Any]]]:
+    def embed(
+        self,
+        fasta_file: str,
+        batch_size: int | None = None,
+        as_batch: bool = False,
+        levels: list[str] | None = None,
+    ) -> dict[str, list[dict[str, Any]]] | EmbeddingBatch:
         """Calculate the embeddings for the given FASTA file.
 
         Args:
             fasta_file: The path to the FASTA file to embed.
+            batch_size: The number of sequences per forward pass of the model. If `None`, the
+                model should use the `batch_size` of the project configuration.
+            as_batch: Whether to return an [`EmbeddingBatch`][taxotagger.embeddings.EmbeddingBatch]
+                instead of the dictionary described below.
+            levels: The taxonomy levels to return the embeddings of. The model should skip the
+                work specific to the other levels. If `None`, all taxonomy levels are returned.
 
         Returns:
             A dictionary of embeddings for each taxonomy level.
@@ -46,3 +93,170 @@ class EmbedModelBase(ABC):
                 ```
         """
         ...
+
+    def embed_iter(
+        self,
+        fasta_file: str,
+        chunk_size: int,
+        batch_size: int | None = None,
+        as_batch: bool = False,
+        levels: list[str] | None = None,
+    ) -> Iterator[dict[str, list[dict[str, Any]]] | EmbeddingBatch]:
+        """Calculate the embeddings for the given FASTA file chunk by chunk.
+
+        The FASTA file is read lazily, and each chunk of `chunk_size` sequences is embedded and
+        yielded before the next chunk is read, so the memory usage is bounded by the chunk size
+        instead of the file size.
+
+        The default implementation writes each chunk to a temporary FASTA file and calls
+        [`embed`][taxotagger.abc.EmbedModelBase.embed] on it. Subclasses can override this method
+        if they can embed the records directly.
+
+        Each chunk is embedded on its own, so if `embed` skips repeated sequences, only the
+        sequences repeated within a chunk are skipped, not those repeated in different chunks.
+
+        Args:
+            fasta_file: The path to the FASTA file to embed.
+            chunk_size: The maximum number of sequences in each chunk.
+            batch_size: The number of sequences per forward pass of the model.
+            as_batch: Whether to yield [`EmbeddingBatch`][taxotagger.embeddings.EmbeddingBatch]
+                objects instead of dictionaries.
+            levels: The taxonomy levels to return the embeddings of. Defaults to all levels.
+
+        Yields:
+            The embeddings of each chunk, in the same format as the output of
+                [`embed`][taxotagger.abc.EmbedModelBase.embed].
+        """
+        for records in iter_fasta_chunks(fasta_file, chunk_size):
+            with temporary_fasta(records) as chunk_file:
+                embeddings = self.embed(
+                    chunk_file, batch_size=batch_size, as_batch=as_batch, levels=levels
+                )
+            yield embeddings
+
+    def encode_records(self, records: list[tuple[str, str]]) -> Any:
+        """Prepare FASTA records for [`embed_encoded`][taxotagger.abc.EmbedModelBase.embed_encoded].
+
+        Embedding is split into this CPU-bound step, e.g. parsing the headers and encoding the
+        sequences, and the model inference in `embed_encoded`, so that
+        [`TaxoTagger`][taxotagger.TaxoTagger] can encode the next chunk of records while the
+        model runs on the current one, see [`Pipeline`][taxotagger.pipeline.Pipeline].
+
+        The default implementation returns the records unchanged. Subclasses can override both
+        methods to move work out of the inference step.
+
+        Args:
+            records: The `(header, sequence)` pairs to encode.
+
+        Returns:
+            The input of `embed_encoded`.
+        """
+        return records
+
+    def embed_encoded(
+        self, encoded: Any, batch_size: int | None = None, levels: list[str] | None = None
+    ) -> EmbeddingBatch:
+        """Calculate the embeddings of records prepared by `encode_records`.
+
+        The default implementation writes the records to a temporary FASTA file and calls
+        [`embed`][taxotagger.abc.EmbedModelBase.embed] on it.
+
+        Args:
+            encoded: The output of [`encode_records`][taxotagger.abc.EmbedModelBase.encode_records].
+            batch_size: The number of sequences per forward pass of the model.
+            levels: The taxonomy levels to return the embeddings of. Defaults to all levels.
+
+        Returns:
+            The embeddings of the records.
+        """
+        with temporary_fasta(encoded) as chunk_file:
+            return self.embed(chunk_file, batch_size=batch_size, as_batch=True, levels=levels)
+
+
+class VectorStoreBase(ABC):
+    """Base class for vector stores.
+
+    A vector store holds one collection per [taxonomy level][taxotagger.defaults.TAXONOMY_LEVELS].
+    Each collection contains the embedding vectors of the reference sequences on that taxonomy
+    level, with the sequence id, the label of the taxonomy level and other metadata.
+    """
+
+    name: str
+    """The name of the vector store backend."""
+
+    extension: str
+    """The file extension of the databases of the vector store, e.g. `.db`."""
+
+    @abstractmethod
+    def __init__(self, db_path: str) -> None:
+        """Open the database, creating it if it does not exist.
+
+        Args:
+            db_path: The path to the database, or the URI of a database server.
+        """
+        ...
+
+    @abstractmethod
+    def create_collections(
+        self,
+        dims: dict[str, int],
+        index_params: dict[str, dict[str, Any]],
+        vector_dtype: dict[str, str] | None = None,
+    ) -> None:
+        """Create an empty collection for each taxonomy level, replacing the existing ones.
+
+        Args:
+            dims: The dimensions of the embeddings for each taxonomy level.
+            index_params: The vector index for each taxonomy level, as dictionaries with the keys
+                `index_type` and `params`. Taxonomy levels without index parameters should use
+                an exact index.
+            vector_dtype: The dtype of the stored vectors for each taxonomy level, `"float32"`,
+                `"float16"` or `"int8"`. Stores without support for a dtype should fall back to
+                a higher precision. Defaults to `"float32"` for all taxonomy levels.
+        """
+        ...
+
+    @abstractmethod
+    def insert(self, batch: EmbeddingBatch) -> None:
+        """Insert the embeddings into the collections of all taxonomy levels.
+
+        Args:
+            batch: The embeddings and metadata of the sequences.
+        """
+        ...
+
+    @abstractmethod
+    def search(
+        self,
+        taxo_level: str,
+        vectors: np.ndarray,
+        output_fields: list[str],
+        **kwargs: Any,
+    ) -> list[list[dict]]:
+        """Search the query vectors in the collection of a taxonomy level by cosine similarity.
+
+        Args:
+            taxo_level: The taxonomy level of the collection.
+            vectors: The query vectors with shape `(n_queries, n_features)`.
+            output_fields: The metadata fields to include in the search results.
+            kwargs: Additional search parameters, e.g. `limit`, the number of hits to return
+                for each query.
+
+        Returns:
+            The hits of each query vector, most similar first. Each hit is a dictionary like
+                `{"id": "seq1", "distance": 0.98, "entity": {"phylum": "Ascomycota"}}`, where the
+                `distance` is the cosine similarity.
+        """
+        ...
+
+    def flush(self) -> None:
+        """Persist the inserted embeddings.
+
+        Stores that write the inserted embeddings immediately don't need to override this method.
+        """
+        pass
+
+    @abstractmethod
+    def close(self) -> None:
+        """Release the resources of the vector store and persist pending changes."""
+        ...
@@ -0,0 +1,299 @@
+from __future__ import annotations
+import copy
+import hashlib
+import logging
+import os
+import shutil
+import sqlite3
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from contextlib import closing
+from os import PathLike
+from pathlib import Path
+import numpy as np
+from .config import ProjectConfig
+
+
+logger = logging.getLogger(__name__)
+
+_checksums: dict[tuple[str, int, int], str] = {}
+"""Memoized file checksums, keyed by (path, size, modification time)."""
+
+
+def sequence_hash(sequence: str) -> str:
+    """Get the hash of a DNA sequence, ignoring the letter case.
+
+    Args:
+        sequence: The DNA sequence.
+
+    Returns:
+        The SHA-1 hex digest of the upper case sequence.
+    """
+    return hashlib.sha1(sequence.upper().encode()).hexdigest()
+
+
+def file_checksum(file: str | PathLike) -> str:
+    """Get the SHA-256 checksum of a file.
+
+    The checksum is memoized for the file path, size and modification time, so the file is only
+    read again when it has changed.
+
+    Args:
+        file: The path to the file.
+
+    Returns:
+        The SHA-256 hex digest of the file content.
+    """
+    stat = os.stat(file)
+    key = (os.path.abspath(file), stat.st_size, stat.st_mtime_ns)
+    if key not in _checksums:
+        sha256 = hashlib.sha256()
+        with open(file, "rb") as fh:
+            for block in iter(lambda: fh.read(1024 * 1024), b""):
+                sha256.update(block)
+        _checksums[key] = sha256.hexdigest()
+    return _checksums[key]
+
+
+class EmbeddingCache:
+    """On-disk cache of sequence embeddings for one embedding model.
+
+    The embeddings are keyed by the [hash of the sequence][taxotagger.cache.sequence_hash] and
+    stored in segments. A segment holds the embeddings of the sequences cached together, as one
+    `.npy` matrix per taxonomy level, which is read with memory mapping. An SQLite index maps the
+    sequence hashes to the rows of the segments.
+
+    When the total size of the segments exceeds `max_size` bytes, the least recently used segments
+    are evicted.
+
+    Examples:
+        >>> cache = EmbeddingCache.for_model(ProjectConfig(), "MycoAI-CNN")
+        >>> hit_indices, hit_vectors = cache.get([sequence_hash("ACGT")])
+    """
+
+    def __init__(self, cache_dir: str | PathLike, max_size: int) -> None:
+        """Initialize the cache.
+
+        Args:
+            cache_dir: The directory of the cache. It is created if it does not exist.
+            max_size: The maximum total size of the cached embeddings in bytes.
+        """
+        self.cache_dir = Path(cache_dir)
+        self.max_size = max_size
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        with closing(self._connect()) as conn, conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS entries "
+                "(seq_hash TEXT PRIMARY KEY, segment TEXT NOT NULL, row INTEGER NOT NULL)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS entries_segment ON entries (segment)")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS segments "
+                "(name TEXT PRIMARY KEY, size INTEGER NOT NULL, last_access REAL NOT NULL)"
+            )
+
+    @classmethod
+    def for_model(cls, config: ProjectConfig, model_id: str) -> EmbeddingCache:
+        """Get the embedding cache for a pretrained model.
+
+        The cache directory is `{mycoai_home}/embedding_cache/{model_id}-{checksum}`, where the
+        checksum is computed from the model file `{mycoai_home}/{model_id}.pt`, so the cached
+        embeddings are not reused when the model file changes. The `quantize` and
+        `inference_dtype` of the project configuration other than the defaults are appended to
+        the directory name, as they change the embeddings of the model.
+
+        Args:
+            config: The configurations for the project.
+            model_id: The identifier of the model, the model file must exist.
+
+        Returns:
+            The embedding cache for the model.
+        """
+        checksum = file_checksum(Path(config.mycoai_home) / f"{model_id}.pt")
+        name = f"{model_id}-{checksum[:16]}"
+        if config.quantize is not None:
+            name += f"-{config.quantize}"
+        if config.inference_dtype != "float32":
+            name += f"-{config.inference_dtype}"
+        cache_dir = Path(config.mycoai_home) / "embedding_cache" / name
+        return cls(cache_dir, config.embedding_cache_max_size * 1024 * 1024)
+
+    def get(self, seq_hashes: list[str]) -> tuple[list[int], dict[str, np.ndarray]]:
+        """Get the cached embeddings of the sequences.
+
+        Args:
+            seq_hashes: The hashes of the sequences.
+
+        Returns:
+            A tuple of the indices of `seq_hashes` found in the cache, and the embedding matrices
+                for each taxonomy level. The rows of the matrices are in the order of the indices.
+        """
+        with closing(self._connect()) as conn, conn:
+            locations = {}
+            for i in range(0, len(seq_hashes), 500):
+                part = seq_hashes[i : i + 500]
+                rows = conn.execute(
+                    "SELECT seq_hash, segment, row FROM entries "
+                    f"WHERE seq_hash IN ({','.join('?' * len(part))})",
+                    part,
+                ).fetchall()
+                locations.update({seq_hash: (segment, row) for seq_hash, segment, row in rows})
+
+            hit_indices = [i for i, seq_hash in enumerate(seq_hashes) if seq_hash in locations]
+            if not hit_indices:
+                return [], {}
+
+            # group the rows by segment, keeping the position of each hit in the output
+            by_segment: dict[str, tuple[list[int], list[int]]] = {}
+            for position, i in enumerate(hit_indices):
+                segment, row = locations[seq_hashes[i]]
+                positions, rows = by_segment.setdefault(segment, ([], []))
+                positions.append(position)
+                rows.append(row)
+
+            vectors: dict[str, np.ndarray] = {}
+            for segment, (positions, rows) in by_segment.items():
+                for npy_file in sorted((self.cache_dir / segment).glob("*.npy")):
+                    matrix = np.load(npy_file, mmap_mode="r")
+                    taxo_level = npy_file.stem
+                    if taxo_level not in vectors:
+                        vectors[taxo_level] = np.empty(
+                            (len(hit_indices), matrix.shape[1]), dtype=np.float32
+                        )
+                    vectors[taxo_level][positions] = matrix[rows]
+
+            conn.executemany(
+                "UPDATE segments SET last_access = ? WHERE name = ?",
+                [(time.time(), segment) for segment in by_segment],
+            )
+        return hit_indices, vectors
+
+    def put(self, seq_hashes: list[str], vectors: dict[str, np.ndarray]) -> None:
+        """Add the embeddings of the sequences to the cache as a new segment.
+
+        Args:
+            seq_hashes: The hashes of the sequences.
+            vectors: The embedding matrices for each taxonomy level, the rows are in the order of
+                `seq_hashes`.
+        """
+        if not seq_hashes:
+            return
+
+        segment = uuid.uuid4().hex
+        segment_dir = self.cache_dir / segment
+        segment_dir.mkdir()
+        size = 0
+        for taxo_level, matrix in vectors.items():
+            matrix = np.ascontiguousarray(matrix, dtype=np.float32)
+            np.save(segment_dir / f"{taxo_level}.npy", matrix)
+            size += matrix.nbytes
+
+        with closing(self._connect()) as conn, conn:
+            conn.execute(
+                "INSERT INTO segments (name, size, last_access) VALUES (?, ?, ?)",
+                (segment, size, time.time()),
+            )
+            conn.executemany(
+                "INSERT OR REPLACE INTO entries (seq_hash, segment, row) VALUES (?, ?, ?)",
+                [(seq_hash, segment, row) for row, seq_hash in enumerate(seq_hashes)],
+            )
+        logger.debug(f"Cached the embeddings of {len(seq_hashes)} sequences in {segment_dir}")
+        self.evict()
+
+    def evict(self) -> None:
+        """Evict the least recently used segments until the cache fits into `max_size` bytes."""
+        with closing(self._connect()) as conn, conn:
+            segments = conn.execute(
+                "SELECT name, size FROM segments ORDER BY last_access DESC"
+            ).fetchall()
+            total_size = sum(size for _, size in segments)
+            while segments and total_size > self.max_size:
+                name, size = segments.pop()
+                conn.execute("DELETE FROM entries WHERE segment = ?", (name,))
+                conn.execute("DELETE FROM segments WHERE name = ?", (name,))
+                shutil.rmtree(self.cache_dir / name, ignore_errors=True)
+                total_size -= size
+                logger.debug(f"Evicted the embedding cache segment {name}")
+
+    def clear(self) -> None:
+        """Remove all the cached embeddings."""
+        max_size, self.max_size = self.max_size, -1
+        try:
+            self.evict()
+        finally:
+            self.max_size = max_size
+
+    def _connect(self) -> sqlite3.Connection:
+        return sqlite3.connect(self.cache_dir / "index.sqlite", timeout=30)
+
+
+class SearchResultCache:
+    """In-memory LRU cache of the search results of single query sequences.
+
+    The results are keyed by the database path, the collection (i.e. taxonomy level), the
+    [hash of the query sequence][taxotagger.cache.sequence_hash] and a key of the other search
+    parameters. All results of a database can be invalidated when the database changes.
+
+    Examples:
+        >>> cache = SearchResultCache(max_size=1000)
+        >>> cache.put(("MycoAI-CNN.db", "phylum", sequence_hash("ACGT"), "limit=1"), hits)
+        >>> cache.get(("MycoAI-CNN.db", "phylum", sequence_hash("ACGT"), "limit=1"))
+    """
+
+    def __init__(self, max_size: int) -> None:
+        """Initialize the cache.
+
+        Args:
+            max_size: The maximum number of cached results. The least recently used results are
+                evicted first.
+        """
+        self.max_size = max_size
+        self._results: OrderedDict[tuple[str, str, str, str], list[dict]] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._results)
+
+    def get(self, key: tuple[str, str, str, str]) -> list[dict] | None:
+        """Get the cached search result.
+
+        Args:
+            key: The `(db_path, collection, seq_hash, params_key)` of the result.
+
+        Returns:
+            A copy of the cached search result, or `None` if it is not cached.
+        """
+        with self._lock:
+            result = self._results.get(key)
+            if result is None:
+                return None
+            self._results.move_to_end(key)
+            return copy.deepcopy(result)
+
+    def put(self, key: tuple[str, str, str, str], result: list[dict]) -> None:
+        """Add a search result to the cache.
+
+        Args:
+            key: The `(db_path, collection, seq_hash, params_key)` of the result.
+            result: The search result of one query sequence.
+        """
+        with self._lock:
+            self._results[key] = copy.deepcopy(result)
+            self._results.move_to_end(key)
+            while len(self._results) > self.max_size:
+                self._results.popitem(last=False)
+
+    def invalidate(self, db_path: str | None = None) -> None:
+        """Remove the cached search results.
+
+        Args:
+            db_path: Remove only the results of this database. Defaults to all databases.
+        """
+        with self._lock:
+            if db_path is None:
+                self._results.clear()
+                return
+            for key in [key for key in self._results if key[0] == db_path]:
+                del self._results[key]
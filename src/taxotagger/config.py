@@ -1,5 +1,6 @@
 from __future__ import annotations
 import os
+from typing import Any
 from typing import Literal
 from pydantic import BaseModel
 from pydantic import Field
@@ -28,6 +29,105 @@ class ProjectConfig(BaseModel, validate_assignment=True):
             For more information, see the
             [PyTorch documentation](https://pytorch.org/docs/stable/tensor_attributes.html#torch-device).
         force_reload: Whether to force reload the model. Defaults to `False`.
+        model_cache_max_memory: The maximum memory in MB used by the models cached in the process,
+            see [`ModelFactory`][taxotagger.models.ModelFactory]. Defaults to `4096`.
+            Set it to `0` to disable the model cache.
+        batch_size: The number of sequences per forward pass of the embedding model. Defaults
+            to `64`. Larger batches are faster but need more memory.
+        max_batch_tokens: The maximum number of tokens per forward pass of MycoAI-BERT, i.e. the
+            number of sequences times their padded length. The sequences are grouped into batches
+            of similar lengths under this budget, see
+            [`MycoAIBERTEmbedModel`][taxotagger.models.MycoAIBERTEmbedModel]. Defaults to `None`,
+            i.e. the budget of `batch_size` sequences of the longest length.
+        encode_workers: The number of worker processes that encode the DNA sequences before the
+            inference of the embedding model. Defaults to `1`, i.e. the sequences are encoded in
+            the main process. More workers speed up the encoding of large FASTA files on machines
+            with many CPU cores, at the cost of starting the worker processes for each file.
+        inference_backend: How the embedding model runs the forward passes. Defaults to
+            `"eager"`, i.e. the PyTorch model as loaded. Available options are:
+
+            - `"eager"`: the model as loaded
+            - `"trace"`: the model traced with TorchScript
+            - `"compile"`: the model compiled with `torch.compile`
+
+            The model is traced or compiled once per process, on the first batch of the first
+            inference. The optimized model is checked against the eager model on the first and last
+            batch, and the eager model is used with a warning if they differ or the optimization
+            fails. Run `benchmarks/inference_backends.py` to measure the speedup on your machine.
+        inference_dtype: The dtype of the computations of the embedding model, `"float32"` or
+            `"bfloat16"`. Defaults to `"float32"`. With `"bfloat16"`, the forward passes run with
+            `torch.autocast`, which is faster on CPUs with native bfloat16 support, e.g. with
+            AVX512-BF16 or AMX, at the cost of about 2 to 3 significant digits of the embeddings.
+            The embeddings are always returned as float32.
+        quantize: The quantization of the embedding model for the inference on the CPU.
+            Defaults to `None`, i.e. the model runs in float32. Available options are:
+
+            - `"dynamic-int8"`: the weights of the linear layers, including the large output
+              layers of the taxonomy levels, are stored as int8, and the activations are quantized
+              on the fly. This shrinks the model and speeds up the inference on the CPU.
+
+            The quantized model is cached next to the model file as `{model_id}.{quantize}.pt`.
+            The top-1 predictions of the quantized models agree with the float32 models for at
+            least 98% of the test sequences at each taxonomy level, run
+            `benchmarks/quantization.py` to check the agreement on your own sequences.
+        num_threads: The number of threads PyTorch uses within an operation, see
+            `torch.set_num_threads`. Defaults to `None`, i.e. the PyTorch default, usually the
+            number of physical CPU cores.
+        num_interop_threads: The number of threads PyTorch uses to run independent operations
+            in parallel, see `torch.set_num_interop_threads`. It can only be set once per process,
+            before the first inference. Defaults to `None`, i.e. the PyTorch default.
+        chunk_size: The number of sequences read, embedded and processed at a time when streaming
+            a FASTA file, e.g. with `TaxoTagger.embed_iter`. Defaults to `1000`. The peak memory
+            usage is bounded by the chunk size instead of the size of the FASTA file.
+        pipeline_queue_size: The maximum number of chunks waiting between two stages of the
+            pipeline of `TaxoTagger.search` and `TaxoTagger.create_db`, which reads, encodes,
+            embeds and searches or inserts chunks of sequences concurrently, see
+            [`Pipeline`][taxotagger.pipeline.Pipeline]. Defaults to `2`. The peak memory usage
+            grows with the queue size and the chunk size.
+        embedding_cache: Whether to cache the embeddings of the sequences on disk under
+            `{mycoai_home}/embedding_cache`, so that `TaxoTagger.embed` only runs the model for
+            sequences not embedded before. Defaults to `False`.
+        embedding_cache_max_size: The maximum size in MB of the embedding cache of each model.
+            The least recently used embeddings are evicted first. Defaults to `10240`.
+        index_params: The vector index of the database for each taxonomy level, used by
+            `TaxoTagger.create_db`. The keys are taxonomy levels, and the values are dictionaries
+            with the keys `index_type` and `params`, e.g.
+            `{"species": {"index_type": "HNSW", "params": {"M": 16, "efConstruction": 200}}}`.
+            Defaults to `{}`, i.e. the exact `FLAT` index for all taxonomy levels.
+        vector_store: The vector store backend of the databases, `"milvus"` for Milvus Lite or a
+            Milvus server, or `"numpy"` for the in-process exact search with NumPy, which is
+            faster for reference databases that fit into memory. Defaults to `"milvus"`.
+        vector_dtype: The dtype of the stored vectors for each taxonomy level, used by
+            `TaxoTagger.create_db`. The keys are taxonomy levels, and the values are `"float32"`,
+            `"float16"` or `"int8"`, e.g. `{"genus": "float16", "species": "int8"}`. Reduced
+            precision shrinks the search index of large taxonomy levels by 2x (`float16`) or 4x
+            (`int8`, `float16` for Milvus). The `"numpy"` vector store also keeps the float32
+            vectors of these levels on disk for the rescoring, unless `rescore_factor` is `1`, so
+            the database is then larger on disk, but the search scans less memory. Defaults to
+            `{}`, i.e. `float32` for all taxonomy levels.
+        rescore_factor: The number of candidates per hit that the `"numpy"` vector store rescores
+            with the full precision vectors for the taxonomy levels stored in reduced precision.
+            Use `1` to disable the rescoring and to not store the full precision vectors.
+            Defaults to `4`.
+        projection_dims: The target dimension of the projection for each taxonomy level, used by
+            `TaxoTagger.create_db`, e.g. `{"genus": 128, "species": 256}`. The projection is fitted
+            on the first chunk of sequences, stored next to the database and applied to the query
+            embeddings by `TaxoTagger.search`. Defaults to `{}`, i.e. no projection.
+        projection_method: The method of the projection, `"pca"` or `"random"`. Defaults to
+            `"pca"`.
+        db_idle_timeout: The time in seconds after which an unused database client opened by
+            [`TaxoTagger`][taxotagger.TaxoTagger] is closed. Defaults to `600`. Open clients are
+            reused by later searches on the same database, which avoids restarting Milvus Lite and
+            reloading the collections. Idle clients are closed in the background, also if there are
+            no further calls, but never while they are in use.
+        search_workers: The maximum number of taxonomy levels searched concurrently by
+            `TaxoTagger.search`. Defaults to `1`, i.e. the taxonomy levels are searched one after
+            another.
+        search_cache_size: The maximum number of search results of single query sequences kept in
+            memory by `TaxoTagger.search`. Repeated queries of the same sequences with the same
+            search parameters are answered from the cache without embedding and searching.
+            The results of a database are invalidated when it is rebuilt with
+            `TaxoTagger.create_db`. Defaults to `0`, i.e. the search result cache is disabled.
         log_level: The log level. Use the logging module's log level constants. Defaults to `"INFO"`.
         log_file: The file to write the log to.
             If the file is an empty string (by default), the log will not be written to a file.
@@ -51,6 +151,28 @@ class ProjectConfig(BaseModel, validate_assignment=True):
     )
     device: str = Field(default="cpu", min_length=1)
     force_reload: bool = Field(default=False, strict=True)
+    model_cache_max_memory: int = Field(default=4096, ge=0)
+    batch_size: int = Field(default=64, gt=0)
+    max_batch_tokens: int | None = Field(default=None, gt=0)
+    encode_workers: int = Field(default=1, gt=0)
+    inference_backend: Literal["eager", "trace", "compile"] = Field(default="eager")
+    inference_dtype: Literal["float32", "bfloat16"] = Field(default="float32")
+    quantize: Literal["dynamic-int8"] | None = Field(default=None)
+    num_threads: int | None = Field(default=None, gt=0)
+    num_interop_threads: int | None = Field(default=None, gt=0)
+    chunk_size: int = Field(default=1000, gt=0)
+    pipeline_queue_size: int = Field(default=2, gt=0)
+    embedding_cache: bool = Field(default=False, strict=True)
+    embedding_cache_max_size: int = Field(default=10240, ge=0)
+    index_params: dict[str, dict[str, Any]] = Field(default_factory=dict)
+    vector_store: Literal["milvus", "numpy"] = Field(default="milvus")
+    vector_dtype: dict[str, Literal["float32", "float16", "int8"]] = Field(default_factory=dict)
+    rescore_factor: int = Field(default=4, gt=0)
+    projection_dims: dict[str, int] = Field(default_factory=dict)
+    projection_method: Literal["pca", "random"] = Field(default="pca")
+    db_idle_timeout: float = Field(default=600, ge=0)
+    search_workers: int = Field(default=1, gt=0)
+    search_cache_size: int = Field(default=0, ge=0)
     log_level: Literal["NONSET", "DEBUG", "INFO", "WARNING", "ERROR", "CRITICAL"] = Field(
         default="INFO"
     )
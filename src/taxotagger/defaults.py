@@ -37,6 +37,13 @@ and the name of the downloaded file should be the same as the model name.
 TAXONOMY_LEVELS = ["phylum", "class", "order", "family", "genus", "species"]
 """The list of taxonomy level names used in this package."""
 
+LOCAL_INDEX_TYPES = ["FLAT", "HNSW", "AUTOINDEX"]
+"""The vector index types supported by the local Milvus Lite database.
+
+Other index types, e.g. `IVF_FLAT`, `IVF_SQ8` or `IVF_PQ`, need a Milvus server. See the
+[Milvus documentation](https://milvus.io/docs/index.md) for the parameters of each index type.
+"""
+
 MAX_BATCH_SIZE_BYTES = 64 * 1024 * 1024
 """The maximum batch size in bytes for the Milvus database.
 
@@ -45,3 +52,11 @@ Milvus has a limit of 64MB for input and output per RPC operation, including `in
 
 For more information, see the [Milvus documentation](https://milvus.io/docs/limitations.md).
 """
+
+MAX_METADATA_SIZE_BYTES = 1024
+"""The estimated upper bound in bytes of the metadata fields of one entity in the Milvus database.
+
+The metadata fields are the `id` (max 20 characters), the taxonomy label (max 100 characters) and
+the dynamic fields such as `SH_id`. The bound is used to estimate the batch size for Milvus
+operations without measuring the size of each entity.
+"""
@@ -0,0 +1,211 @@
+from __future__ import annotations
+from dataclasses import dataclass
+from os import PathLike
+from typing import Any
+from typing import Iterable
+import numpy as np
+from .defaults import TAXONOMY_LEVELS
+
+
+METADATA_FIELDS = [
+    "id",
+    "kingdom",
+    "phylum",
+    "class",
+    "order",
+    "family",
+    "genus",
+    "species",
+    "SH_id",
+]
+"""The metadata fields parsed from a FASTA header, in the order of the metadata columns.
+
+See [`parse_unite_fasta_header`][taxotagger.utils.parse_unite_fasta_header] for details.
+"""
+
+
+@dataclass
+class EmbeddingBatch:
+    """Columnar container for the embeddings of a set of DNA sequences.
+
+    Compared to the list of dictionaries returned by default by the `embed` methods, the vectors
+    of each taxonomy level are stored in one contiguous float32 matrix, and the metadata parsed
+    from the FASTA headers is stored once and shared by all taxonomy levels.
+
+    Attributes:
+        metadata: The metadata of the sequences with shape `(n_samples, 9)`, the columns are
+            the [`METADATA_FIELDS`][taxotagger.embeddings.METADATA_FIELDS].
+        vectors: The embedding matrices. The keys are the taxonomy levels, and the values are
+            float32 arrays with shape `(n_samples, n_features)`.
+
+    Examples:
+        >>> config = ProjectConfig()
+        >>> tagger = TaxoTagger(config)
+        >>> batch = tagger.embed("dna1.fasta", as_batch=True)
+        >>> batch.vectors["species"].shape
+        (2, 14742)
+        >>> batch.ids
+        array(['KY106088', 'KY106087'], dtype=object)
+    """
+
+    metadata: np.ndarray
+    vectors: dict[str, np.ndarray]
+
+    def __post_init__(self) -> None:
+        self.metadata = np.asarray(self.metadata, dtype=object).reshape(-1, len(METADATA_FIELDS))
+        for taxo_level, vectors in self.vectors.items():
+            if vectors.shape[0] != len(self.metadata):
+                raise ValueError(
+                    f"The number of vectors for {taxo_level} ({vectors.shape[0]}) does not match "
+                    f"the number of sequences ({len(self.metadata)})"
+                )
+
+    def __len__(self) -> int:
+        return len(self.metadata)
+
+    @property
+    def ids(self) -> np.ndarray:
+        """The sequence identifiers with shape `(n_samples,)`."""
+        return self.metadata[:, 0]
+
+    @property
+    def dims(self) -> dict[str, int]:
+        """The number of features of the embeddings for each taxonomy level."""
+        return {taxo_level: vectors.shape[1] for taxo_level, vectors in self.vectors.items()}
+
+    def select(self, levels: list[str]) -> EmbeddingBatch:
+        """Get the embeddings of some taxonomy levels, sharing the metadata and the matrices.
+
+        Args:
+            levels: The taxonomy levels to keep.
+
+        Returns:
+            The embeddings with only the given taxonomy levels.
+        """
+        return EmbeddingBatch(self.metadata, {level: self.vectors[level] for level in levels})
+
+    @classmethod
+    def concatenate(cls, batches: Iterable[EmbeddingBatch]) -> EmbeddingBatch:
+        """Concatenate the embeddings of several sets of sequences, e.g. of the shards of a file.
+
+        Args:
+            batches: The embeddings to concatenate, in order. They must have the same taxonomy
+                levels with the same number of features, except for batches without sequences,
+                which are skipped.
+
+        Returns:
+            The embeddings of the sequences of all batches, in the order of the batches.
+
+        Raises:
+            ValueError: If there are no batches, or the batches have different taxonomy levels
+                or numbers of features.
+        """
+        batches = list(batches)
+        if not batches:
+            raise ValueError("No embeddings to concatenate")
+        batches = [batch for batch in batches if len(batch)] or batches[:1]
+        dims = batches[0].dims
+        for batch in batches[1:]:
+            if batch.dims != dims:
+                raise ValueError(
+                    f"Cannot concatenate embeddings with different dimensions {dims} and "
+                    f"{batch.dims}"
+                )
+        return cls(
+            np.concatenate([batch.metadata for batch in batches]),
+            {
+                taxo_level: np.concatenate([batch.vectors[taxo_level] for batch in batches])
+                for taxo_level in dims
+            },
+        )
+
+    def save(self, path: str | PathLike) -> None:
+        """Save the embeddings to a `.npz` file.
+
+        Args:
+            path: The path to the file.
+        """
+        arrays: dict[str, np.ndarray] = {"metadata": self.metadata.astype(str)}
+        for taxo_level, vectors in self.vectors.items():
+            arrays[taxo_level] = vectors
+        with open(path, "wb") as fh:
+            # the stubs of numpy do not tell the arrays from the `allow_pickle` keyword argument
+            np.savez(fh, **arrays)  # type: ignore[arg-type]
+
+    @classmethod
+    def load(cls, path: str | PathLike) -> EmbeddingBatch:
+        """Load embeddings saved by [`save`][taxotagger.embeddings.EmbeddingBatch.save].
+
+        Args:
+            path: The path to the file.
+
+        Returns:
+            The loaded embeddings.
+        """
+        with np.load(path) as data:
+            vectors = {key: data[key] for key in data.files if key != "metadata"}
+            return cls(data["metadata"].astype(object), vectors)
+
+    def labels(self, field: str) -> np.ndarray:
+        """Get a metadata column, e.g. the labels of a taxonomy level.
+
+        Args:
+            field: One of the [`METADATA_FIELDS`][taxotagger.embeddings.METADATA_FIELDS].
+
+        Returns:
+            The values of the metadata field with shape `(n_samples,)`.
+        """
+        return self.metadata[:, METADATA_FIELDS.index(field)]
+
+    def to_records(self, taxo_level: str) -> list[dict[str, Any]]:
+        """Convert the embeddings of one taxonomy level to a list of dictionaries.
+
+        The vectors of the dictionaries are views of rows of the embedding matrix, so no vector
+        data is copied.
+
+        Args:
+            taxo_level: The taxonomy level to convert.
+
+        Returns:
+            A list of dictionaries with the keys `id`, `vector`, the taxonomy level and `SH_id`,
+                the same as the output of the `embed` methods.
+        """
+        vectors = self.vectors[taxo_level]
+        label_index = METADATA_FIELDS.index(taxo_level)
+        return [
+            {
+                "id": row[0],
+                "vector": vectors[j],
+                taxo_level: row[label_index],
+                "SH_id": row[-1],
+            }
+            for j, row in enumerate(self.metadata)
+        ]
+
+    def to_dict(self) -> dict[str, list[dict[str, Any]]]:
+        """Convert the embeddings to the dictionary format returned by the `embed` methods.
+
+        Returns:
+            A dictionary of embeddings for each taxonomy level, see
+                [`EmbedModelBase.embed`][taxotagger.abc.EmbedModelBase.embed].
+        """
+        return {
+            taxo_level: self.to_records(taxo_level)
+            for taxo_level in TAXONOMY_LEVELS
+            if taxo_level in self.vectors
+        }
+
+
+def l2_normalize(vectors: np.ndarray) -> np.ndarray:
+    """L2-normalise the rows of a matrix, so their dot products are the cosine similarities.
+
+    Args:
+        vectors: The matrix with shape `(n_samples, n_features)`.
+
+    Returns:
+        The float32 matrix with unit-length rows. All-zero rows are unchanged.
+    """
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    norms[norms == 0] = 1
+    normalized: np.ndarray = (vectors / norms).astype(np.float32, copy=False)
+    return normalized
@@ -0,0 +1,43 @@
+from __future__ import annotations
+from typing import Sequence
+
+
+def recall_at_k(
+    expected: Sequence[Sequence[dict]],
+    actual: Sequence[Sequence[dict]],
+    k: int | None = None,
+) -> float:
+    """Calculate the mean recall@k of approximate search results against exact search results.
+
+    The recall of one query is the fraction of the ids in the top `k` exact results that are also
+    in the top `k` approximate results.
+
+    Args:
+        expected: The exact search results, e.g. from a FLAT index. Each item is the list of hits
+            of one query, and each hit is a dictionary with an `id` key.
+        actual: The approximate search results in the same format, for the same queries.
+        k: The number of top hits to compare. Defaults to all hits of the exact results.
+
+    Returns:
+        The mean recall over all queries, between 0 and 1. If there are no expected hits, the
+            recall is 1.
+
+    Examples:
+        >>> expected = [[{"id": "a"}, {"id": "b"}]]
+        >>> actual = [[{"id": "a"}, {"id": "c"}]]
+        >>> recall_at_k(expected, actual)
+        0.5
+    """
+    if len(expected) != len(actual):
+        raise ValueError(
+            f"The number of queries differs: {len(expected)} expected, {len(actual)} actual"
+        )
+
+    recalls = []
+    for expected_hits, actual_hits in zip(expected, actual):
+        expected_ids = {hit["id"] for hit in expected_hits[:k]}
+        if not expected_ids:
+            continue
+        actual_ids = {hit["id"] for hit in actual_hits[:k]}
+        recalls.append(len(expected_ids & actual_ids) / len(expected_ids))
+    return sum(recalls) / len(recalls) if recalls else 1.0
@@ -1,23 +1,61 @@
 from __future__ import annotations
+import contextlib
+import copy
+import itertools
+import logging
+import threading
+import time
+import warnings
+from collections import OrderedDict
+from pathlib import Path
 from typing import Any
+from typing import Callable
+from typing import Iterable
+from typing import Iterator
+from typing import Literal
+from typing import overload
+import numpy as np
+import pandas as pd
 import torch
+import torch.multiprocessing
 from mycoai import data
+from mycoai.utils import TOKENS
 from torch.utils.data import DataLoader
 from .abc import EmbedModelBase
 from .config import ProjectConfig
 from .defaults import PRETRAINED_MODELS
 from .defaults import TAXONOMY_LEVELS
+from .embeddings import EmbeddingBatch
+from .utils import iter_fasta
 from .utils import load_model
-from .utils import parse_unite_fasta_header
+from .utils import parse_unite_fasta_headers
+
+
+logger = logging.getLogger(__name__)
 
 
 class ModelFactory:
-    """Factory class to get the embedding model for the given model identifier."""
+    """Factory class to get the embedding model for the given model identifier.
 
-    @staticmethod
-    def get_model(model_id: str, config: ProjectConfig) -> EmbedModelBase:
+    The model instances are cached per process, keyed by the model identifier and the device, so
+    that the model checkpoint is only loaded once. The cache is limited by the
+    `model_cache_max_memory` of the project configuration, and the least recently used models are
+    evicted first when the limit is exceeded.
+    """
+
+    _cache: OrderedDict[tuple[str, str], tuple[EmbedModelBase, int]] = OrderedDict()
+    _lock = threading.Lock()
+
+    @classmethod
+    def get_model(cls, model_id: str, config: ProjectConfig) -> EmbedModelBase:
         """Get the embedding model for the given model identifier.
 
+        A cached model instance is returned if the model has been loaded on the same device and
+        with the same `quantize` option before, unless `force_reload` of the configuration is
+        `True`. The cached instance is shared by the whole process and never changed: if it was
+        created with another configuration, a shallow copy of it, which shares the model weights
+        but uses the given configuration, is returned instead.
+
         Args:
             model_id: The identifier of the model to load.
             config: The configurations for the project.
@@ -29,6 +67,69 @@ class ModelFactory:
             >>> config = ProjectConfig()
             >>> model = ModelFactory.get_model("MycoAI-CNN", config)
         """
+        key = (model_id, config.device)
+        with cls._lock:
+            if (
+                key in cls._cache
+                and not config.force_reload
+                and getattr(cls._cache[key][0], "quantize", None) == config.quantize
+            ):
+                cls._cache.move_to_end(key)
+                model, _ = cls._cache[key]
+                if hasattr(model, "_config") and model._config is not config:
+                    model = copy.copy(model)
+                    model._config = config
+                logger.debug(f"Using cached model [magenta]{model_id}[/magenta] on {config.device}")
+                return model
+
+            model = cls._create_model(model_id, config)
+            cls._cache.pop(key, None)
+            max_memory = config.model_cache_max_memory * 1024 * 1024
+            model_memory = _get_model_memory(model)
+            if model_memory <= max_memory:
+                cls._cache[key] = (model, model_memory)
+                cls._evict_to_limit(max_memory)
+            return model
+
+    @classmethod
+    def evict(cls, model_id: str | None = None, device: str | None = None) -> None:
+        """Remove models from the model cache.
+
+        Args:
+            model_id: Remove only the models with this identifier. Defaults to all models.
+            device: Remove only the models on this device. Defaults to all devices.
+
+        Examples:
+            Remove all cached models
+            >>> ModelFactory.evict()
+
+            Remove the MycoAI-CNN model on the CPU
+            >>> ModelFactory.evict("MycoAI-CNN", "cpu")
+        """
+        with cls._lock:
+            for key in list(cls._cache):
+                if model_id is not None and key[0] != model_id:
+                    continue
+                if device is not None and key[1] != device:
+                    continue
+                del cls._cache[key]
+
+    @classmethod
+    def cached_models(cls) -> list[tuple[str, str]]:
+        """Get the `(model_id, device)` keys of the cached models, least recently used first."""
+        with cls._lock:
+            return list(cls._cache)
+
+    @classmethod
+    def _evict_to_limit(cls, max_memory: int) -> None:
+        """Evict the least recently used models until the cache fits into `max_memory` bytes."""
+        while sum(memory for _, memory in cls._cache.values()) > max_memory:
+            key, _ = cls._cache.popitem(last=False)
+            logger.debug(f"Evicted model [magenta]{key[0]}[/magenta] on {key[1]} from the cache")
+
+    @staticmethod
+    def _create_model(model_id: str, config: ProjectConfig) -> EmbedModelBase:
+        """Create a new instance of the embedding model for the given model identifier."""
         if model_id == "MycoAI-CNN":
             return MycoAICNNEmbedModel(config)
         elif model_id == "MycoAI-BERT":
@@ -40,29 +141,111 @@ class ModelFactory:
             )
 
 
+def _set_torch_threads(config: ProjectConfig) -> None:
+    """Set the thread counts of PyTorch to `num_threads` and `num_interop_threads` of the config.
+
+    The inter-op thread count can only be set before PyTorch starts any inter-op parallel work in
+    the process, later changes are ignored with a warning.
+    """
+    if config.num_threads is not None and torch.get_num_threads() != config.num_threads:
+        torch.set_num_threads(config.num_threads)
+    if (
+        config.num_interop_threads is not None
+        and torch.get_num_interop_threads() != config.num_interop_threads
+    ):
+        try:
+            torch.set_num_interop_threads(config.num_interop_threads)
+        except RuntimeError as e:
+            msg = f"Failed to set the number of inter-op threads, it is ignored: {e}"
+            logger.warning(msg)
+            warnings.warn(msg)
+
+
+def _get_model_memory(model: EmbedModelBase) -> int:
+    """Get the memory in bytes used by the parameters and buffers of the wrapped PyTorch model."""
+    module = getattr(model, "model", None)
+    if not isinstance(module, torch.nn.Module):
+        return 0
+    # the state dict includes the packed weights of quantized layers, which are no parameters
+    tensors: list[Any] = []
+    for value in module.state_dict(keep_vars=True).values():
+        tensors.extend(value if isinstance(value, tuple) else [value])
+    return sum(t.numel() * t.element_size() for t in tensors if isinstance(t, torch.Tensor))
+
+
 ###################################################################################################
 # Define your embedding models below
-# After defining the models, add them to the `ModelFactory.get_model` method
+# After defining the models, add them to the `ModelFactory._create_model` method
 ###################################################################################################
 
 
-class MycoAICNNEmbedModel(EmbedModelBase):
-    """Embedding model for the pretrained MycoAI-CNN."""
+class _MycoAIEmbedModel(EmbedModelBase):
+    """Shared implementation for the pretrained MycoAI models.
 
-    name = "MycoAI-CNN"
+    The MycoAI models share the same input encoding and output format, they only differ in the
+    network architecture stored in the checkpoint.
+    """
+
+    name: str
 
     def __init__(self, config: ProjectConfig) -> None:
         self._config = config
+        self.quantize = config.quantize
+        # the model is loaded in eval mode, see `load_model`
         self.model = load_model(self.name, config)
-
-    def embed(self, fasta_file: str) -> dict[str, list[dict[str, Any]]]:
+        # the traced or compiled model, keyed by the backend and dtype it was created with
+        self._optimized: tuple[tuple[str, str], Callable] | None = None
+
+    @overload
+    def embed(
+        self,
+        fasta_file: str,
+        batch_size: int | None = None,
+        as_batch: Literal[False] = False,
+        levels: list[str] | None = None,
+    ) -> dict[str, list[dict[str, Any]]]: ...
+
+    @overload
+    def embed(
+        self,
+        fasta_file: str,
+        batch_size: int | None = None,
+        *,
+        as_batch: Literal[True],
+        levels: list[str] | None = None,
+    ) -> EmbeddingBatch: ...
+
+    @overload
+    def embed(
+        self,
+        fasta_file: str,
+        batch_size: int | None = None,
+        as_batch: bool = False,
+        levels: list[str] | None = None,
+    ) -> dict[str, list[dict[str, Any]]] | EmbeddingBatch: ...
+
+    def embed(
+        self,
+        fasta_file: str,
+        batch_size: int | None = None,
+        as_batch: bool = False,
+        levels: list[str] | None = None,
+    ) -> dict[str, list[dict[str, Any]]] | EmbeddingBatch:
         """Calculate the embeddings for the given FASTA file.
 
         Args:
             fasta_file: The path to the FASTA file to embed.
+            batch_size: The number of sequences per forward pass. Defaults to the `batch_size`
+                of the project configuration.
+            as_batch: Whether to return an [`EmbeddingBatch`][taxotagger.embeddings.EmbeddingBatch]
+                with one float32 matrix per taxonomy level instead of lists of dictionaries.
+                Defaults to `False`.
+            levels: The taxonomy levels to return the embeddings of, see `infer`. Defaults to all
+                taxonomy levels.
 
         Returns:
-            A dictionary of embeddings for each taxonomy level.
+            A dictionary of embeddings for each taxonomy level, or an `EmbeddingBatch` if
+                `as_batch` is `True`.
                 The dictionary keys are the taxonomy levels, and the values are lists of dictionaries
                 containing the id, embeddings and metadata for each sequence.
 
@@ -99,145 +282,204 @@ class MycoAICNNEmbedModel(EmbedModelBase):
             >>> model = MycoAICNNEmbedModel(config)
             >>> embeddings = model.embed("dna1.fasta")
         """
-        headers, encoded_data = self.parse_and_encode_fasta(fasta_file)
-        # headers shape (n_samples, n_headers), e.g.
-        # [['id1', 'phylum1', 'class1', 'order1', 'family1', 'genus1', 'species1', 'SH_id1'], ...]
-
-        embeddings = []
-        dataloader = DataLoader(encoded_data, shuffle=False)
-        with torch.no_grad():
-            for x, _ in dataloader:  # (encoded data, labels)
-                y_pred = self.model(x.to(self._config.device))
-                embeddings.append(y_pred)
-        # embeddings shape (n_samples, n_taxonomies, (1, n_features)), where n_taxonomies is 6, e.g.
-        # [[phylumTensor1, classTensor1, orderTensor1, familyTensor1, genusTensor1, speciesTensor1], ...]
-        # the shape of each tensor is (1, n_features), n_features are different for each taxonomy level
-
-        data_collections = {}
-        for i, taxo_level in enumerate(TAXONOMY_LEVELS):
-            data_list = [
-                {
-                    "id": headers[j][0],
-                    # squeeze to remove the batch dimension: (1, n_features) -> (n_features)
-                    "vector": embeddings[j][i].squeeze().numpy(),
-                    taxo_level: headers[j][i + 2],
-                    "SH_id": headers[j][-1],
-                }
-                for j in range(len(embeddings))
-            ]
-            data_collections[taxo_level] = data_list
-        return data_collections
-
-    def parse_and_encode_fasta(self, fasta_file: str) -> tuple[list[list[str]], data.TensorData]:
-        """Parse headers and encode the sequences in the given FASTA file.
+        batch = self.embed_encoded(self.parse_and_encode_fasta(fasta_file), batch_size, levels)
+        return batch if as_batch else batch.to_dict()
 
-        The sequences are encoded using the encoders defined in the pretrained model.
+    def encode_records(self, records: list[tuple[str, str]]) -> tuple[np.ndarray, data.TensorData]:
+        """Parse the headers and encode the sequences of FASTA records.
 
         Args:
-            fasta_file: The path to the FASTA file.
+            records: The `(header, sequence)` pairs to encode.
 
         Returns:
-            A tuple containing the headers and the encoded data for the sequences in the FASTA file.
+            The headers and the encoded data, see `parse_and_encode_fasta`.
+        """
+        return self._encode_data(_records_to_data(records))
 
-                The shape of the headers is `(n_samples, n_headers)`, where `n_samples` is the
-                number of sequences and `n_headers` is the 9 metadata fields parsed from the header.
+    def embed_encoded(
+        self,
+        encoded: tuple[np.ndarray, data.TensorData],
+        batch_size: int | None = None,
+        levels: list[str] | None = None,
+    ) -> EmbeddingBatch:
+        """Calculate the embeddings of the sequences encoded by `parse_and_encode_fasta`.
+
+        Args:
+            encoded: The headers and the encoded data of the sequences.
+            batch_size: The number of sequences per forward pass. Defaults to the `batch_size`
+                of the project configuration.
+            levels: The taxonomy levels to return the embeddings of, see `infer`. Defaults to all
+                taxonomy levels.
+
+        Returns:
+            The embeddings of the sequences.
         """
-        input_data = data.Data(fasta_file, tax_parser=None, allow_duplicates=False)
-        # Using custom parser to parse the FASTA headers
-        headers = [parse_unite_fasta_header(header) for header in input_data.data["id"].values]
-        encoded_data = input_data.encode_dataset(self.model.dna_encoder, self.model.tax_encoder)
-        return headers, encoded_data
+        headers, encoded_data = encoded
+        # headers shape (n_samples, n_headers), e.g.
+        # [['id1', 'kingdom1', 'phylum1', 'class1', 'order1', 'family1', 'genus1', 'species1', 'SH_id1'], ...]
 
+        levels = list(TAXONOMY_LEVELS) if levels is None else levels
+        embeddings = self.infer(encoded_data, batch_size, levels)
+        # embeddings shape (n_taxonomies, (n_samples, n_features)), where n_taxonomies is 6 for
+        # all levels, e.g.
+        # [phylumMatrix, classMatrix, orderMatrix, familyMatrix, genusMatrix, speciesMatrix]
+        # n_features are different for each taxonomy level
 
-class MycoAIBERTEmbedModel(EmbedModelBase):
-    """Embedding model for the pretrained MycoAI-BERT."""
+        return EmbeddingBatch(headers, dict(zip(levels, embeddings)))
 
-    name = "MycoAI-BERT"
+    def infer(
+        self,
+        encoded_data: data.TensorData,
+        batch_size: int | None = None,
+        levels: list[str] | None = None,
+    ) -> list[np.ndarray]:
+        """Run the model on the encoded sequences in mini-batches.
 
-    def __init__(self, config: ProjectConfig) -> None:
-        self._config = config
-        self.model = load_model(self.name, config)
+        The outputs of each batch are written into pre-allocated matrices, so no intermediate
+        per-batch tensors are kept.
 
-    def embed(self, fasta_file: str) -> dict[str, list[dict[str, Any]]]:
-        """Calculate the embeddings for the given FASTA file.
+        The network computes the outputs of all taxonomy levels in one forward pass, e.g. the
+        higher levels are derived from the species output, but the outputs of the levels not in
+        `levels` are not copied from the device nor stored, which saves most of the memory and
+        time after the forward pass when the large species level is skipped.
 
         Args:
-            fasta_file: The path to the FASTA file to embed.
+            encoded_data: The encoded sequences, e.g. from `parse_and_encode_fasta`.
+            batch_size: The number of sequences per forward pass. Defaults to the `batch_size`
+                of the project configuration.
+            levels: The taxonomy levels to return the outputs of. Defaults to all
+                [`TAXONOMY_LEVELS`][taxotagger.defaults.TAXONOMY_LEVELS].
 
         Returns:
-            A dictionary of embeddings for each taxonomy level.
-                The dictionary keys are the taxonomy levels, and the values are lists of dictionaries
-                containing the id, embeddings and metadata for each sequence.
+            A list of float32 matrices, one for each taxonomy level in the order of `levels`.
+                The shape of each matrix is `(n_samples, n_features)`.
 
-                The shape of the list is `(n_samples)`, where `n_samples` is the number of sequences.
+        Raises:
+            ValueError: If any of the levels is not a taxonomy level.
+        """
+        batch_size = batch_size or self._config.batch_size
+        n_samples = len(encoded_data)
+        levels = list(TAXONOMY_LEVELS) if levels is None else levels
+        invalid_levels = [level for level in levels if level not in TAXONOMY_LEVELS]
+        if invalid_levels:
+            raise ValueError(
+                f"Invalid taxonomy levels {invalid_levels}. Valid levels are {TAXONOMY_LEVELS}"
+            )
+        indices = [TAXONOMY_LEVELS.index(level) for level in levels]
+
+        _set_torch_threads(self._config)
+        model = self._inference_model(encoded_data, batch_size)
+
+        outputs: list[np.ndarray] = []
+        with torch.inference_mode(), self._autocast():
+            for rows, x in self._iter_batches(encoded_data, batch_size):
+                y_pred = model(x.to(self._config.device))
+                # y_pred shape (n_taxonomies, (batch_size, n_features))
+                if not outputs:
+                    outputs = [
+                        np.empty((n_samples, y_pred[i].shape[1]), dtype=np.float32) for i in indices
+                    ]
+                for output, i in zip(outputs, indices):
+                    output[rows] = y_pred[i].float().cpu().numpy()
+
+        if not outputs:
+            return [np.empty((0, 0), dtype=np.float32) for _ in levels]
+        return outputs
+
+    def _inference_model(self, encoded_data: data.TensorData, batch_size: int) -> Callable:
+        """Get the model for the `inference_backend` of the project configuration.
+
+        The model is traced or compiled on the first batch of the first inference with the
+        backend, and reused by later inferences, e.g. of the model cached by
+        [`ModelFactory`][taxotagger.models.ModelFactory]. The optimized model must give the same
+        outputs as the eager model for the first two batches, e.g. of different sequence lengths
+        with length-bucketed batches, otherwise or if the optimization fails, the eager model is
+        used. Only these batches are encoded for the check, not all batches of the inference.
 
-                The keys of the inside dictionaries are: `id`, `vector`, and the taxonomy levels
-                (e.g. `phylum`, `class`, `order`, `family`, `genus`, `species`) and other metadata
-                fields present in the FASTA header.
+        Args:
+            encoded_data: The encoded sequences of the inference.
+            batch_size: The number of sequences per batch.
 
-                The shape of the `vector` is `(n_features)`, where `n_features` is the number of
-                features in the embedding. The number of features for each taxonomy level is:
+        Returns:
+            The model to call with the batches of encoded sequences.
+        """
+        backend = self._config.inference_backend
+        key = (backend, self._config.inference_dtype)
+        eager: Callable = self.model
+        if backend == "eager":
+            return eager
+        if self._optimized is not None and self._optimized[0] == key:
+            return self._optimized[1]
+
+        batches = self._iter_batches(encoded_data, batch_size)
+        examples = [x.to(self._config.device) for _, x in itertools.islice(batches, 2)]
+        if not examples:
+            return eager
+
+        start = time.perf_counter()
+        optimized: Callable
+        try:
+            with torch.no_grad(), self._autocast():
+                if backend == "trace":
+                    optimized = torch.jit.trace(
+                        self.model, examples[0], strict=False, check_trace=False
+                    )
+                else:
+                    optimized = torch.compile(self.model, dynamic=True)
+                for x in examples:
+                    for expected, result in zip(self.model(x), optimized(x)):
+                        if not torch.allclose(expected, result, rtol=1e-3, atol=1e-4):
+                            raise ValueError("the outputs differ from the eager model")
+        except Exception as e:
+            msg = f"Failed to {backend} model {self.name}, use the eager model instead: {e}"
+            logger.warning(msg)
+            warnings.warn(msg)
+            optimized = eager
+        else:
+            logger.info(
+                f"Optimized model [magenta]{self.name}[/magenta] with {backend} in "
+                f"{time.perf_counter() - start:.1f}s"
+            )
+        self._optimized = (key, optimized)
+        return optimized
+
+    def _autocast(self) -> contextlib.AbstractContextManager:
+        """Get the autocast context of the forward passes for the `inference_dtype`."""
+        if self._config.inference_dtype == "bfloat16":
+            device_type = torch.device(self._config.device).type
+            autocast: contextlib.AbstractContextManager = torch.autocast(
+                device_type, dtype=torch.bfloat16
+            )
+            return autocast
+        return contextlib.nullcontext()
 
-                    - phylum: 18
-                    - class: 70
-                    - order: 231
-                    - family: 791
-                    - genus: 3695
-                    - species: 14742
+    def _iter_batches(
+        self, encoded_data: data.TensorData, batch_size: int
+    ) -> Iterator[tuple[slice | np.ndarray, torch.Tensor]]:
+        """Split the encoded sequences into the mini-batches of the forward passes.
 
-                The returned data looks like:
-                ```python
-                {
-                "phylum": [{"id": "seq1", "vector": [0.1, 0.2, ...], "phylum": "Basidiomycota", ...}, ...],
-                "class": [{"id": "seq1", "vector": [0.5, 0.6, ...], "class": "Agaricomycetes", ...}, ...],
-                "order": [{"id": "seq1", "vector": [0.9, 0.8, ...], "order": "Corticiales", ...}, ...],
-                "family": [{"id": "seq1", "vector": [0.3, 0.4, ...], "family": "Corticiaceae", ...}, ...],
-                "genus": [{"id": "seq1", "vector": [0.7, 0.8, ...], "genus": "Waitea", ...}, ...],
-                "species": [{"id": "seq1", "vector": [0.5, 0.6, ...], "species": "Circinata", ...}, ...]
-                }
-                ```
+        Args:
+            encoded_data: The encoded sequences.
+            batch_size: The number of sequences per batch.
 
-        Examples:
-            >>> config = ProjectConfig()
-            >>> model = MycoAIBERTEmbedModel(config)
-            >>> embeddings = model.embed("dna1.fasta")
+        Yields:
+            The rows of the sequences of the batch in `encoded_data`, and the encoded sequences
+                of the batch.
         """
-        headers, encoded_data = self.parse_and_encode_fasta(fasta_file)
-        # headers shape (n_samples, n_headers), e.g.
-        # [['id1', 'phylum1', 'class1', 'order1', 'family1', 'genus1', 'species1', 'SH_id1'], ...]
-
-        embeddings = []
-        dataloader = DataLoader(encoded_data, shuffle=False)
-        with torch.no_grad():
-            for x, _ in dataloader:  # (encoded data, labels)
-                y_pred = self.model(x.to(self._config.device))
-                embeddings.append(y_pred)
-        # embeddings shape (n_samples, n_taxonomies, (1, n_features)), where n_taxonomies is 6, e.g.
-        # [[phylumTensor1, classTensor1, orderTensor1, familyTensor1, genusTensor1, speciesTensor1], ...]
-        # the shape of each tensor is (1, n_features), n_features are different for each taxonomy level
-
-        data_collections = {}
-        for i, taxo_level in enumerate(TAXONOMY_LEVELS):
-            data_list = [
-                {
-                    "id": headers[j][0],
-                    # squeeze to remove the batch dimension: (1, n_features) -> (n_features)
-                    "vector": embeddings[j][i].squeeze().numpy(),
-                    taxo_level: headers[j][i + 2],
-                    "SH_id": headers[j][-1],
-                }
-                for j in range(len(embeddings))
-            ]
-            data_collections[taxo_level] = data_list
-        return data_collections
+        start = 0
+        for x, _ in DataLoader(encoded_data, batch_size=batch_size, shuffle=False):
+            yield slice(start, start + x.shape[0]), x
+            start += x.shape[0]
 
-    def parse_and_encode_fasta(self, fasta_file: str) -> tuple[list[list[str]], data.TensorData]:
+    def parse_and_encode_fasta(self, fasta_file: str) -> tuple[np.ndarray, data.TensorData]:
         """Parse headers and encode the sequences in the given FASTA file.
 
-        The sequences are encoded using the encoders defined in the pretrained model.
+        The sequences are encoded using the encoders defined in the pretrained model. The file is
+        read with [`iter_fasta`][taxotagger.utils.iter_fasta] instead of `Bio.SeqIO`, and
+        repeated sequences are dropped as MycoAI does, see `_records_to_data`.
 
         Args:
-            fasta_file: The path to the FASTA file.
+            fasta_file: The path to the FASTA file, optionally gzip-compressed.
 
         Returns:
             A tuple containing the headers and the encoded data for the sequences in the FASTA file.
@@ -245,8 +487,191 @@ class MycoAIBERTEmbedModel(EmbedModelBase):
                 The shape of the headers is `(n_samples, n_headers)`, where `n_samples` is the
                 number of sequences and `n_headers` is the 9 metadata fields parsed from the header.
         """
-        input_data = data.Data(fasta_file, tax_parser=None, allow_duplicates=False)
+        return self._encode_data(
+            _records_to_data(iter_fasta(fasta_file), name=Path(fasta_file).stem)
+        )
+
+    def _encode_data(self, input_data: data.Data) -> tuple[np.ndarray, data.TensorData]:
+        """Parse the headers and encode the sequences of the parsed records.
+
+        Args:
+            input_data: The parsed records, see `_records_to_data`.
+
+        Returns:
+            The headers and the encoded data, see `parse_and_encode_fasta`.
+        """
         # Using custom parser to parse the FASTA headers
-        headers = [parse_unite_fasta_header(header) for header in input_data.data["id"].values]
-        encoded_data = input_data.encode_dataset(self.model.dna_encoder, self.model.tax_encoder)
+        headers = parse_unite_fasta_headers(input_data.data["id"].values)
+        encoded_data = self.encode(input_data)
         return headers, encoded_data
+
+    def encode(self, input_data: data.Data) -> data.TensorData:
+        """Encode the sequences with the encoders defined in the pretrained model.
+
+        With `encode_workers` greater than 1 in the project configuration, the sequences are split
+        into chunks that are encoded in a pool of worker processes. The encoded chunks are sent
+        back through shared memory by `torch.multiprocessing`, so the tensor data is not pickled,
+        and concatenated in the original order. The byte pair encoder of MycoAI-BERT pads each
+        chunk to its longest sequence, so narrower chunks are padded to the widest one, as if all
+        sequences were encoded at once.
+
+        Args:
+            input_data: The parsed FASTA file.
+
+        Returns:
+            The encoded data for the sequences, in the same order as in `input_data`.
+        """
+        n_samples = len(input_data.data)
+        workers = min(self._config.encode_workers, n_samples)
+        if workers <= 1:
+            return input_data.encode_dataset(self.model.dna_encoder, self.model.tax_encoder)
+
+        # Several chunks per worker to balance the load of sequences of different lengths
+        bounds = np.linspace(0, n_samples, min(workers * 4, n_samples) + 1, dtype=int)
+        tasks = [
+            (_slice_data(input_data, start, end), self.model.dna_encoder, self.model.tax_encoder)
+            for start, end in zip(bounds[:-1], bounds[1:])
+        ]
+        logger.debug(
+            f"Encoding {n_samples} sequences in {len(tasks)} chunks with {workers} workers"
+        )
+        context = torch.multiprocessing.get_context("spawn")
+        with context.Pool(workers) as pool:
+            chunks = pool.starmap(_encode_chunk, tasks)
+
+        sequences = _concatenate_padded([sequences for sequences, _ in chunks], TOKENS["PAD"])
+        taxonomies = torch.cat([taxonomies for _, taxonomies in chunks])
+        return data.TensorData(
+            sequences, taxonomies, self.model.dna_encoder, self.model.tax_encoder, input_data.name
+        )
+
+
+def _records_to_data(records: Iterable[tuple[str, str]], name: str | None = None) -> data.Data:
+    """Put FASTA records into the data container of MycoAI without writing a FASTA file.
+
+    The records are converted in the same way as `data.Data(fasta_file, tax_parser=None)` reads
+    a FASTA file: the header is the id, the sequence is upper-cased, and the repeated sequences
+    are dropped, keeping the first one.
+
+    Args:
+        records: The `(header, sequence)` pairs.
+        name: The name of the dataset. Defaults to `None`.
+
+    Returns:
+        The data container of the records.
+    """
+    frame = pd.DataFrame(
+        [(header, seq.upper()) for header, seq in records], columns=["id", "sequence"]
+    )
+    frame.drop_duplicates(subset=["sequence"], inplace=True)
+    return data.Data(frame, name=name)
+
+
+def _slice_data(input_data: data.Data, start: int, end: int) -> data.Data:
+    """Get a shallow copy of the parsed FASTA file with only the sequences from `start` to `end`."""
+    chunk = copy.copy(input_data)
+    chunk.data = input_data.data.iloc[start:end]
+    return chunk
+
+
+def _encode_chunk(
+    chunk: data.Data, dna_encoder: Any, tax_encoder: Any
+) -> tuple[torch.Tensor, torch.Tensor]:
+    """Encode a chunk of sequences in a worker process.
+
+    Returns:
+        The encoded sequences and taxonomies, which are moved to shared memory when they are sent
+            to the main process.
+    """
+    encoded_data = chunk.encode_dataset(dna_encoder, tax_encoder)
+    return encoded_data.sequences, encoded_data.taxonomies
+
+
+def _concatenate_padded(tensors: list[torch.Tensor], padding_value: int) -> torch.Tensor:
+    """Concatenate tensors along the first dimension, right-padding the second dimension.
+
+    Args:
+        tensors: The tensors to concatenate, with the same shape except the first two dimensions.
+        padding_value: The value to pad the tensors narrower than the widest one with.
+
+    Returns:
+        The concatenated tensor.
+    """
+    width = max(tensor.shape[1] for tensor in tensors)
+    return torch.cat(
+        [
+            torch.nn.functional.pad(tensor, (0, width - tensor.shape[1]), value=padding_value)
+            if tensor.dim() == 2 and tensor.shape[1] < width
+            else tensor
+            for tensor in tensors
+        ]
+    )
+
+
+class MycoAICNNEmbedModel(_MycoAIEmbedModel):
+    """Embedding model for the pretrained MycoAI-CNN."""
+
+    name = "MycoAI-CNN"
+
+
+class MycoAIBERTEmbedModel(_MycoAIEmbedModel):
+    """Embedding model for the pretrained MycoAI-BERT.
+
+    The sequences are tokenized with byte pair encoding and padded to the longest sequence, but
+    ITS sequences vary a lot in length, and the compute of the transformer grows with the padded
+    length. So the sequences are sorted by their number of tokens and grouped into batches of
+    similar lengths with at most `max_batch_tokens` padded tokens each, and the padding beyond the
+    longest sequence of each batch is removed. The padding tokens are masked in the attention, so
+    the embeddings are the same as with fixed-size batches, and they are returned in the original
+    order of the sequences.
+    """
+
+    name = "MycoAI-BERT"
+
+    def _iter_batches(
+        self, encoded_data: data.TensorData, batch_size: int
+    ) -> Iterator[tuple[slice | np.ndarray, torch.Tensor]]:
+        """Split the encoded sequences into batches of similar lengths under a token budget.
+
+        Args:
+            encoded_data: The encoded sequences.
+            batch_size: Used for the token budget of `batch_size` padded sequences if
+                `max_batch_tokens` of the project configuration is not set.
+
+        Yields:
+            The rows of the sequences of the batch in `encoded_data`, and the encoded sequences
+                of the batch without the padding beyond the longest sequence of the batch.
+        """
+        sequences = encoded_data.sequences
+        if len(sequences) == 0:
+            return
+        max_tokens = self._config.max_batch_tokens or batch_size * sequences.shape[1]
+        lengths = (sequences != TOKENS["PAD"]).sum(dim=1).numpy()
+        for rows in _token_budget_batches(lengths, max_tokens):
+            width = max(1, int(lengths[rows[0]]))
+            yield rows, sequences[torch.from_numpy(rows), :width]
+
+
+def _token_budget_batches(lengths: np.ndarray, max_tokens: int) -> list[np.ndarray]:
+    """Group sequences of similar lengths into batches under a token budget.
+
+    The sequences are sorted by decreasing length, so the first sequence of each batch is the
+    longest, and each batch has as many sequences as fit into `max_tokens` when padded to it.
+    A sequence longer than `max_tokens` is a batch on its own.
+
+    Args:
+        lengths: The number of tokens of each sequence.
+        max_tokens: The maximum number of padded tokens per batch.
+
+    Returns:
+        The indices of the sequences of each batch, the longest sequence first.
+    """
+    order = np.argsort(-lengths, kind="stable")
+    batches = []
+    start = 0
+    while start < len(order):
+        width = max(1, int(lengths[order[start]]))
+        size = max(1, max_tokens // width)
+        batches.append(order[start : start + size])
+        start += size
+    return batches
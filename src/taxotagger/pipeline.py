@@ -0,0 +1,178 @@
+from __future__ import annotations
+import logging
+import queue
+import threading
+import time
+from typing import Any
+from typing import Callable
+from typing import Iterable
+from typing import Iterator
+
+
+logger = logging.getLogger(__name__)
+
+# Marks the end of the stream of items in a queue
+_DONE = object()
+
+
+class _Failure:
+    """Carries an exception raised by a stage down the pipeline to the consumer."""
+
+    def __init__(self, exception: BaseException) -> None:
+        self.exception = exception
+
+
+class Pipeline:
+    """A pipeline of stages processing a stream of items concurrently.
+
+    The items are read from the source iterable in a thread, and each stage runs in its own
+    thread, so while the model embeds chunk N, chunk N+1 is read and encoded and chunk N-1 is
+    inserted into or searched in the database. The stages spend most of their time in PyTorch,
+    NumPy or database client calls, which release the GIL, so the total time approaches the time
+    of the slowest stage instead of the sum of all stages.
+
+    The threads are connected by queues of at most `queue_size` items. A stage blocks when the
+    queue to the next stage is full, so a fast stage cannot run ahead of a slow one, and at most
+    `queue_size` items wait between two stages at any time.
+
+    The items are processed by each stage one at a time and in order, so the stages can keep
+    state between items and the outputs are in the same order as the inputs. An exception raised
+    in the source or any stage stops the pipeline and is raised to the consumer.
+
+    Attributes:
+        stages: The `(name, function)` pairs of the stages, in order. The function of each stage
+            is called with the output of the previous stage.
+        queue_size: The maximum number of items waiting between two stages.
+        source_name: The name of the source in the timings.
+        sink_name: The name of the consumer of the outputs in the timings.
+        timings: The time in seconds spent in the source, each stage and the consumer during the
+            last run, excluding the time spent waiting for the other stages, and the wall time of
+            the run under the key `"total"`.
+
+    Examples:
+        >>> pipeline = Pipeline([("double", lambda x: 2 * x), ("square", lambda x: x * x)])
+        >>> list(pipeline.run(range(4)))
+        [0, 4, 16, 36]
+        >>> pipeline.summary()
+        'read 0.00s, double 0.00s, square 0.00s, consume 0.00s, total 0.00s'
+    """
+
+    def __init__(
+        self,
+        stages: list[tuple[str, Callable[[Any], Any]]],
+        queue_size: int = 2,
+        source_name: str = "read",
+        sink_name: str = "consume",
+    ) -> None:
+        if queue_size < 1:
+            raise ValueError(f"Invalid queue size {queue_size}, it must be at least 1")
+        self.stages = stages
+        self.queue_size = queue_size
+        self.source_name = source_name
+        self.sink_name = sink_name
+        self.timings: dict[str, float] = {}
+
+    def run(self, items: Iterable[Any]) -> Iterator[Any]:
+        """Run the pipeline on the items.
+
+        The threads are started on the first `next` call, and are stopped when all outputs have
+        been consumed or the returned iterator is closed.
+
+        Args:
+            items: The source of the items, e.g. the chunks of a FASTA file. It is iterated in the
+                source thread.
+
+        Yields:
+            The outputs of the last stage, in the order of the items.
+        """
+        names = [self.source_name, *(name for name, _ in self.stages), self.sink_name]
+        self.timings = dict.fromkeys(names, 0.0)
+        self.timings["total"] = 0.0
+        queues: list[queue.Queue] = [
+            queue.Queue(maxsize=self.queue_size) for _ in range(len(self.stages) + 1)
+        ]
+        stop = threading.Event()
+
+        def put(outbox: queue.Queue, item: Any) -> bool:
+            """Put the item into the queue, unless the pipeline is stopped while waiting."""
+            while not stop.is_set():
+                try:
+                    outbox.put(item, timeout=0.1)
+                    return True
+                except queue.Full:
+                    continue
+            return False
+
+        def get(inbox: queue.Queue) -> Any:
+            """Get the next item from the queue, or `_DONE` if the pipeline is stopped."""
+            while not stop.is_set():
+                try:
+                    return inbox.get(timeout=0.1)
+                except queue.Empty:
+                    continue
+            return _DONE
+
+        def read() -> None:
+            iterator = iter(items)
+            while True:
+                start = time.perf_counter()
+                try:
+                    item = next(iterator)
+                except StopIteration:
+                    put(queues[0], _DONE)
+                    return
+                except BaseException as e:
+                    put(queues[0], _Failure(e))
+                    return
+                finally:
+                    self.timings[self.source_name] += time.perf_counter() - start
+                if not put(queues[0], item):
+                    return
+
+        def process(index: int, name: str, func: Callable[[Any], Any]) -> None:
+            inbox, outbox = queues[index], queues[index + 1]
+            while True:
+                item = get(inbox)
+                if item is _DONE or isinstance(item, _Failure):
+                    put(outbox, item)
+                    return
+                start = time.perf_counter()
+                try:
+                    output = func(item)
+                except BaseException as e:
+                    put(outbox, _Failure(e))
+                    return
+                finally:
+                    self.timings[name] += time.perf_counter() - start
+                if not put(outbox, output):
+                    return
+
+        threads = [threading.Thread(target=read, name=f"pipeline-{self.source_name}")]
+        for index, (name, func) in enumerate(self.stages):
+            threads.append(
+                threading.Thread(target=process, args=(index, name, func), name=f"pipeline-{name}")
+            )
+
+        start = time.perf_counter()
+        for thread in threads:
+            thread.daemon = True
+            thread.start()
+        try:
+            while True:
+                item = queues[-1].get()
+                if item is _DONE:
+                    return
+                if isinstance(item, _Failure):
+                    raise item.exception
+                consume_start = time.perf_counter()
+                yield item
+                self.timings[self.sink_name] += time.perf_counter() - consume_start
+        finally:
+            stop.set()
+            for thread in threads:
+                thread.join()
+            self.timings["total"] = time.perf_counter() - start
+
+    def summary(self) -> str:
+        """Get the timings of the last run as a string, e.g. for logging."""
+        return ", ".join(f"{name} {seconds:.2f}s" for name, seconds in self.timings.items())
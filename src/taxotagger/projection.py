@@ -0,0 +1,163 @@
+from __future__ import annotations
+import logging
+import warnings
+from dataclasses import dataclass
+from dataclasses import field
+from os import PathLike
+from typing import Literal
+from typing import cast
+import numpy as np
+from .embeddings import EmbeddingBatch
+from .embeddings import l2_normalize
+
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class Projection:
+    """Linear projection of the embeddings of some taxonomy levels to fewer dimensions.
+
+    The embeddings of a taxonomy level have one feature per class of the level, e.g. 14742 for
+    species, but they are sparse and low-rank in practice. Projecting them to a few hundred
+    dimensions shrinks the database and speeds up the search, at the cost of some changes in the
+    top-k neighbours, see
+    [`TaxoTagger.benchmark_projection`][taxotagger.TaxoTagger.benchmark_projection].
+
+    The embeddings are L2-normalised before the projection, and the projection is linear without
+    centering, so the dot products of the projected embeddings approximate the cosine similarity
+    of the original embeddings.
+
+    Attributes:
+        method: The method used to fit the projection, `"pca"` or `"random"`.
+        components: The projection matrices with shape `(n_components, n_features)`, the keys
+            are the projected taxonomy levels.
+
+    Examples:
+        >>> batch = tagger.embed("dna.fasta", as_batch=True)
+        >>> projection = Projection.fit(batch, {"species": 256, "genus": 128})
+        >>> projected = projection.transform(batch)
+        >>> projected.vectors["species"].shape
+        (1000, 256)
+    """
+
+    method: Literal["pca", "random"]
+    components: dict[str, np.ndarray] = field(default_factory=dict)
+
+    @classmethod
+    def fit(
+        cls,
+        batch: EmbeddingBatch,
+        dims: dict[str, int],
+        method: Literal["pca", "random"] = "pca",
+        seed: int = 0,
+    ) -> Projection:
+        """Fit the projection of the taxonomy levels to the target dimensions.
+
+        Args:
+            batch: The embeddings to fit the projection on. The random projection only uses their
+                number of features.
+            dims: The target dimension for each taxonomy level to project. Taxonomy levels with a
+                target dimension not smaller than their number of features are not projected.
+            method: `"pca"` for the top right singular vectors of the normalised embeddings, i.e.
+                PCA without centering, which best preserves their dot products, or `"random"` for
+                a Gaussian random projection. Defaults to `"pca"`.
+            seed: The random seed of the random projection. Defaults to `0`.
+
+        Returns:
+            The fitted projection.
+        """
+        if method not in ("pca", "random"):
+            raise ValueError(f"Invalid projection method {method}. Valid methods are pca, random")
+
+        projection = cls(method)
+        rng = np.random.default_rng(seed)
+        for taxo_level, n_components in dims.items():
+            n_samples, n_features = batch.vectors[taxo_level].shape
+            if n_components >= n_features:
+                logger.warning(
+                    f"The target dimension {n_components} of {taxo_level} is not smaller than "
+                    f"its {n_features} features, the level is not projected"
+                )
+                warnings.warn(
+                    f"The target dimension {n_components} of {taxo_level} is not smaller than "
+                    f"its {n_features} features, the level is not projected"
+                )
+                continue
+
+            if method == "random":
+                components = rng.standard_normal((n_components, n_features)) / np.sqrt(n_components)
+                projection.components[taxo_level] = components.astype(np.float32)
+                continue
+
+            if n_components > n_samples:
+                logger.warning(
+                    f"PCA of {taxo_level} can fit at most {n_samples} components on "
+                    f"{n_samples} sequences, got target dimension {n_components}"
+                )
+                warnings.warn(
+                    f"PCA of {taxo_level} can fit at most {n_samples} components on "
+                    f"{n_samples} sequences, got target dimension {n_components}"
+                )
+                n_components = n_samples
+            vectors = l2_normalize(batch.vectors[taxo_level])
+            _, _, vt = np.linalg.svd(vectors, full_matrices=False)
+            projection.components[taxo_level] = vt[:n_components].astype(np.float32)
+        return projection
+
+    @property
+    def dims(self) -> dict[str, int]:
+        """The target dimension of each projected taxonomy level."""
+        return {taxo_level: c.shape[0] for taxo_level, c in self.components.items()}
+
+    def transform(self, batch: EmbeddingBatch) -> EmbeddingBatch:
+        """Project the embeddings of the projected taxonomy levels.
+
+        Args:
+            batch: The embeddings to project.
+
+        Returns:
+            The embeddings with the projected vectors, the other taxonomy levels are unchanged.
+        """
+        vectors = dict(batch.vectors)
+        for taxo_level, components in self.components.items():
+            if taxo_level in vectors:
+                normalized = l2_normalize(vectors[taxo_level])
+                vectors[taxo_level] = (normalized @ components.T).astype(np.float32)
+        return EmbeddingBatch(batch.metadata, vectors)
+
+    def save(self, path: str | PathLike) -> None:
+        """Save the projection to a `.npz` file.
+
+        Args:
+            path: The path to the file.
+        """
+        arrays: dict[str, np.ndarray] = {"method": np.array(self.method)}
+        for taxo_level, components in self.components.items():
+            arrays[taxo_level] = components
+        with open(path, "wb") as fh:
+            # the stubs of numpy do not tell the arrays from the `allow_pickle` keyword argument
+            np.savez(fh, **arrays)  # type: ignore[arg-type]
+
+    @classmethod
+    def load(cls, path: str | PathLike) -> Projection:
+        """Load a projection saved by [`save`][taxotagger.projection.Projection.save].
+
+        Args:
+            path: The path to the file.
+
+        Returns:
+            The loaded projection.
+
+        Raises:
+            ValueError: If the projection method in the file is invalid.
+        """
+        with np.load(path) as data:
+            method = str(data["method"])
+            if method not in ("pca", "random"):
+                raise ValueError(f"Invalid projection method {method} in {path}")
+            projection = cls(cast(Literal["pca", "random"], method))
+            for key in data.files:
+                if key != "method":
+                    projection.components[key] = data[key]
+        return projection
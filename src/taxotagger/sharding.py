@@ -0,0 +1,237 @@
+"""Embed a FASTA file in shards, in several processes or on several hosts.
+
+A single PyTorch process does not scale linearly over all cores of a machine, especially across
+CPU sockets, and a large reference database may be embedded faster on several hosts. The FASTA
+file is split into byte ranges of about the same size, aligned to the records, and each shard is
+embedded by its own worker with its own copy of the model, pinned to its own CPU cores. The
+embeddings of the shards are then concatenated in the order of the shards, which is the order of
+the records in the file.
+
+[`TaxoTagger.embed_sharded`][taxotagger.TaxoTagger.embed_sharded] runs the shards in worker
+processes on one host. To spread the shards over several hosts, run each shard with the command
+line interface of this module, and merge the output files of all shards afterwards:
+
+```bash
+# on host i of N, with the same FASTA file
+python -m taxotagger.sharding embed dna.fasta --shard i --n-shards N --output shard_i.npz
+# on any host, with the output files in the order of the shards
+python -m taxotagger.sharding merge shard_0.npz shard_1.npz ... --output dna.npz
+```
+
+The merged file can be loaded with
+[`EmbeddingBatch.load`][taxotagger.embeddings.EmbeddingBatch.load].
+"""
+
+from __future__ import annotations
+import argparse
+import logging
+import mmap
+import os
+from os import PathLike
+from typing import Sequence
+import numpy as np
+from .config import ProjectConfig
+from .embeddings import METADATA_FIELDS
+from .embeddings import EmbeddingBatch
+from .utils import iter_fasta_chunks
+
+
+logger = logging.getLogger(__name__)
+
+
+def fasta_shards(fasta_file: str | PathLike, n_shards: int) -> list[tuple[int, int]]:
+    """Split an uncompressed FASTA file into byte ranges of about the same size.
+
+    Each range starts at the beginning of a record, so each record is in exactly one range. The
+    ranges only depend on the content of the file and the number of shards, so they are the same
+    on every host.
+
+    Args:
+        fasta_file: The path to the FASTA file.
+        n_shards: The number of shards.
+
+    Returns:
+        The `(start, end)` byte ranges of the shards, in the order of the file. A range is empty
+            if a record is larger than a shard.
+
+    Raises:
+        ValueError: If the number of shards is less than 1, or the file is gzip-compressed.
+    """
+    if n_shards < 1:
+        raise ValueError(f"Invalid number of shards {n_shards}, it must be at least 1")
+    with open(fasta_file, "rb") as fh:
+        if fh.read(2) == b"\x1f\x8b":  # gzip magic number
+            raise ValueError(f"Cannot split the gzip-compressed file {fasta_file} into shards")
+        size = os.fstat(fh.fileno()).st_size
+        if size == 0:
+            return [(0, 0)] * n_shards
+        bounds = [0]
+        with mmap.mmap(fh.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            for i in range(1, n_shards):
+                target = max(i * size // n_shards, bounds[-1])
+                # the next record starts after the first newline followed by `>` from the target
+                newline = mm.find(b"\n>", max(target - 1, 0))
+                bounds.append(size if newline == -1 else newline + 1)
+        bounds.append(size)
+    return list(zip(bounds[:-1], bounds[1:]))
+
+
+def embed_shard(
+    fasta_file: str | PathLike,
+    shard: int,
+    n_shards: int,
+    config: ProjectConfig,
+    model_id: str = "MycoAI-CNN",
+    batch_size: int | None = None,
+    levels: list[str] | None = None,
+    output_file: str | PathLike | None = None,
+    cpus: list[int] | None = None,
+) -> EmbeddingBatch:
+    """Embed the records of one shard of a FASTA file.
+
+    The records are read and embedded in chunks of `chunk_size` of the project configuration.
+    Repeated sequences are skipped by the MycoAI models within each chunk only, so unlike
+    [`TaxoTagger.embed`][taxotagger.TaxoTagger.embed], a sequence repeated in different chunks
+    or shards is embedded once per chunk.
+
+    Args:
+        fasta_file: The path to the uncompressed FASTA file.
+        shard: The index of the shard, from `0` to `n_shards - 1`.
+        n_shards: The number of shards of the file, see
+            [`fasta_shards`][taxotagger.sharding.fasta_shards].
+        config: The configurations for the project.
+        model_id: The model ID to use for embedding the DNA sequences. Defaults to "MycoAI-CNN".
+        batch_size: The number of sequences per forward pass of the model. Defaults to the
+            `batch_size` of the project configuration.
+        levels: The taxonomy levels to embed. Defaults to all taxonomy levels.
+        output_file: The `.npz` file to save the embeddings of the shard to, see
+            [`EmbeddingBatch.save`][taxotagger.embeddings.EmbeddingBatch.save]. Defaults to
+            `None`, i.e. the embeddings are not saved.
+        cpus: The CPU cores to pin the process to, on Linux only. Defaults to `None`, i.e. the
+            process is not pinned.
+
+    Returns:
+        The embeddings of the records of the shard, in the order of the file.
+
+    Raises:
+        ValueError: If the index of the shard is out of range.
+    """
+    if not 0 <= shard < n_shards:
+        raise ValueError(f"Invalid shard {shard}, it must be in the range [0, {n_shards})")
+    if cpus is not None and hasattr(os, "sched_setaffinity"):
+        os.sched_setaffinity(0, cpus)
+
+    # PyTorch and MycoAI are imported on first use, they are slow to import
+    from .models import ModelFactory
+
+    byte_range = fasta_shards(fasta_file, n_shards)[shard]
+    logger.info(f"Embedding shard {shard} of {n_shards} of {fasta_file}, bytes {byte_range}")
+    model = ModelFactory.get_model(model_id, config)
+    batches = [
+        model.embed_encoded(model.encode_records(chunk), batch_size, levels)
+        for chunk in iter_fasta_chunks(fasta_file, config.chunk_size, byte_range=byte_range)
+    ]
+    if batches:
+        batch = EmbeddingBatch.concatenate(batches)
+    else:
+        batch = EmbeddingBatch(np.empty((0, len(METADATA_FIELDS)), dtype=object), {})
+
+    if output_file is not None:
+        batch.save(output_file)
+    return batch
+
+
+def merge_shards(
+    shard_files: Sequence[str | PathLike], output_file: str | PathLike | None = None
+) -> EmbeddingBatch:
+    """Merge the embeddings of the shards of a FASTA file.
+
+    Args:
+        shard_files: The `.npz` files of the embeddings of the shards, in the order of the
+            shards.
+        output_file: The `.npz` file to save the merged embeddings to. Defaults to `None`, i.e.
+            the merged embeddings are not saved.
+
+    Returns:
+        The embeddings of all records of the FASTA file, in the order of the file.
+    """
+    batch = EmbeddingBatch.concatenate(EmbeddingBatch.load(file) for file in shard_files)
+    if output_file is not None:
+        batch.save(output_file)
+    return batch
+
+
+def split_cpus(n_workers: int) -> list[list[int] | None]:
+    """Split the CPU cores available to the process into contiguous groups, one per worker.
+
+    Contiguous core numbers usually belong to the same CPU socket, so the workers of a 2-socket
+    machine with an even number of workers do not share the memory of the sockets.
+
+    Args:
+        n_workers: The number of workers.
+
+    Returns:
+        The CPU cores of each worker, or `None` for each worker if the CPU affinity is not
+            supported by the platform or there are fewer cores than workers.
+    """
+    if not hasattr(os, "sched_getaffinity"):
+        return [None] * n_workers
+    cpus = sorted(os.sched_getaffinity(0))
+    if len(cpus) < n_workers:
+        return [None] * n_workers
+    return [group.tolist() for group in np.array_split(np.array(cpus), n_workers)]
+
+
+def main(argv: list[str] | None = None) -> None:
+    """Run the command line interface to embed the shards of a FASTA file and merge them."""
+    parser = argparse.ArgumentParser(
+        prog="python -m taxotagger.sharding", description=__doc__.splitlines()[0]
+    )
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    shards_parser = subparsers.add_parser("shards", help="Print the byte ranges of the shards")
+    shards_parser.add_argument("fasta_file", help="The uncompressed FASTA file")
+    shards_parser.add_argument("--n-shards", type=int, required=True, help="The number of shards")
+
+    embed_parser = subparsers.add_parser("embed", help="Embed one shard of a FASTA file")
+    embed_parser.add_argument("fasta_file", help="The uncompressed FASTA file")
+    embed_parser.add_argument("--shard", type=int, required=True, help="The index of the shard")
+    embed_parser.add_argument("--n-shards", type=int, required=True, help="The number of shards")
+    embed_parser.add_argument("--output", required=True, help="The output .npz file")
+    embed_parser.add_argument("--model", default="MycoAI-CNN", help="The model identifier")
+    embed_parser.add_argument("--levels", nargs="+", help="The taxonomy levels to embed")
+    embed_parser.add_argument("--batch-size", type=int, help="The sequences per forward pass")
+    embed_parser.add_argument("--num-threads", type=int, help="The intra-op threads of PyTorch")
+    embed_parser.add_argument("--mycoai-home", help="The directory of the models")
+    embed_parser.add_argument("--device", default="cpu", help="The device to run the model on")
+
+    merge_parser = subparsers.add_parser("merge", help="Merge the output files of the shards")
+    merge_parser.add_argument("shard_files", nargs="+", help="The .npz files in shard order")
+    merge_parser.add_argument("--output", required=True, help="The merged .npz file")
+
+    args = parser.parse_args(argv)
+    if args.command == "shards":
+        for shard, (start, end) in enumerate(fasta_shards(args.fasta_file, args.n_shards)):
+            print(f"{shard}\t{start}\t{end}")
+    elif args.command == "embed":
+        config = ProjectConfig(device=args.device, num_threads=args.num_threads)
+        if args.mycoai_home is not None:
+            config.mycoai_home = args.mycoai_home
+        batch = embed_shard(
+            args.fasta_file,
+            args.shard,
+            args.n_shards,
+            config,
+            model_id=args.model,
+            batch_size=args.batch_size,
+            levels=args.levels,
+            output_file=args.output,
+        )
+        print(f"Embedded {len(batch)} sequences of shard {args.shard} to {args.output}")
+    else:
+        batch = merge_shards(args.shard_files, args.output)
+        print(f"Merged {len(batch)} sequences of {len(args.shard_files)} shards to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
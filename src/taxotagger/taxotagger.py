@@ -1,46 +1,167 @@
+from __future__ import annotations
+import json
 import logging
+import multiprocessing
 import os
+import tempfile
+import threading
+import time
 import warnings
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
 from typing import Any
-from pymilvus import DataType
-from pymilvus import MilvusClient
-from pympler import asizeof
+from typing import Callable
+from typing import Iterable
+from typing import Iterator
+from typing import Literal
+from typing import overload
+from urllib.parse import quote
+import numpy as np
+from .abc import EmbedModelBase
+from .abc import VectorStoreBase
+from .cache import EmbeddingCache
+from .cache import SearchResultCache
+from .cache import sequence_hash
 from .config import ProjectConfig
-from .defaults import MAX_BATCH_SIZE_BYTES
 from .defaults import TAXONOMY_LEVELS
+from .embeddings import EmbeddingBatch
+from .evaluation import recall_at_k
 from .logger import setup_logging
-from .models import ModelFactory
+from .pipeline import Pipeline
+from .projection import Projection
+from .sharding import embed_shard
+from .sharding import merge_shards
+from .sharding import split_cpus
+from .utils import is_local
+from .utils import iter_fasta_chunks
+from .utils import parse_fasta
+from .utils import parse_unite_fasta_headers
+from .utils import temporary_fasta
+from .vector_stores import MilvusVectorStore
+from .vector_stores import NumpyVectorStore
+from .vector_stores import VectorStoreFactory
 
 
 logger = logging.getLogger(__name__)
 
 
 class TaxoTagger:
-    """The taxonomy tagger class."""
+    """The taxonomy tagger class.
+
+    The databases are accessed through the [vector store][taxotagger.vector_stores] selected by
+    the `vector_store` of the project configuration. The stores opened by
+    [`search`][taxotagger.TaxoTagger.search] and [`create_db`][taxotagger.TaxoTagger.create_db]
+    are kept open and reused by later calls on the same database, until they are idle for longer
+    than the `db_idle_timeout` of the project configuration or
+    [`close`][taxotagger.TaxoTagger.close] is called. The idle stores are closed by a timer in a
+    daemon thread, also if there are no further calls. The class can be used as a context manager
+    to close the stores on exit.
+
+    Examples:
+        >>> config = ProjectConfig()
+        >>> with TaxoTagger(config) as tagger:
+        ...     results1 = tagger.search("dna1.fasta")
+        ...     results2 = tagger.search("dna2.fasta")  # reuses the open database
+    """
 
     def __init__(self, config: ProjectConfig) -> None:
         self._config = config
         setup_logging(config.log_level, config.log_file, config.log_to_console)
+        # db path -> (vector store, time of last use, number of users)
+        self._stores: dict[str, tuple[VectorStoreBase, float, int]] = {}
+        self._stores_lock = threading.Lock()
+        # the timer closing the next idle store
+        self._idle_timer: threading.Timer | None = None
+        # projection path -> (modification time, projection)
+        self._projections: dict[str, tuple[float, Projection]] = {}
+        self._search_cache = SearchResultCache(max_size=config.search_cache_size)
+
+    def __enter__(self) -> TaxoTagger:
+        return self
+
+    def __exit__(self, *args: Any) -> None:
+        self.close()
+
+    def close(self) -> None:
+        """Close all the open vector stores."""
+        with self._stores_lock:
+            if self._idle_timer is not None:
+                self._idle_timer.cancel()
+                self._idle_timer = None
+            for db_path, (store, _, _) in self._stores.items():
+                logger.debug(f"Closing the database {db_path}")
+                store.close()
+            self._stores.clear()
 
+    @overload
     def embed(
         self,
         fasta_file: str,
         model_id: str = "MycoAI-CNN",
-    ) -> dict[str, list[dict[str, Any]]]:
+        batch_size: int | None = None,
+        as_batch: Literal[False] = False,
+        levels: list[str] | None = None,
+    ) -> dict[str, list[dict[str, Any]]]: ...
+
+    @overload
+    def embed(
+        self,
+        fasta_file: str,
+        model_id: str = "MycoAI-CNN",
+        batch_size: int | None = None,
+        *,
+        as_batch: Literal[True],
+        levels: list[str] | None = None,
+    ) -> EmbeddingBatch: ...
+
+    @overload
+    def embed(
+        self,
+        fasta_file: str,
+        model_id: str = "MycoAI-CNN",
+        batch_size: int | None = None,
+        as_batch: bool = False,
+        levels: list[str] | None = None,
+    ) -> dict[str, list[dict[str, Any]]] | EmbeddingBatch: ...
+
+    def embed(
+        self,
+        fasta_file: str,
+        model_id: str = "MycoAI-CNN",
+        batch_size: int | None = None,
+        as_batch: bool = False,
+        levels: list[str] | None = None,
+    ) -> dict[str, list[dict[str, Any]]] | EmbeddingBatch:
         """Embed the DNA sequences in the fasta file using the specified model.
 
         This is a wrapper function for the [`embed` method][taxotagger.abc.EmbedModelBase.embed] of
         each embedding model. See the [`models` module][taxotagger.models] for more details for each
         model.
 
+        If `embedding_cache` of the project configuration is enabled, the embeddings of sequences
+        that have been embedded with the same model before are read from the
+        [embedding cache][taxotagger.cache.EmbeddingCache], and only the other sequences are
+        embedded by the model.
+
         Args:
             fasta_file: The path to the fasta file. Make sure the fasta file has no empty/duplicated
                 headers or sequences.
             model_id: The model ID to use for embedding the DNA sequences. Defaults to "MycoAI-CNN".
                 Available models see [`taxotagger.defaults.PRETRAINED_MODELS`][taxotagger.defaults.PRETRAINED_MODELS].
+            batch_size: The number of sequences per forward pass of the model. Defaults to the
+                `batch_size` of the project configuration.
+            as_batch: Whether to return an [`EmbeddingBatch`][taxotagger.embeddings.EmbeddingBatch]
+                with one contiguous float32 matrix per taxonomy level and the header metadata
+                stored once, instead of the lists of dictionaries. Defaults to `False`.
+            levels: The taxonomy levels to embed. The outputs of the other levels are neither
+                copied nor converted, which saves memory and time when the large species level is
+                not needed. Invalid levels are ignored with a warning. Defaults to all taxonomy
+                levels.
 
         Returns:
-            A dictionary of embeddings for each taxonomy level.
+            A dictionary of embeddings for each taxonomy level, or an `EmbeddingBatch` if
+                `as_batch` is `True`.
                 The dictionary keys are the [taxonomy levels][taxotagger.defaults.TAXONOMY_LEVELS],
                 and the values are lists of dictionaries containing the id, embeddings and metadata
                 for each sequence.
@@ -73,8 +194,214 @@ class TaxoTagger:
         logger.info(
             f"Embedding the DNA sequences in [magenta]{fasta_file}[/magenta] using the model [magenta]{model_id}[/magenta]"
         )
-        model = ModelFactory.get_model(model_id, self._config)
-        return model.embed(fasta_file)
+        if levels is not None:
+            levels = self._validate_taxonomies(levels)
+        model = self._get_model(model_id)
+        if not self._config.embedding_cache:
+            return model.embed(fasta_file, batch_size=batch_size, as_batch=as_batch, levels=levels)
+
+        # The embedding cache stores all taxonomy levels of each sequence
+        batch = self._embed_cached(model, fasta_file, batch_size)
+        if levels is not None:
+            batch = batch.select(levels)
+        return batch if as_batch else batch.to_dict()
+
+    def _embed_cached(
+        self, model: EmbedModelBase, fasta_file: str, batch_size: int | None
+    ) -> EmbeddingBatch:
+        """Embed the sequences in the fasta file, reusing the embeddings in the embedding cache.
+
+        Args:
+            model: The embedding model.
+            fasta_file: The path to the fasta file.
+            batch_size: The number of sequences per forward pass of the model.
+
+        Returns:
+            The embeddings of the sequences in the fasta file. Repeated sequences are dropped,
+                keeping the first one, as the model does without the cache.
+        """
+        # The model drops repeated sequences, so the cache returns the same rows as the model
+        first_indices: dict[str, int] = {}
+        all_records = list(parse_fasta(fasta_file).items())
+        for i, (_, seq) in enumerate(all_records):
+            first_indices.setdefault(sequence_hash(seq), i)
+        records = [all_records[i] for i in first_indices.values()]
+        seq_hashes = list(first_indices)
+        metadata = parse_unite_fasta_headers(header for header, _ in records)
+
+        cache = EmbeddingCache.for_model(self._config, model.name)
+        hit_indices, hit_vectors = cache.get(seq_hashes)
+        hit_set = set(hit_indices)
+        miss_indices = [i for i in range(len(records)) if i not in hit_set]
+        logger.info(f"Found {len(hit_indices)} of {len(records)} sequences in the embedding cache")
+        if not miss_indices:
+            return EmbeddingBatch(metadata, hit_vectors)
+
+        with temporary_fasta(records[i] for i in miss_indices) as miss_file:
+            miss_batch = model.embed(miss_file, batch_size=batch_size, as_batch=True)
+
+        if list(miss_batch.ids) != [metadata[i][0] for i in miss_indices]:
+            # The model skipped or reordered some sequences, so the cached embeddings cannot be
+            # aligned with the output of the model
+            logger.warning(
+                f"The model {model.name} did not embed all the sequences in {fasta_file} in order, "
+                "the embedding cache is not used"
+            )
+            return model.embed(fasta_file, batch_size=batch_size, as_batch=True)
+        cache.put([seq_hashes[i] for i in miss_indices], miss_batch.vectors)
+
+        if not hit_indices:
+            return EmbeddingBatch(metadata, miss_batch.vectors)
+
+        vectors = {}
+        for taxo_level, miss_vectors in miss_batch.vectors.items():
+            vectors[taxo_level] = np.empty((len(records), miss_vectors.shape[1]), dtype=np.float32)
+            vectors[taxo_level][miss_indices] = miss_vectors
+            vectors[taxo_level][hit_indices] = hit_vectors[taxo_level]
+        return EmbeddingBatch(metadata, vectors)
+
+    def embed_iter(
+        self,
+        fasta_file: str,
+        model_id: str = "MycoAI-CNN",
+        chunk_size: int | None = None,
+        batch_size: int | None = None,
+        as_batch: bool = False,
+        levels: list[str] | None = None,
+    ) -> Iterator[dict[str, list[dict[str, Any]]] | EmbeddingBatch]:
+        """Embed the DNA sequences in the fasta file chunk by chunk.
+
+        Unlike [`embed`][taxotagger.TaxoTagger.embed], the fasta file is read lazily and only one
+        chunk of sequences is parsed, encoded and embedded at a time. Use this method for fasta
+        files that are too large to be embedded at once.
+
+        The MycoAI models skip repeated sequences, which is only done within each chunk: a
+        sequence repeated in different chunks is embedded and yielded once per chunk, while
+        `embed` returns it once for the whole file.
+
+        Args:
+            fasta_file: The path to the fasta file. Make sure the fasta file has no empty/duplicated
+                headers or sequences.
+            model_id: The model ID to use for embedding the DNA sequences. Defaults to "MycoAI-CNN".
+                Available models see [`taxotagger.defaults.PRETRAINED_MODELS`][taxotagger.defaults.PRETRAINED_MODELS].
+            chunk_size: The maximum number of sequences in each chunk. Defaults to the
+                `chunk_size` of the project configuration.
+            batch_size: The number of sequences per forward pass of the model. Defaults to the
+                `batch_size` of the project configuration.
+            as_batch: Whether to yield [`EmbeddingBatch`][taxotagger.embeddings.EmbeddingBatch]
+                objects instead of dictionaries. Defaults to `False`.
+            levels: The taxonomy levels to embed, see [`embed`][taxotagger.TaxoTagger.embed].
+                Defaults to all taxonomy levels.
+
+        Yields:
+            The embeddings of each chunk, in the same format as the output of
+                [`embed`][taxotagger.TaxoTagger.embed].
+
+        Examples:
+            >>> config = ProjectConfig()
+            >>> tagger = TaxoTagger(config)
+            >>> for embeddings in tagger.embed_iter("dna1.fasta", chunk_size=100):
+            ...     print(len(embeddings["phylum"]))
+        """
+        chunk_size = chunk_size or self._config.chunk_size
+        logger.info(
+            f"Embedding the DNA sequences in [magenta]{fasta_file}[/magenta] using the model "
+            f"[magenta]{model_id}[/magenta] in chunks of {chunk_size} sequences"
+        )
+        if levels is not None:
+            levels = self._validate_taxonomies(levels)
+        model = self._get_model(model_id)
+        yield from model.embed_iter(
+            fasta_file,
+            chunk_size=chunk_size,
+            batch_size=batch_size,
+            as_batch=as_batch,
+            levels=levels,
+        )
+
+    def embed_sharded(
+        self,
+        fasta_file: str,
+        model_id: str = "MycoAI-CNN",
+        n_shards: int = 2,
+        batch_size: int | None = None,
+        as_batch: bool = False,
+        levels: list[str] | None = None,
+    ) -> dict[str, list[dict[str, Any]]] | EmbeddingBatch:
+        """Embed the DNA sequences in the fasta file in shards, one worker process per shard.
+
+        The fasta file is split into `n_shards` byte ranges of about the same size, and each
+        shard is embedded by a worker process with its own copy of the model, see the
+        [`sharding` module][taxotagger.sharding]. The CPU cores of the process are split into
+        contiguous groups, one per worker, and each worker is pinned to its group and uses one
+        PyTorch thread per core of the group, unless `num_threads` of the project configuration is
+        set. The embeddings of the shards are merged in the order of the sequences in the file.
+
+        Use this method instead of [`embed`][taxotagger.TaxoTagger.embed] for large fasta files on
+        machines with many cores or several CPU sockets, over which a single PyTorch process does
+        not scale linearly. The embedding cache is not used, and repeated sequences are only
+        skipped within each chunk of a shard, see [`embed_shard`][taxotagger.sharding.embed_shard].
+
+        Args:
+            fasta_file: The path to the uncompressed fasta file. Make sure the fasta file has no
+                empty/duplicated headers or sequences.
+            model_id: The model ID to use for embedding the DNA sequences. Defaults to "MycoAI-CNN".
+                Available models see [`taxotagger.defaults.PRETRAINED_MODELS`][taxotagger.defaults.PRETRAINED_MODELS].
+            n_shards: The number of shards and worker processes. Defaults to `2`, e.g. one per
+                CPU socket.
+            batch_size: The number of sequences per forward pass of the model. Defaults to the
+                `batch_size` of the project configuration.
+            as_batch: Whether to return an [`EmbeddingBatch`][taxotagger.embeddings.EmbeddingBatch]
+                instead of the lists of dictionaries. Defaults to `False`.
+            levels: The taxonomy levels to embed, see [`embed`][taxotagger.TaxoTagger.embed].
+                Defaults to all taxonomy levels.
+
+        Returns:
+            The embeddings of the sequences in the fasta file, in the same format as the output
+                of [`embed`][taxotagger.TaxoTagger.embed].
+
+        Examples:
+            >>> config = ProjectConfig()
+            >>> tagger = TaxoTagger(config)
+            >>> embeddings = tagger.embed_sharded("dna1.fasta", n_shards=4)
+        """
+        logger.info(
+            f"Embedding the DNA sequences in [magenta]{fasta_file}[/magenta] using the model "
+            f"[magenta]{model_id}[/magenta] in {n_shards} shards"
+        )
+        if levels is not None:
+            levels = self._validate_taxonomies(levels)
+
+        cpu_groups = split_cpus(n_shards)
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            shard_files = [os.path.join(tmp_dir, f"shard_{i}.npz") for i in range(n_shards)]
+            with ProcessPoolExecutor(
+                n_shards, mp_context=multiprocessing.get_context("spawn")
+            ) as executor:
+                futures = []
+                for shard, (shard_file, cpus) in enumerate(zip(shard_files, cpu_groups)):
+                    # a worker process cannot start the processes of the parallel encoding
+                    update: dict[str, Any] = {"encode_workers": 1}
+                    if self._config.num_threads is None and cpus is not None:
+                        update["num_threads"] = len(cpus)
+                    futures.append(
+                        executor.submit(
+                            _embed_shard_to_file,
+                            fasta_file,
+                            shard,
+                            n_shards,
+                            self._config.model_copy(update=update),
+                            model_id,
+                            batch_size,
+                            levels,
+                            shard_file,
+                            cpus,
+                        )
+                    )
+                for future in futures:
+                    future.result()
+            batch = merge_shards(shard_files)
+        return batch if as_batch else batch.to_dict()
 
     def search(
         self,
@@ -83,19 +410,30 @@ class TaxoTagger:
         output_metadata: list = [],
         model_id: str = "MycoAI-CNN",
         db_name: str = "",
+        max_workers: int | None = None,
         **kwargs: Any,
     ) -> dict[str, list[list[dict]]]:
         """Conduct a semantic search for the DNA sequences in the fasta file.
 
+        The fasta file is read in chunks of `chunk_size` sequences of the project configuration,
+        and reading, encoding, embedding and searching the chunks run concurrently in a
+        [`Pipeline`][taxotagger.pipeline.Pipeline].
+
         Args:
             fasta_file: The path to the fasta file.
             output_taxonomies: List of taxonomy levels to include in the output. Defaults to all taxonomy levels.
             output_metadata: List of metadata fields to include in the output. Defaults to an empty list.
             model_id: The model ID to use for embedding the DNA sequences. Defaults to "MycoAI-CNN".
                 Available models see [`taxotagger.defaults.PRETRAINED_MODELS`][taxotagger.defaults.PRETRAINED_MODELS].
-            db_name: The name of the database to search. Defaults to the model ID.
-            kwargs: Additional keyword arguments to pass to the `search` method of the Milvus client.
-                For example:
+            db_name: The name of the database to search. Defaults to the model ID with the file
+                extension of the vector store, e.g. `MycoAI-CNN.db`. It can also be the URI of a
+                Milvus server, e.g. `http://localhost:19530`.
+            max_workers: The maximum number of taxonomy levels searched concurrently. Defaults to
+                the `search_workers` of the project configuration. The search of each taxonomy
+                level is independent, so with `max_workers` set to the number of output taxonomy
+                levels, the search takes about as long as the slowest level.
+            kwargs: Additional keyword arguments to pass to the `search` method of the vector store,
+                e.g. the Milvus client. For example:
 
                 - `limit`: The maximum number of matched results to return. Defaults to 10.
                 - `filter`: The filtering condition to filter matched results.
@@ -123,9 +461,6 @@ class TaxoTagger:
             k: v for k, v in kwargs.items() if k not in ["collection_name", "data", "output_fields"]
         }
 
-        # Get the embeddings for the query
-        embeddings = self.embed(fasta_file, model_id)
-
         #  Get output fields
         output_taxonomies = self._validate_taxonomies(output_taxonomies)
         output_taxonomies = output_taxonomies if output_taxonomies else list(TAXONOMY_LEVELS)
@@ -133,39 +468,151 @@ class TaxoTagger:
             output_taxonomies = list(TAXONOMY_LEVELS)
         output_fields = output_taxonomies + output_metadata
 
-        db_name = db_name if db_name else f"{model_id}.db"
-        db_path = os.path.join(self._config.mycoai_home, db_name)
+        db_path = self._get_db_path(db_name, model_id)
         # TODO: Check if the database exists and download it if it does not exist
 
         logger.info(
             f"Searching the DNA sequences in [magenta]{fasta_file}[/magenta] in the database {db_path}"
         )
-        client = MilvusClient(db_path)
-        results = {}
-        for taxo_level in output_taxonomies:
-            logger.debug(f"Searching in the collection [blue]{taxo_level}[/blue]")
+        if self._config.search_cache_size > 0:
+            return self._search_cached(
+                fasta_file, model_id, db_path, output_taxonomies, output_fields, max_workers, kwargs
+            )
 
-            # Prepare input data for the search
-            data = [d["vector"] for d in embeddings[taxo_level]]
+        if self._config.embedding_cache:
+            # Get the embeddings for the query
+            embeddings = self.embed(fasta_file, model_id, as_batch=True, levels=output_taxonomies)
+            return self._search_embeddings(
+                embeddings, db_path, output_taxonomies, output_fields, max_workers, kwargs
+            )
 
-            size_of_data, num_items, items_per_batch = self._get_batch_params(data)
-            logger.debug(
-                f"Embeddings for {taxo_level}: {size_of_data / (1024*1024):.1f} MB, "
-                f"{num_items} items in total, {items_per_batch} items per batch"
+        def search_chunk(embeddings: EmbeddingBatch) -> dict[str, list[list[dict]]]:
+            return self._search_embeddings(
+                embeddings, db_path, output_taxonomies, output_fields, max_workers, kwargs
             )
 
-            results_batch = []
-            for i in range(0, num_items, items_per_batch):
-                res = client.search(
-                    collection_name=taxo_level,
-                    data=data[i : i + items_per_batch],
-                    output_fields=output_fields,
-                    **kwargs,
-                )
-                results_batch += res
+        results: dict[str, list[list[dict]]] = {taxo_level: [] for taxo_level in output_taxonomies}
+        pipeline = self._embed_pipeline(
+            model_id, [("search", search_chunk)], "collect", levels=output_taxonomies
+        )
+        for chunk_results in pipeline.run(iter_fasta_chunks(fasta_file, self._config.chunk_size)):
+            for taxo_level, level_results in chunk_results.items():
+                results[taxo_level].extend(level_results)
+        logger.info(f"Search pipeline timings: {pipeline.summary()}")
+        return results
+
+    def _search_cached(
+        self,
+        fasta_file: str,
+        model_id: str,
+        db_path: str,
+        output_taxonomies: list[str],
+        output_fields: list[str],
+        max_workers: int | None,
+        kwargs: dict[str, Any],
+    ) -> dict[str, list[list[dict]]]:
+        """Search the sequences in the fasta file, reusing the results in the search result cache.
+
+        Only the sequences missing in the cache for any of the output taxonomy levels are embedded
+        and searched, their results are added to the cache. A repeated sequence is embedded and
+        searched once, and its results are given to all its occurrences.
 
-            results[taxo_level] = results_batch
-        client.close()
+        Args:
+            fasta_file: The path to the fasta file of the query sequences.
+            model_id: The model ID to use for embedding the query sequences.
+            db_path: The path to the database to search.
+            output_taxonomies: The taxonomy levels to search.
+            output_fields: The metadata fields to include in the search results.
+            max_workers: The number of taxonomy levels searched concurrently.
+            kwargs: Other search parameters, see [`search`][taxotagger.TaxoTagger.search].
+
+        Returns:
+            The search results for each taxonomy level, see [`search`][taxotagger.TaxoTagger.search].
+        """
+        records = list(parse_fasta(fasta_file).items())
+        seq_hashes = [sequence_hash(seq) for _, seq in records]
+        params_key = json.dumps(
+            {"model_id": model_id, "output_fields": output_fields, **kwargs},
+            sort_keys=True,
+            default=str,
+        )
+
+        cache = self._search_cache
+        results: dict[str, list] = {
+            taxo_level: [cache.get((db_path, taxo_level, h, params_key)) for h in seq_hashes]
+            for taxo_level in output_taxonomies
+        }
+        miss_indices = [
+            i
+            for i in range(len(records))
+            if any(results[taxo_level][i] is None for taxo_level in output_taxonomies)
+        ]
+        logger.info(
+            f"Found {len(records) - len(miss_indices)} of {len(records)} sequences in the search "
+            "result cache"
+        )
+        if not miss_indices:
+            return results
+
+        # The model drops repeated sequences, so each missed sequence is searched once
+        miss_hashes: dict[str, list[int]] = {}
+        for i in miss_indices:
+            miss_hashes.setdefault(seq_hashes[i], []).append(i)
+        with temporary_fasta(records[indices[0]] for indices in miss_hashes.values()) as miss_file:
+            embeddings = self.embed(miss_file, model_id, as_batch=True, levels=output_taxonomies)
+        miss_results = self._search_embeddings(
+            embeddings, db_path, output_taxonomies, output_fields, max_workers, kwargs
+        )
+        if any(len(res) != len(miss_hashes) for res in miss_results.values()):
+            # The model skipped some sequences, so the results cannot be aligned with the cache
+            logger.warning(
+                f"The model {model_id} did not embed all the sequences in {fasta_file}, "
+                "the search result cache is not used"
+            )
+            embeddings = self.embed(fasta_file, model_id, as_batch=True, levels=output_taxonomies)
+            return self._search_embeddings(
+                embeddings, db_path, output_taxonomies, output_fields, max_workers, kwargs
+            )
+
+        for taxo_level in output_taxonomies:
+            for (seq_hash, indices), hits in zip(miss_hashes.items(), miss_results[taxo_level]):
+                for i in indices:
+                    results[taxo_level][i] = hits
+                cache.put((db_path, taxo_level, seq_hash, params_key), hits)
+        return results
+
+    def _search_embeddings(
+        self,
+        embeddings: EmbeddingBatch,
+        db_path: str,
+        output_taxonomies: list[str],
+        output_fields: list[str],
+        max_workers: int | None,
+        kwargs: dict[str, Any],
+    ) -> dict[str, list[list[dict]]]:
+        """Search the embeddings in the collections of the output taxonomy levels.
+
+        Returns:
+            The search results for each taxonomy level, see [`search`][taxotagger.TaxoTagger.search].
+        """
+        max_workers = max_workers or self._config.search_workers
+        projection = self._get_projection(db_path)
+        if projection is not None:
+            embeddings = projection.transform(embeddings)
+
+        with self._use_store(db_path) as store:
+
+            def search_level(taxo_level: str) -> list[list[dict]]:
+                vectors = embeddings.vectors[taxo_level]
+                return store.search(taxo_level, vectors, output_fields, **kwargs)
+
+            if max_workers == 1 or len(output_taxonomies) == 1:
+                results = {taxo_level: search_level(taxo_level) for taxo_level in output_taxonomies}
+            else:
+                with ThreadPoolExecutor(max_workers=max_workers) as executor:
+                    results = dict(
+                        zip(output_taxonomies, executor.map(search_level, output_taxonomies))
+                    )
 
         return results
 
@@ -174,164 +621,638 @@ class TaxoTagger:
         fasta_file: str,
         model_id: str = "MycoAI-CNN",
         db_name: str = "",
+        chunk_size: int | None = None,
+        index_params: dict[str, dict[str, Any]] | None = None,
+        vector_dtype: dict[str, str] | None = None,
+        projection_dims: dict[str, int] | None = None,
     ) -> None:
-        """Create a vector database for the DNA sequences in the fasta file with Milvus.
+        """Create a vector database for the DNA sequences in the fasta file.
+
+        The fasta file is embedded chunk by chunk, and each chunk is inserted into the collections
+        of all taxonomy levels. Reading, encoding, embedding and inserting the chunks run
+        concurrently in a [`Pipeline`][taxotagger.pipeline.Pipeline], e.g. the next chunk is
+        encoded while the current one is embedded and the previous one is inserted. The memory
+        usage is bounded by the chunk size and the `pipeline_queue_size` of the project
+        configuration instead of the size of the fasta file.
 
         Args:
             fasta_file: The path to the fasta file.
             model_id: The model ID to use for embedding the DNA sequences. Defaults to "MycoAI-CNN".
                 Available models see [`taxotagger.defaults.PRETRAINED_MODELS`][taxotagger.defaults.PRETRAINED_MODELS].
-            db_name: The name of the database to create. Defaults to the model ID.
+            db_name: The name of the database to create. Defaults to the model ID with the file
+                extension of the vector store, e.g. `MycoAI-CNN.db`. It can also be the URI of a
+                Milvus server, e.g. `http://localhost:19530`.
+            chunk_size: The number of sequences to embed and insert at a time. Defaults to the
+                `chunk_size` of the project configuration.
+            index_params: The vector index for each taxonomy level, which overrides the
+                `index_params` of the project configuration. The keys are taxonomy levels, and the
+                values are dictionaries with the keys `index_type` and `params`, e.g.
+                `{"species": {"index_type": "HNSW", "params": {"M": 16, "efConstruction": 200}}}`.
+                Taxonomy levels without index parameters use the exact `FLAT` index. Use
+                [`benchmark_index`][taxotagger.TaxoTagger.benchmark_index] to measure the recall and
+                latency of an index.
+            vector_dtype: The dtype of the stored vectors for each taxonomy level, which overrides
+                the `vector_dtype` of the project configuration. The values are `"float32"`,
+                `"float16"` or `"int8"`. Milvus stores `int8` as `float16`. The numpy vector store
+                rescores the top candidates with the full precision vectors. Use
+                [`benchmark_precision`][taxotagger.TaxoTagger.benchmark_precision] to measure the
+                accuracy and size of the reduced precision.
+            projection_dims: The target dimension of the projection for each taxonomy level, which
+                overrides the `projection_dims` of the project configuration. The projection is
+                fitted with the `projection_method` of the project configuration on the first
+                chunk of sequences, so `chunk_size` should be larger than the target dimensions for
+                PCA. It is saved next to the database as `{db_path}.projection.npz` and applied to
+                the query embeddings by [`search`][taxotagger.TaxoTagger.search]. Use
+                [`benchmark_projection`][taxotagger.TaxoTagger.benchmark_projection] to measure how
+                well the top-k neighbours are preserved.
+
+        Raises:
+            ValueError: If the fasta file contains no sequences.
 
         Examples:
             >>> config = ProjectConfig()
             >>> tagger = TaxoTagger(config)
             >>> tagger.create_db("dna.fasta")
-        """
-        # Get the embeddings including the headers
-        embeddings = self.embed(fasta_file, model_id)
 
-        # Create the schema and index for the database
-        dims = {
-            taxonomy_level: embeddings[taxonomy_level][0]["vector"].shape[0]
-            for taxonomy_level in TAXONOMY_LEVELS
-        }
-        schema_index_dict = self._create_schema_index(dims)
+            Use an HNSW index for the genus and species levels
+            >>> hnsw = {"index_type": "HNSW", "params": {"M": 16, "efConstruction": 200}}
+            >>> tagger.create_db("dna.fasta", index_params={"genus": hnsw, "species": hnsw})
 
-        db_name = db_name if db_name else f"{model_id}.db"
-        db_path = os.path.join(self._config.mycoai_home, db_name)
+            Store the genus vectors in half precision and the species vectors as int8
+            >>> tagger.create_db("dna.fasta", vector_dtype={"genus": "float16", "species": "int8"})
+        """
+        db_path = self._get_db_path(db_name, model_id)
+        index_params = {**self._config.index_params, **(index_params or {})}
+        vector_dtype = {**self._config.vector_dtype, **(vector_dtype or {})}
+        projection_dims = {**self._config.projection_dims, **(projection_dims or {})}
 
-        # Create collections for each taxonomy level
         logger.info(
             f"Creating vector database for the DNA sequences in [magenta]{fasta_file}[/magenta] at {db_path}"
         )
-        client = MilvusClient(db_path)
-        for taxo_level in TAXONOMY_LEVELS:
-            schema, index_params = schema_index_dict[taxo_level]
+        # The search results of the old database are outdated
+        self._search_cache.invalidate(db_path)
+        projection_path = self._get_projection_path(db_path)
+        if os.path.exists(projection_path):
+            os.remove(projection_path)
+        stages = []
+        if projection_dims:
+            stages.append(("project", self._projector(projection_dims, projection_path)))
+        pipeline = self._embed_pipeline(model_id, stages, "insert")
+        chunks = iter_fasta_chunks(fasta_file, chunk_size or self._config.chunk_size)
+        num_inserted = self._build_db(db_path, pipeline.run(chunks), index_params, vector_dtype)
+        logger.info(f"Database creation pipeline timings: {pipeline.summary()}")
+        self._search_cache.invalidate(db_path)
+        if num_inserted == 0:
+            raise ValueError(f"No DNA sequences found in {fasta_file}")
+        logger.info(f"Database created successfully at {db_path}")
 
-            if client.has_collection(collection_name=taxo_level):
-                client.drop_collection(collection_name=taxo_level)
+    def benchmark_index(
+        self,
+        db_fasta_file: str,
+        query_fasta_file: str,
+        index_params: dict[str, dict[str, Any]],
+        model_id: str = "MycoAI-CNN",
+        limit: int = 10,
+        search_params: dict[str, dict[str, Any]] | None = None,
+        db_name: str = "",
+    ) -> dict[str, dict[str, float]]:
+        """Measure the recall@k and latency of vector indexes against the exact FLAT index.
 
-            client.create_collection(
-                collection_name=taxo_level,
-                schema=schema,
-                index_params=index_params,
-            )
+        The benchmark always uses the Milvus vector store, since the other vector stores only
+        support the exact search. The sequences in `db_fasta_file` are embedded once and inserted
+        into two temporary databases, one with the exact `FLAT` index and one with the given
+        `index_params`. Then the sequences in `query_fasta_file` are searched in both databases,
+        and the results of the given indexes are compared with the exact results.
 
-        # Insert the data into the collections
-        for taxo_level in TAXONOMY_LEVELS:
-            logger.debug(f"Inserting data into the collection [blue]{taxo_level}[/blue]")
+        Args:
+            db_fasta_file: The path to the fasta file of the reference sequences.
+            query_fasta_file: The path to the fasta file of the query sequences.
+            index_params: The vector index for each taxonomy level to benchmark, see
+                [`create_db`][taxotagger.TaxoTagger.create_db].
+            model_id: The model ID to use for embedding the DNA sequences. Defaults to "MycoAI-CNN".
+            limit: The number of top hits `k` to compare. Defaults to 10.
+            search_params: The search parameters of the index for each taxonomy level, e.g.
+                `{"species": {"params": {"ef": 64}}}` for HNSW. Defaults to no search parameters.
+            db_name: The name of the database for the benchmarked indexes. Defaults to a temporary
+                local database. It can be the URI of a Milvus server to benchmark the index types
+                only available on a server, e.g. `IVF_FLAT` or `IVF_PQ`. Note that the collections
+                of the database are replaced.
 
-            data = embeddings[taxo_level]
-            size_of_data, num_items, items_per_batch = self._get_batch_params(data)
-            logger.debug(
-                f"Embeddings for {taxo_level}: {size_of_data / (1024*1024):.1f} MB, "
-                f"{num_items} items in total, {items_per_batch} items per batch"
-            )
+        Returns:
+            A dictionary of the benchmark for each taxonomy level. The values are dictionaries with
+                the keys:
 
-            for i in range(0, num_items, items_per_batch):
-                client.insert(collection_name=taxo_level, data=data[i : i + items_per_batch])
+                - `recall`: the mean recall@k of the index,
+                - `latency_ms`: the mean search latency per query sequence of the index,
+                - `baseline_latency_ms`: the mean search latency per query sequence of the FLAT index.
 
-        client.close()
-        logger.info(f"Database created successfully at {db_path}")
+        Examples:
+            >>> config = ProjectConfig()
+            >>> tagger = TaxoTagger(config)
+            >>> hnsw = {"index_type": "HNSW", "params": {"M": 16, "efConstruction": 200}}
+            >>> report = tagger.benchmark_index("db.fasta", "query.fasta", {"species": hnsw})
+            >>> report["species"]["recall"]
+            0.98
+        """
+        search_params = search_params or {}
+        reference = self.embed(db_fasta_file, model_id, as_batch=True)
+        queries = self.embed(query_fasta_file, model_id, as_batch=True)
 
-    def _validate_taxonomies(self, taxonomies: list[str]) -> list[str]:
-        """Validate the taxonomy levels and return the valid ones.
+        report = {}
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            baseline_path = os.path.join(tmp_dir, "baseline.db")
+            if db_name:
+                db_path = self._get_db_path(db_name, model_id)
+            else:
+                db_path = os.path.join(tmp_dir, "benchmark.db")
+            try:
+                baseline_store = self._get_store(baseline_path, MilvusVectorStore, in_use=True)
+                store = self._get_store(db_path, MilvusVectorStore, in_use=True)
+                self._build_db(baseline_path, [reference], {}, store=baseline_store)
+                self._build_db(db_path, [reference], index_params, store=store)
 
-        Invalid taxonomy levels are ignored and a warning is raised.
+                for taxo_level in TAXONOMY_LEVELS:
+                    data = queries.vectors[taxo_level]
+                    start = time.perf_counter()
+                    expected = baseline_store.search(taxo_level, data, ["id"], limit=limit)
+                    baseline_latency = time.perf_counter() - start
+
+                    start = time.perf_counter()
+                    actual = store.search(
+                        taxo_level,
+                        data,
+                        ["id"],
+                        limit=limit,
+                        search_params=search_params.get(taxo_level, {}),
+                    )
+                    latency = time.perf_counter() - start
+
+                    report[taxo_level] = {
+                        "recall": recall_at_k(expected, actual, limit),
+                        "latency_ms": latency * 1000 / max(1, len(data)),
+                        "baseline_latency_ms": baseline_latency * 1000 / max(1, len(data)),
+                    }
+                    logger.info(
+                        f"Index benchmark for [blue]{taxo_level}[/blue]: "
+                        f"{index_params.get(taxo_level, {}).get('index_type', 'FLAT')} "
+                        f"recall@{limit} {report[taxo_level]['recall']:.3f}, "
+                        f"{report[taxo_level]['latency_ms']:.2f} ms/query "
+                        f"(FLAT {report[taxo_level]['baseline_latency_ms']:.2f} ms/query)"
+                    )
+            finally:
+                self._close_store(baseline_path)
+                self._close_store(db_path)
+        return report
+
+    def benchmark_precision(
+        self,
+        db_fasta_file: str,
+        query_fasta_file: str,
+        vector_dtype: dict[str, str],
+        model_id: str = "MycoAI-CNN",
+        limit: int = 10,
+    ) -> dict[str, dict[str, float]]:
+        """Measure the accuracy and size of reduced precision vectors against float32 vectors.
+
+        The sequences in `db_fasta_file` are embedded once and inserted into two temporary
+        databases of the numpy vector store, one with float32 vectors and one with the given
+        `vector_dtype`. Then the sequences in `query_fasta_file` are searched in both databases,
+        with and without rescoring the candidates with the full precision vectors, and the results
+        are compared with the float32 results.
+
+        Args:
+            db_fasta_file: The path to the fasta file of the reference sequences.
+            query_fasta_file: The path to the fasta file of the query sequences.
+            vector_dtype: The dtype of the vectors for each taxonomy level to benchmark, see
+                [`create_db`][taxotagger.TaxoTagger.create_db].
+            model_id: The model ID to use for embedding the DNA sequences. Defaults to "MycoAI-CNN".
+            limit: The number of top hits `k` to compare. Defaults to 10.
+
+        Returns:
+            A dictionary of the benchmark for each taxonomy level. The values are dictionaries with
+                the keys:
+
+                - `recall`: the mean recall@k with rescoring by the `rescore_factor` of the
+                    project configuration,
+                - `recall_without_rescoring`: the mean recall@k of the reduced precision vectors
+                    alone,
+                - `index_size_mb`: the size on disk of the reduced precision vectors and the full
+                    precision vectors kept for the rescoring,
+                - `index_size_mb_without_rescoring`: the size on disk of the reduced precision
+                    vectors alone,
+                - `baseline_index_size_mb`: the size on disk of the float32 vectors,
+                - `latency_ms`: the mean search latency per query sequence with rescoring,
+                - `baseline_latency_ms`: the mean search latency per query sequence of the float32
+                    vectors.
+
+        Examples:
+            >>> config = ProjectConfig()
+            >>> tagger = TaxoTagger(config)
+            >>> report = tagger.benchmark_precision("db.fasta", "query.fasta", {"species": "int8"})
+            >>> report["species"]["recall"], report["species"]["index_size_mb"]
+            (1.0, 14.1)
         """
-        invalid_levels = [taxonomy for taxonomy in taxonomies if taxonomy not in TAXONOMY_LEVELS]
-        if invalid_levels:
-            logger.warning(
-                f"Invalid taxonomy levels provided: {invalid_levels}, which will be ignored. "
-                f"Available levels are: {TAXONOMY_LEVELS}",
-            )
-            warnings.warn(
-                f"Invalid taxonomy levels provided: {invalid_levels}, which will be ignored. "
-                f"Available levels are: {TAXONOMY_LEVELS}",
-            )
+        reference = self.embed(db_fasta_file, model_id, as_batch=True)
+        queries = self.embed(query_fasta_file, model_id, as_batch=True)
 
-        valid_levels = [taxonomy for taxonomy in taxonomies if taxonomy in TAXONOMY_LEVELS]
-        return valid_levels
+        report = {}
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            baseline_path = os.path.join(tmp_dir, "baseline.npdb")
+            db_path = os.path.join(tmp_dir, "benchmark.npdb")
+            unscored_path = os.path.join(tmp_dir, "unscored.npdb")
+            baseline_store = NumpyVectorStore(baseline_path)
+            store = NumpyVectorStore(db_path, rescore_factor=self._config.rescore_factor)
+            # without the rescoring, the full precision vectors are not stored
+            unscored_store = NumpyVectorStore(unscored_path, rescore_factor=1)
+            self._build_db(baseline_path, [reference], {}, store=baseline_store)
+            self._build_db(db_path, [reference], {}, vector_dtype, store=store)
+            self._build_db(unscored_path, [reference], {}, vector_dtype, store=unscored_store)
+
+            for taxo_level in TAXONOMY_LEVELS:
+                data = queries.vectors[taxo_level]
+                start = time.perf_counter()
+                expected = baseline_store.search(taxo_level, data, ["id"], limit=limit)
+                baseline_latency = time.perf_counter() - start
+
+                start = time.perf_counter()
+                actual = store.search(taxo_level, data, ["id"], limit=limit)
+                latency = time.perf_counter() - start
+                unscored = unscored_store.search(taxo_level, data, ["id"], limit=limit)
+
+                report[taxo_level] = {
+                    "recall": recall_at_k(expected, actual, limit),
+                    "recall_without_rescoring": recall_at_k(expected, unscored, limit),
+                    "index_size_mb": store.index_size(taxo_level) / (1024 * 1024),
+                    "index_size_mb_without_rescoring": (
+                        unscored_store.index_size(taxo_level) / (1024 * 1024)
+                    ),
+                    "baseline_index_size_mb": baseline_store.index_size(taxo_level) / (1024 * 1024),
+                    "latency_ms": latency * 1000 / max(1, len(data)),
+                    "baseline_latency_ms": baseline_latency * 1000 / max(1, len(data)),
+                }
+                logger.info(
+                    f"Precision benchmark for [blue]{taxo_level}[/blue]: "
+                    f"{vector_dtype.get(taxo_level, 'float32')} "
+                    f"recall@{limit} {report[taxo_level]['recall']:.3f} "
+                    f"({report[taxo_level]['recall_without_rescoring']:.3f} without rescoring), "
+                    f"{report[taxo_level]['index_size_mb']:.1f} MB "
+                    f"({report[taxo_level]['index_size_mb_without_rescoring']:.1f} MB without "
+                    f"rescoring, float32 {report[taxo_level]['baseline_index_size_mb']:.1f} MB)"
+                )
+            for numpy_store in (baseline_store, store, unscored_store):
+                numpy_store.close()
+        return report
 
-    @staticmethod
-    def _create_schema_index(dims) -> dict[str, tuple]:
-        """Create the schema and index parameters for the Milvus database.
+    def benchmark_projection(
+        self,
+        db_fasta_file: str,
+        query_fasta_file: str,
+        projection_dims: dict[str, int],
+        model_id: str = "MycoAI-CNN",
+        limit: int = 10,
+        method: Literal["pca", "random"] | None = None,
+    ) -> dict[str, dict[str, float]]:
+        """Measure how well the projection preserves the top-k neighbours of the query sequences.
+
+        The projection is fitted on the embeddings of the sequences in `db_fasta_file`, which are
+        inserted with and without the projection into two temporary databases of the numpy vector
+        store. Then the sequences in `query_fasta_file` are searched in both databases, and the
+        top-k neighbours in the projected space are compared with those of the original
+        embeddings.
 
         Args:
-            dims: The dimensions of the embeddings for each taxonomy level.
+            db_fasta_file: The path to the fasta file of the reference sequences.
+            query_fasta_file: The path to the fasta file of the query sequences.
+            projection_dims: The target dimension for each taxonomy level to benchmark, see
+                [`create_db`][taxotagger.TaxoTagger.create_db].
+            model_id: The model ID to use for embedding the DNA sequences. Defaults to "MycoAI-CNN".
+            limit: The number of top hits `k` to compare. Defaults to 10.
+            method: The projection method, `"pca"` or `"random"`. Defaults to the
+                `projection_method` of the project configuration.
 
         Returns:
-            dict[str, tuple]: A dictionary of (CollectionSchema, IndexParams) for each taxonomy
-                level.
+            A dictionary of the benchmark for each taxonomy level. The values are dictionaries with
+                the keys:
+
+                - `recall`: the mean fraction of the original top-k neighbours found in the
+                    projected space,
+                - `dims`: the dimension of the projected embeddings,
+                - `baseline_dims`: the dimension of the original embeddings,
+                - `latency_ms`: the mean search latency per query sequence of the projected
+                    embeddings, including the projection of the queries,
+                - `baseline_latency_ms`: the mean search latency per query sequence of the original
+                    embeddings.
+
+        Examples:
+            >>> config = ProjectConfig()
+            >>> tagger = TaxoTagger(config)
+            >>> report = tagger.benchmark_projection("db.fasta", "query.fasta", {"species": 256})
+            >>> report["species"]["recall"]
+            0.97
         """
-        res = {}
-        for taxo_level in TAXONOMY_LEVELS:
-            # Create schema for the collection and add fields to the schema
-            schema = MilvusClient.create_schema(
-                auto_id=False,
-                enable_dynamic_field=True,
-                description=f"The collection of embeddings on the taxonomy level {taxo_level}",
-            )
-            schema.add_field(
-                field_name="id",
-                datatype=DataType.VARCHAR,
-                max_length=20,
-                is_primary=True,
-                description="The unique identifier of the DNA sequence. The length limit is 20.",
-            )
-            schema.add_field(
-                field_name="vector",
-                datatype=DataType.FLOAT_VECTOR,
-                dim=dims[taxo_level],
-                description="The embedding vector of the DNA sequence",
-            )
-            schema.add_field(
-                field_name=taxo_level,
-                datatype=DataType.VARCHAR,
-                max_length=100,
-                description=f"The {taxo_level} of the DNA sequence. The length limit is 100.",
-            )
+        reference = self.embed(db_fasta_file, model_id, as_batch=True)
+        queries = self.embed(query_fasta_file, model_id, as_batch=True)
+        projection = Projection.fit(
+            reference, projection_dims, method or self._config.projection_method
+        )
 
-            # Set up index parameters and add indexes
-            # Note: local mode only support FLAT, HNSW, AUTOINDEX
-            ## Use auto indexing for `id` and taxo_level field https://milvus.io/docs/index-scalar-fields.md#Auto-indexing
-            index_params = MilvusClient.prepare_index_params()
-            index_params.add_index(field_name="id")
-            index_params.add_index(
-                field_name="vector",
-                index_type="FLAT",
-                metric_type="COSINE",
-            )
-            index_params.add_index(field_name=taxo_level)
+        report = {}
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            baseline_path = os.path.join(tmp_dir, "baseline.npdb")
+            db_path = os.path.join(tmp_dir, "benchmark.npdb")
+            baseline_store = NumpyVectorStore(baseline_path)
+            store = NumpyVectorStore(db_path)
+            self._build_db(baseline_path, [reference], {}, store=baseline_store)
+            self._build_db(db_path, [projection.transform(reference)], {}, store=store)
+
+            for taxo_level in TAXONOMY_LEVELS:
+                data = queries.vectors[taxo_level]
+                start = time.perf_counter()
+                expected = baseline_store.search(taxo_level, data, ["id"], limit=limit)
+                baseline_latency = time.perf_counter() - start
 
-            res[taxo_level] = (schema, index_params)
+                start = time.perf_counter()
+                query_batch = EmbeddingBatch(queries.metadata, {taxo_level: data})
+                projected = projection.transform(query_batch)
+                projected_data = projected.vectors[taxo_level]
+                actual = store.search(taxo_level, projected_data, ["id"], limit=limit)
+                latency = time.perf_counter() - start
 
-        return res
+                report[taxo_level] = {
+                    "recall": recall_at_k(expected, actual, limit),
+                    "dims": projected_data.shape[1],
+                    "baseline_dims": data.shape[1],
+                    "latency_ms": latency * 1000 / max(1, len(data)),
+                    "baseline_latency_ms": baseline_latency * 1000 / max(1, len(data)),
+                }
+                logger.info(
+                    f"Projection benchmark for [blue]{taxo_level}[/blue]: "
+                    f"{report[taxo_level]['baseline_dims']} -> {report[taxo_level]['dims']} "
+                    f"dimensions, recall@{limit} {report[taxo_level]['recall']:.3f}, "
+                    f"{report[taxo_level]['latency_ms']:.2f} ms/query "
+                    f"(original {report[taxo_level]['baseline_latency_ms']:.2f} ms/query)"
+                )
+            baseline_store.close()
+            store.close()
+        return report
+
+    def _embed_pipeline(
+        self,
+        model_id: str,
+        stages: list[tuple[str, Callable[[Any], Any]]],
+        sink_name: str,
+        levels: list[str] | None = None,
+    ) -> Pipeline:
+        """Get a pipeline that encodes and embeds chunks of FASTA records, then runs `stages`.
 
-    @staticmethod
-    def _get_batch_params(data: list) -> tuple[int, int, int]:
-        """Calculate the size of the data, total number of items, and the number of items per batch.
+        Args:
+            model_id: The model ID to use for embedding the DNA sequences.
+            stages: The stages after embedding, called with the embeddings of each chunk.
+            sink_name: The name of the consumer of the pipeline outputs in the timings.
+            levels: The taxonomy levels to embed. Defaults to all taxonomy levels.
 
-        Milvus has a limit on the size of the data (i.e. `MAX_BATCH_SIZE_BYTES`) that can be
-        inserted, searched or queried at once. So the data needs to be split into batches when it
-        exceeds the limit.
+        Returns:
+            The pipeline, to be run on the chunks of `(header, sequence)` records of a FASTA file.
+        """
+        model = self._get_model(model_id)
 
-        For more information, see the Milvus documentation: https://milvus.io/docs/limitations.md.
+        def embed(encoded: Any) -> EmbeddingBatch:
+            return model.embed_encoded(encoded, levels=levels)
+
+        return Pipeline(
+            [("encode", model.encode_records), ("embed", embed), *stages],
+            queue_size=self._config.pipeline_queue_size,
+            sink_name=sink_name,
+        )
+
+    def _projector(
+        self, projection_dims: dict[str, int], projection_path: str
+    ) -> Callable[[EmbeddingBatch], EmbeddingBatch]:
+        """Get a function that projects batches, fitting and saving the projection on the first.
+
+        Args:
+            projection_dims: The target dimension for each taxonomy level.
+            projection_path: The path to save the projection to.
+
+        Returns:
+            The function that projects a batch of embeddings.
+        """
+        projection = None
+
+        def project(batch: EmbeddingBatch) -> EmbeddingBatch:
+            nonlocal projection
+            if projection is None:
+                logger.info(f"Fitting the projection {projection_dims} on {len(batch)} sequences")
+                projection = Projection.fit(batch, projection_dims, self._config.projection_method)
+                projection.save(projection_path)
+            return projection.transform(batch)
+
+        return project
+
+    def _build_db(
+        self,
+        db_path: str,
+        batches: Iterable[EmbeddingBatch],
+        index_params: dict[str, dict[str, Any]],
+        vector_dtype: dict[str, str] | None = None,
+        store: VectorStoreBase | None = None,
+    ) -> int:
+        """Create the collections of the database and insert the embeddings batch by batch.
+
+        Args:
+            db_path: The path to the database.
+            batches: The embeddings to insert.
+            index_params: The vector index for each taxonomy level.
+            vector_dtype: The dtype of the stored vectors for each taxonomy level.
+            store: The vector store of the database. Defaults to the open store of `db_path`.
+
+        Returns:
+            The number of inserted sequences.
+        """
+        if store is None:
+            with self._use_store(db_path) as store:
+                return self._build_db(db_path, batches, index_params, vector_dtype, store)
+        num_inserted = 0
+        for batch in batches:
+            if num_inserted == 0:
+                # Create collections for each taxonomy level once the dimensions are known
+                store.create_collections(batch.dims, index_params, vector_dtype)
+
+            # Insert the chunk into the collections of all taxonomy levels
+            store.insert(batch)
+            num_inserted += len(batch)
+            logger.info(f"Inserted {num_inserted} sequences into the database")
+        store.flush()
+        return num_inserted
+
+    def _get_model(self, model_id: str) -> EmbedModelBase:
+        """Get the embedding model, PyTorch and MycoAI are imported on the first call."""
+        from .models import ModelFactory
+
+        return ModelFactory.get_model(model_id, self._config)
+
+    def _get_db_path(self, db_name: str, model_id: str) -> str:
+        """Get the path to the database in the working directory, or the URI of a Milvus server."""
+        extension = VectorStoreFactory.get_store_class(self._config.vector_store).extension
+        db_name = db_name if db_name else f"{model_id}{extension}"
+        if not is_local(db_name):
+            return db_name
+        return os.path.join(self._config.mycoai_home, db_name)
+
+    def _get_projection_path(self, db_path: str) -> str:
+        """Get the path to the projection of the database.
+
+        The projection of a local database is stored next to it, and the projection of a Milvus
+        server database in the working directory.
+        """
+        if is_local(db_path):
+            return f"{db_path}.projection.npz"
+        return os.path.join(self._config.mycoai_home, f"{quote(db_path, safe='')}.projection.npz")
+
+    def _get_projection(self, db_path: str) -> Projection | None:
+        """Get the projection of the database, or `None` if the database has no projection.
+
+        The loaded projection is reused until the projection file changes.
+        """
+        projection_path = self._get_projection_path(db_path)
+        try:
+            mtime = os.path.getmtime(projection_path)
+        except FileNotFoundError:
+            return None
+        cached = self._projections.get(projection_path)
+        if cached is None or cached[0] != mtime:
+            logger.debug(f"Loading the projection {projection_path}")
+            cached = (mtime, Projection.load(projection_path))
+            self._projections[projection_path] = cached
+        return cached[1]
+
+    def _get_store(
+        self,
+        db_path: str,
+        store_class: type[VectorStoreBase] | None = None,
+        in_use: bool = False,
+    ) -> VectorStoreBase:
+        """Get the open vector store of the database, opening it if needed.
+
+        Stores that have been idle for longer than the `db_idle_timeout` of the project
+        configuration are closed by a timer, see `_schedule_idle_check`, and also here.
 
         Args:
-            data: The list of embeddings.
+            db_path: The path to the database.
+            store_class: The vector store class used to open the database. Defaults to the
+                `vector_store` of the project configuration.
+            in_use: Whether to keep the store open, even if it is idle for too long, until it
+                is released with `_release_store` or closed. Defaults to `False`.
 
         Returns:
-            tuple[int, int, int]: The size of the data in bytes, the total number of items, and the
-                number of items per batch.
+            The vector store connected to the database.
+        """
+        with self._stores_lock:
+            now = time.monotonic()
+            self._close_idle_stores(now)
+            if db_path in self._stores:
+                store, _, users = self._stores[db_path]
+            else:
+                logger.debug(f"Opening the database {db_path}")
+                if store_class is None:
+                    store = VectorStoreFactory.get_store(db_path, self._config)
+                else:
+                    store = store_class(db_path)
+                users = 0
+            self._stores[db_path] = (store, now, users + in_use)
+            self._schedule_idle_check()
+            return store
+
+    def _release_store(self, db_path: str, store: VectorStoreBase) -> None:
+        """Release a store got with `in_use=True` from `_get_store`, it is idle from now on."""
+        with self._stores_lock:
+            entry = self._stores.get(db_path)
+            # the store may have been closed and reopened in the meantime
+            if entry is not None and entry[0] is store:
+                self._stores[db_path] = (store, time.monotonic(), entry[2] - 1)
+                self._schedule_idle_check()
+
+    @contextmanager
+    def _use_store(
+        self, db_path: str, store_class: type[VectorStoreBase] | None = None
+    ) -> Iterator[VectorStoreBase]:
+        """Use the vector store of the database, which is not closed as idle until the exit.
+
+        Args:
+            db_path: The path to the database.
+            store_class: The vector store class used to open the database, see `_get_store`.
+
+        Yields:
+            The vector store connected to the database.
+        """
+        store = self._get_store(db_path, store_class, in_use=True)
+        try:
+            yield store
+        finally:
+            self._release_store(db_path, store)
+
+    def _close_idle_stores(self, now: float) -> None:
+        """Close the stores not in use that have been idle for at least `db_idle_timeout`.
+
+        The caller must hold `_stores_lock`.
+        """
+        for path, (store, last_used, users) in list(self._stores.items()):
+            if users == 0 and now - last_used >= self._config.db_idle_timeout:
+                logger.debug(f"Closing the idle database {path}")
+                store.close()
+                del self._stores[path]
+
+    def _schedule_idle_check(self) -> None:
+        """Start the timer that closes the store becoming idle next, unless it is running.
+
+        The timer runs in a daemon thread, so it does not keep the process alive, and schedules
+        itself again as long as there are open stores not in use. The caller must hold
+        `_stores_lock`.
+        """
+        if self._idle_timer is not None:
+            return
+        idle_since = [last_used for _, last_used, users in self._stores.values() if users == 0]
+        if not idle_since:
+            return
+        delay = min(idle_since) + self._config.db_idle_timeout - time.monotonic()
+        self._idle_timer = threading.Timer(max(0.0, delay), self._idle_check)
+        self._idle_timer.daemon = True
+        self._idle_timer.start()
+
+    def _idle_check(self) -> None:
+        """Close the idle stores and schedule the next check, run by the idle timer."""
+        with self._stores_lock:
+            self._idle_timer = None
+            self._close_idle_stores(time.monotonic())
+            self._schedule_idle_check()
+
+    def _close_store(self, db_path: str) -> None:
+        """Close the vector store of the database if it is open."""
+        with self._stores_lock:
+            if db_path in self._stores:
+                store, _, _ = self._stores.pop(db_path)
+                store.close()
+
+    def _validate_taxonomies(self, taxonomies: list[str]) -> list[str]:
+        """Validate the taxonomy levels and return the valid ones.
+
+        Invalid taxonomy levels are ignored and a warning is raised.
         """
-        size_of_data = asizeof.asizeof(data)
-        num_items = len(data)
-
-        if size_of_data <= MAX_BATCH_SIZE_BYTES:
-            return size_of_data, num_items, num_items
-        else:
-            avg_item_size = size_of_data / num_items
-            items_per_batch = max(1, int(MAX_BATCH_SIZE_BYTES / avg_item_size))
-            return size_of_data, num_items, items_per_batch
+        invalid_levels = [taxonomy for taxonomy in taxonomies if taxonomy not in TAXONOMY_LEVELS]
+        if invalid_levels:
+            logger.warning(
+                f"Invalid taxonomy levels provided: {invalid_levels}, which will be ignored. "
+                f"Available levels are: {TAXONOMY_LEVELS}",
+            )
+            warnings.warn(
+                f"Invalid taxonomy levels provided: {invalid_levels}, which will be ignored. "
+                f"Available levels are: {TAXONOMY_LEVELS}",
+            )
+
+        valid_levels = [taxonomy for taxonomy in taxonomies if taxonomy in TAXONOMY_LEVELS]
+        return valid_levels
+
+
+def _embed_shard_to_file(*args: Any) -> None:
+    """Embed a shard in a worker process, without sending the embeddings back by pickling."""
+    embed_shard(*args)
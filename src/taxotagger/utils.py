@@ -1,21 +1,36 @@
 from __future__ import annotations
+import gzip
 import logging
+import mmap
 import os
-from io import StringIO
+import tempfile
+from contextlib import contextmanager
+from itertools import repeat
 from os import PathLike
 from pathlib import Path
 from typing import Any
+from typing import BinaryIO
+from typing import Iterable
+from typing import Iterator
 from typing import TextIO
-import httpx
-import torch
-from Bio import SeqIO
-from rich.progress import Progress
+import numpy as np
 from .config import ProjectConfig
 from .defaults import PRETRAINED_MODELS
 
 
 logger = logging.getLogger(__name__)
 
+# The prefixes of the taxonomy levels in UNITE headers, and their columns in the parsed metadata
+_TAXONOMY_PREFIXES = {
+    "k__": 1,  # Kingdom
+    "p__": 2,  # Phylum
+    "c__": 3,  # Class
+    "o__": 4,  # Order
+    "f__": 5,  # Family
+    "g__": 6,  # Genus
+    "s__": 7,  # Species
+}
+
 
 def download_from_url(
     url: str,
@@ -43,6 +58,9 @@ def download_from_url(
         >>> url = "https://zenodo.org/records/10904344/files/MycoAI-CNN.pt"
         >>> download_model(url, ".")
     """
+    import httpx
+    from rich.progress import Progress
+
     fpath = Path(root) / Path(url).name
 
     if fpath.exists() and not overwrite_existing:
@@ -74,17 +92,23 @@ def load_model(
     If the model `{model_id}.pt` is not found in the cache, it will be downloaded from the
     predefined URL.
 
+    If `quantize` of the configuration is set, the quantized copy of the model is loaded instead,
+    see `_load_quantized_model`.
+
     Args:
         model_id: The identifier of the model to load.
         config: The configurations for the project.
 
     Returns:
-        The pretrained model loaded with `torch.load`.
+        The pretrained model loaded with `torch.load`, in eval mode.
 
     Examples:
         >>> config = Config()
         >>> model = load_model("MycoAI-CNN", config)
     """
+    # PyTorch is imported on first use, it is slow to import
+    import torch
+
     # validate the model id
     if model_id not in PRETRAINED_MODELS:
         raise ValueError(
@@ -98,11 +122,73 @@ def load_model(
     if not model_path.exists() or config.force_reload:
         download_from_url(PRETRAINED_MODELS[model_id], model_dir, config.force_reload)
 
-    logger.info(f"Loading model [magenta]{model_id}[/magenta] from {model_path}")
-    model = torch.load(model_path, map_location=config.device)
+    if config.quantize is not None:
+        model = _load_quantized_model(model_path, config)
+    else:
+        logger.info(f"Loading model [magenta]{model_id}[/magenta] from {model_path}")
+        model = torch.load(model_path, map_location=config.device)
+    # disable dropout and use the running statistics of batch normalization, so the embeddings
+    # of a sequence do not depend on the other sequences of its batch
+    model.eval()
+    return model
+
+
+def _load_quantized_model(model_path: Path, config: ProjectConfig) -> Any:
+    """Load the quantized copy of the model, quantize the model and cache the copy if needed.
+
+    The quantized copy `{model_id}.{quantize}.pt` is stored next to the model file, and is
+    recreated when it is older than the model file, e.g. after the model is downloaded again.
+
+    Args:
+        model_path: The path to the model file.
+        config: The configurations for the project.
+
+    Returns:
+        The quantized model.
+
+    Raises:
+        ValueError: If the device is not the CPU, which is required by the quantized model.
+    """
+    import torch
+
+    if torch.device(config.device).type != "cpu":
+        raise ValueError(
+            f"Quantization {config.quantize} is only supported on the CPU, got device "
+            f"{config.device}"
+        )
+
+    quantized_path = model_path.with_name(f"{model_path.stem}.{config.quantize}.pt")
+    if quantized_path.exists() and quantized_path.stat().st_mtime >= model_path.stat().st_mtime:
+        logger.info(f"Loading quantized model from {quantized_path}")
+        return torch.load(quantized_path, map_location="cpu")
+
+    logger.info(f"Quantizing model {model_path} with {config.quantize} to {quantized_path}")
+    model = torch.load(model_path, map_location="cpu")
+    model.eval()
+    # dynamic quantization stores the weights of the linear layers, e.g. the large output layers
+    # of the taxonomy levels, as int8, and quantizes the activations on the fly
+    model = torch.ao.quantization.quantize_dynamic(
+        model, {torch.nn.Linear}, dtype=torch.qint8, inplace=True
+    )
+    # write to a temporary file first, so other processes never load a partially written file
+    tmp_path = quantized_path.with_name(f"{quantized_path.name}.{os.getpid()}.tmp")
+    torch.save(model, tmp_path)
+    os.replace(tmp_path, quantized_path)
     return model
 
 
+def is_local(db_path: str) -> bool:
+    """Check whether the database path is a local file rather than the URI of a Milvus server.
+
+    Args:
+        db_path: The path to the database, or the URI of a Milvus server.
+
+    Returns:
+        `True` if the database is a local Milvus Lite database, `False` otherwise.
+    """
+    return not db_path.startswith(("http://", "https://", "tcp://", "unix:"))
+
+
 def parse_unite_fasta_header(header: str) -> list[str]:
     """Parse metadata from a UNITE FASTA file header.
 
@@ -148,20 +234,7 @@ def parse_unite_fasta_header(header: str) -> list[str]:
 
     # If there is a taxonomy section, process it
     if len(sections) > 1:
-        taxonomy_parts = sections[1].split(";")
-        taxonomy_map = {
-            "k__": 1,  # Kingdom
-            "p__": 2,  # Phylum
-            "c__": 3,  # Class
-            "o__": 4,  # Order
-            "f__": 5,  # Family
-            "g__": 6,  # Genus
-            "s__": 7,  # Species
-        }
-        for part in taxonomy_parts:
-            prefix, value = part[:3], part[3:]
-            if prefix in taxonomy_map:
-                result[taxonomy_map[prefix]] = value
+        result[1:8] = _parse_taxonomy(sections[1])
 
     # If there is an SH ID section, add it
     if len(sections) > 2:
@@ -170,6 +243,96 @@ def parse_unite_fasta_header(header: str) -> list[str]:
     return result
 
 
+def parse_unite_fasta_headers(headers: Iterable[str]) -> np.ndarray:
+    """Parse metadata from all headers of a UNITE FASTA file at once.
+
+    The result is the same as calling
+    [`parse_unite_fasta_header`][taxotagger.utils.parse_unite_fasta_header] on each header, but the
+    headers are split with a single `str.split` over all of them, and each distinct taxonomy
+    section is parsed only once, as many sequences share the same taxonomy.
+
+    Args:
+        headers: The headers of a FASTA file, with or without the leading `>`.
+
+    Returns:
+        An object array with shape `(n_samples, 9)`, the columns are
+            `[Accession, Kingdom, Phylum, Class, Order, Family, Genus, Species, SH_ID]`.
+            Empty strings are returned for missing metadata.
+
+    Examples:
+        >>> headers = [">MH855962|k__Fungi;p__Basidiomycota|SH1011630.09FU", ">MH855963"]
+        >>> parse_unite_fasta_headers(headers)
+        array([['MH855962', 'Fungi', 'Basidiomycota', '', '', '', '', '', 'SH1011630.09FU'],
+               ['MH855963', '', '', '', '', '', '', '', '']], dtype=object)
+    """
+    headers = list(headers)
+    ids, sections, sh_ids = _split_header_sections(headers)
+
+    # parse each distinct taxonomy section once
+    codes = dict.fromkeys(sections)
+    taxonomy = np.empty((len(codes), 7), dtype=object)
+    for code, section in enumerate(codes):
+        codes[section] = code
+        taxonomy[code] = _parse_taxonomy(section)
+
+    metadata = np.empty((len(headers), 9), dtype=object)
+    metadata[:, 0] = ids
+    metadata[:, 1:8] = taxonomy[
+        np.fromiter(map(codes.__getitem__, sections), dtype=np.intp, count=len(headers))
+    ]
+    metadata[:, 8] = sh_ids
+    return metadata
+
+
+def _split_header_sections(headers: list[str]) -> tuple[list[str], list[str], list[str]]:
+    """Split UNITE headers into the accession, taxonomy and SH ID sections.
+
+    Args:
+        headers: The headers of a FASTA file, with or without the leading `>`.
+
+    Returns:
+        The accessions, the taxonomy sections and the SH IDs, with empty strings for missing
+            sections.
+    """
+    n = len(headers)
+    # Fast path for headers that all have three sections: split all of them at once. The split
+    # is aligned with the headers if the sections of each header add up to its length.
+    fields = "|".join(headers).split("|")
+    if n and len(fields) == 3 * n:
+        lengths = np.fromiter(map(len, fields), dtype=np.int64, count=3 * n)
+        expected = np.fromiter(map(len, headers), dtype=np.int64, count=n)
+        if np.array_equal(lengths.reshape(n, 3).sum(axis=1) + 2, expected):
+            ids = fields[0::3]
+            if any(map(str.startswith, ids, repeat(">"))):
+                ids = [i.lstrip(">") for i in ids]
+            return ids, fields[1::3], fields[2::3]
+
+    ids, sections, sh_ids = [], [], []
+    for header in headers:
+        parts = header.lstrip(">").split("|", 3)
+        ids.append(parts[0])
+        sections.append(parts[1] if len(parts) > 1 else "")
+        sh_ids.append(parts[2] if len(parts) > 2 else "")
+    return ids, sections, sh_ids
+
+
+def _parse_taxonomy(section: str) -> list[str]:
+    """Parse the taxonomy section of a UNITE header, e.g. `k__Fungi;p__Basidiomycota;...`.
+
+    Args:
+        section: The taxonomy section of the header.
+
+    Returns:
+        The 7 taxonomy levels from kingdom to species, with empty strings for missing levels.
+    """
+    result = [""] * 8
+    for part in section.split(";"):
+        prefix, value = part[:3], part[3:]
+        if prefix in _TAXONOMY_PREFIXES:
+            result[_TAXONOMY_PREFIXES[prefix]] = value
+    return result[1:]
+
+
 def parse_fasta(data: str | PathLike | TextIO) -> dict:
     """Parse  FASTA data and return a dictionary of sequences.
 
@@ -188,44 +351,217 @@ def parse_fasta(data: str | PathLike | TextIO) -> dict:
     """
     header_seq_dict = {}
 
-    fh = _fasta_to_handle(data)
-    for record in SeqIO.parse(fh, "fasta"):
-        if record.description not in header_seq_dict:
-            header_seq_dict[record.description] = str(record.seq)
+    for header, seq in iter_fasta(data):
+        if header not in header_seq_dict:
+            header_seq_dict[header] = seq
         else:
-            raise ValueError(f"Duplicate FASTA header found: `{record.description}`")
+            raise ValueError(f"Duplicate FASTA header found: `{header}`")
     return header_seq_dict
 
 
-def _fasta_to_handle(data: str | PathLike | TextIO) -> TextIO:
-    """Convert the input FASTA data to a file handle.
+def iter_fasta(
+    data: str | PathLike | TextIO | BinaryIO, byte_range: tuple[int, int] | None = None
+) -> Iterator[tuple[str, str]]:
+    """Iterate over the records of FASTA data without loading all of them into memory.
+
+    The data is read in large blocks of bytes, which are split into records at the `>` at the
+    start of a line, so no intermediate object is created per line or per record. Local files are
+    read through memory mapping, and gzip-compressed files are decompressed on the fly.
+
+    The records are parsed in the same way as `Bio.SeqIO.parse(data, "fasta")`: the header is
+    the first line of the record without the leading `>` and trailing whitespace, the sequence is
+    the concatenation of the other lines without whitespace, and any text before the first record
+    is ignored.
 
     Args:
         data: Can be one of the following:
 
-            - A file-like object (with .read() or .readline() methods)
-            - A file path (string or PathLike) to a FASTA file
+            - A file-like object (with a .read() method) in text or binary mode
+            - A file path (string or PathLike) to a FASTA file, optionally gzip-compressed
             - A string containing FASTA content
+        byte_range: Only read the records starting within the bytes `[start, end)` of the data,
+            e.g. a shard from [`fasta_shards`][taxotagger.sharding.fasta_shards]. The data must be
+            the path to an uncompressed FASTA file, and the range must start at the beginning of
+            a record or of the file. Defaults to `None`, i.e. the whole data.
 
-    Returns:
-        A file handle for the input data.
+    Yields:
+        The `(header, sequence)` pair of each record, where the header has no leading `>`.
+    """
+    for record in _split_fasta_records(_read_fasta_blocks(data, byte_range=byte_range)):
+        newline = record.find(b"\n")
+        if newline == -1:
+            header, seq = record, b""
+        else:
+            header, seq = record[:newline], record[newline + 1 :]
+        yield header.rstrip().decode(), seq.translate(None, b" \t\r\n").decode()
+
+
+def iter_fasta_chunks(
+    data: str | PathLike | TextIO, chunk_size: int, byte_range: tuple[int, int] | None = None
+) -> Iterator[list[tuple[str, str]]]:
+    """Iterate over FASTA data in chunks of records.
+
+    Only the headers seen so far are kept in memory to check for duplicates, the sequences of
+    previous chunks are not.
+
+    Args:
+        data: The FASTA data, see [`iter_fasta`][taxotagger.utils.iter_fasta].
+        chunk_size: The maximum number of records in each chunk.
+        byte_range: Only read the records within a byte range of the data, see
+            [`iter_fasta`][taxotagger.utils.iter_fasta].
+
+    Yields:
+        A list of `(header, sequence)` pairs with at most `chunk_size` records.
+
+    Raises:
+        ValueError: If there are duplicate FASTA headers.
+    """
+    seen_headers = set()
+    chunk = []
+    for header, seq in iter_fasta(data, byte_range=byte_range):
+        if header in seen_headers:
+            raise ValueError(f"Duplicate FASTA header found: `{header}`")
+        seen_headers.add(header)
+        chunk.append((header, seq))
+        if len(chunk) == chunk_size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def write_fasta(records: Iterable[tuple[str, str]], fasta_file: str | PathLike) -> None:
+    """Write `(header, sequence)` records to a FASTA file.
+
+    Args:
+        records: The records to write, the headers should not have the leading `>`.
+        fasta_file: The path to the output FASTA file.
+    """
+    with open(fasta_file, "w") as fh:
+        for header, seq in records:
+            fh.write(f">{header}\n{seq}\n")
+
+
+@contextmanager
+def temporary_fasta(records: Iterable[tuple[str, str]]) -> Iterator[str]:
+    """Write `(header, sequence)` records to a temporary FASTA file.
+
+    The file is removed when the context exits.
+
+    Args:
+        records: The records to write, the headers should not have the leading `>`.
+
+    Yields:
+        The path to the temporary FASTA file.
+
+    Examples:
+        >>> with temporary_fasta([("seq1", "ACGT")]) as fasta_file:
+        ...     embeddings = model.embed(fasta_file)
+    """
+    fd, fasta_file = tempfile.mkstemp(suffix=".fasta")
+    os.close(fd)
+    try:
+        write_fasta(records, fasta_file)
+        yield fasta_file
+    finally:
+        os.remove(fasta_file)
+
+
+def _read_fasta_blocks(
+    data: str | PathLike | TextIO | BinaryIO,
+    block_size: int = 4 * 1024 * 1024,
+    byte_range: tuple[int, int] | None = None,
+) -> Iterator[bytes]:
+    """Read FASTA data as blocks of bytes.
+
+    Args:
+        data: The FASTA data, see [`iter_fasta`][taxotagger.utils.iter_fasta].
+        block_size: The size of the blocks in bytes. Defaults to 4 MB.
+        byte_range: Only read the bytes `[start, end)` of an uncompressed FASTA file. Defaults
+            to `None`, i.e. the whole data.
+
+    Yields:
+        The consecutive blocks of the data.
 
     Raises:
         TypeError: If the input data is not a valid type.
+        ValueError: If a byte range is given for data that is not an uncompressed FASTA file.
     """
+    if byte_range is not None:
+        yield from _read_fasta_range(data, byte_range, block_size)
+        return
+
     # Check if input_data is a file-like object
-    if hasattr(data, "read") or hasattr(data, "readline"):
-        file_handle = data
-    elif isinstance(data, PathLike):
-        file_handle = open(data, "r")
-    elif isinstance(data, str):
-        # Check if it's a file path
-        if os.path.isfile(data):
-            file_handle = open(data, "r")
-        else:
-            # Assume it's a string with FASTA content
-            file_handle = StringIO(data)
-    else:
+    if hasattr(data, "read"):
+        while block := data.read(block_size):
+            yield block.encode() if isinstance(block, str) else block
+        return
+
+    if isinstance(data, str) and not os.path.isfile(data):
+        # Assume it's a string with FASTA content
+        yield data.encode()
+        return
+    if not isinstance(data, (str, PathLike)):
         raise TypeError("Invalid input data type.")
 
-    return file_handle
+    with open(data, "rb") as fh:
+        if fh.read(2) == b"\x1f\x8b":  # gzip magic number
+            fh.seek(0)
+            with gzip.open(fh) as gz:
+                while block := gz.read(block_size):
+                    yield block
+            return
+        if os.fstat(fh.fileno()).st_size == 0:
+            return
+        with mmap.mmap(fh.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            for start in range(0, len(mm), block_size):
+                yield mm[start : start + block_size]
+
+
+def _read_fasta_range(
+    data: str | PathLike | TextIO | BinaryIO, byte_range: tuple[int, int], block_size: int
+) -> Iterator[bytes]:
+    """Read the bytes `[start, end)` of an uncompressed FASTA file as blocks of bytes."""
+    if not isinstance(data, (str, PathLike)) or not os.path.isfile(data):
+        raise ValueError("A byte range can only be read from a FASTA file")
+    with open(data, "rb") as fh:
+        if fh.read(2) == b"\x1f\x8b":  # gzip magic number
+            raise ValueError(f"Cannot read a byte range of the gzip-compressed file {data}")
+        size = os.fstat(fh.fileno()).st_size
+        start, end = max(byte_range[0], 0), min(byte_range[1], size)
+        if start >= end:
+            return
+        with mmap.mmap(fh.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            for block_start in range(start, end, block_size):
+                yield mm[block_start : min(block_start + block_size, end)]
+
+
+def _split_fasta_records(blocks: Iterable[bytes]) -> Iterator[bytes]:
+    """Split blocks of FASTA data into records.
+
+    Args:
+        blocks: The consecutive blocks of the FASTA data.
+
+    Yields:
+        The bytes of each record without the leading `>`, i.e. the header line followed by the
+            sequence lines.
+    """
+    # the data starts at the beginning of a line
+    pending = b"\n"
+    started = False
+    for block in blocks:
+        pending += block
+        if not started:
+            # skip the text before the first record
+            start = pending.find(b"\n>")
+            if start == -1:
+                # keep the last byte in case it is the newline before the first record
+                pending = pending[-1:]
+                continue
+            pending = pending[start + 2 :]
+            started = True
+        records = pending.split(b"\n>")
+        pending = records.pop()
+        yield from records
+    if started:
+        yield pending
@@ -0,0 +1,808 @@
+from __future__ import annotations
+import json
+import logging
+import os
+import shutil
+import warnings
+from pathlib import Path
+from typing import Any
+import numpy as np
+from .abc import VectorStoreBase
+from .config import ProjectConfig
+from .defaults import LOCAL_INDEX_TYPES
+from .defaults import MAX_BATCH_SIZE_BYTES
+from .defaults import MAX_METADATA_SIZE_BYTES
+from .defaults import TAXONOMY_LEVELS
+from .embeddings import METADATA_FIELDS
+from .embeddings import EmbeddingBatch
+from .embeddings import l2_normalize
+from .utils import is_local
+
+
+logger = logging.getLogger(__name__)
+
+
+class VectorStoreFactory:
+    """Factory class to get the vector store for the given backend."""
+
+    @staticmethod
+    def get_store(db_path: str, config: ProjectConfig) -> VectorStoreBase:
+        """Open the database with the vector store backend of the project configuration.
+
+        Args:
+            db_path: The path to the database, or the URI of a Milvus server.
+            config: The configurations for the project.
+
+        Returns:
+            The vector store connected to the database.
+
+        Examples:
+            >>> config = ProjectConfig(vector_store="numpy")
+            >>> store = VectorStoreFactory.get_store("MycoAI-CNN.npdb", config)
+        """
+        store_class = VectorStoreFactory.get_store_class(config.vector_store)
+        if store_class is NumpyVectorStore:
+            return NumpyVectorStore(db_path, rescore_factor=config.rescore_factor)
+        return store_class(db_path)
+
+    @staticmethod
+    def get_store_class(backend: str) -> type[VectorStoreBase]:
+        """Get the vector store class of the given backend.
+
+        Args:
+            backend: The name of the vector store backend, e.g. `"milvus"` or `"numpy"`.
+
+        Returns:
+            The vector store class.
+        """
+        if backend == "milvus":
+            return MilvusVectorStore
+        elif backend == "numpy":
+            return NumpyVectorStore
+        # Add more vector stores here if needed
+        else:
+            raise ValueError(
+                f"Invalid vector store {backend}. Valid vector stores are ['milvus', 'numpy']"
+            )
+
+
+class MilvusVectorStore(VectorStoreBase):
+    """Vector store backed by a Milvus Lite database or a Milvus server.
+
+    Opening the client of Milvus Lite starts the embedded server and loads the collections, so
+    the store should be kept open for repeated searches.
+
+    The vectors can be stored as `FLOAT16_VECTOR` to halve the size of the collections. Milvus
+    does not keep a full precision copy of the vectors, so there is no rescoring of the results,
+    and `int8` falls back to `float16`.
+    """
+
+    name = "milvus"
+    extension = ".db"
+
+    def __init__(self, db_path: str) -> None:
+        """Connect to the Milvus database.
+
+        Args:
+            db_path: The path to the Milvus Lite database, or the URI of a Milvus server.
+        """
+        # the Milvus client is imported on first use, it is slow to import
+        from pymilvus import MilvusClient
+
+        self.db_path = db_path
+        self.client = MilvusClient(db_path)
+        # taxonomy level -> numpy dtype of the vector field
+        self._dtypes: dict[str, np.dtype] = {}
+
+    def create_collections(
+        self,
+        dims: dict[str, int],
+        index_params: dict[str, dict[str, Any]],
+        vector_dtype: dict[str, str] | None = None,
+    ) -> None:
+        """Create an empty collection for each taxonomy level, dropping the existing ones.
+
+        Args:
+            dims: The dimensions of the embeddings for each taxonomy level.
+            index_params: The vector index for each taxonomy level.
+            vector_dtype: The dtype of the stored vectors for each taxonomy level, `"float32"`,
+                `"float16"` or `"int8"`, which is stored as `float16`. Defaults to `"float32"`.
+        """
+        schema_index_dict = self._create_schema_index(
+            dims, index_params, is_local(self.db_path), vector_dtype
+        )
+        self._dtypes = {}
+        for taxo_level in TAXONOMY_LEVELS:
+            schema, collection_index_params = schema_index_dict[taxo_level]
+
+            if self.client.has_collection(collection_name=taxo_level):
+                self.client.drop_collection(collection_name=taxo_level)
+
+            self.client.create_collection(
+                collection_name=taxo_level,
+                schema=schema,
+                index_params=collection_index_params,
+            )
+
+    def insert(self, batch: EmbeddingBatch) -> None:
+        """Insert the embeddings into the collections of all taxonomy levels in batches.
+
+        Args:
+            batch: The embeddings and metadata of the sequences.
+        """
+        for taxo_level in TAXONOMY_LEVELS:
+            logger.debug(f"Inserting data into the collection [blue]{taxo_level}[/blue]")
+
+            vectors = {taxo_level: batch.vectors[taxo_level].astype(self._get_dtype(taxo_level))}
+            data = EmbeddingBatch(batch.metadata, vectors).to_records(taxo_level)
+            size_of_data, num_items, items_per_batch = self._get_batch_params(data)
+            logger.debug(
+                f"Embeddings for {taxo_level}: {size_of_data / (1024 * 1024):.1f} MB, "
+                f"{num_items} items in total, {items_per_batch} items per batch"
+            )
+
+            for i in range(0, num_items, items_per_batch):
+                self.client.insert(collection_name=taxo_level, data=data[i : i + items_per_batch])
+
+    def search(
+        self,
+        taxo_level: str,
+        vectors: np.ndarray,
+        output_fields: list[str],
+        **kwargs: Any,
+    ) -> list[list[dict]]:
+        """Search the query vectors in the collection of a taxonomy level in batches.
+
+        Args:
+            taxo_level: The taxonomy level, i.e. the name of the collection.
+            vectors: The query vectors with shape `(n_queries, n_features)`.
+            output_fields: The fields to include in the search results.
+            kwargs: Additional keyword arguments for the `search` method of the Milvus client.
+
+        Returns:
+            The search results for each query vector.
+        """
+        logger.debug(f"Searching in the collection [blue]{taxo_level}[/blue]")
+
+        data = list(np.asarray(vectors).astype(self._get_dtype(taxo_level), copy=False))
+        size_of_data, num_items, items_per_batch = self._get_batch_params(data)
+        logger.debug(
+            f"Embeddings for {taxo_level}: {size_of_data / (1024 * 1024):.1f} MB, "
+            f"{num_items} items in total, {items_per_batch} items per batch"
+        )
+
+        results_batch = []
+        for i in range(0, num_items, items_per_batch):
+            res = self.client.search(
+                collection_name=taxo_level,
+                data=data[i : i + items_per_batch],
+                output_fields=output_fields,
+                **kwargs,
+            )
+            results_batch += res
+        return results_batch
+
+    def close(self) -> None:
+        """Close the Milvus client."""
+        self.client.close()
+
+    def _get_dtype(self, taxo_level: str) -> np.dtype:
+        """Get the numpy dtype of the vector field of a collection."""
+        from pymilvus import DataType
+
+        if taxo_level not in self._dtypes:
+            fields = self.client.describe_collection(collection_name=taxo_level)["fields"]
+            vector_field = [field for field in fields if field["name"] == "vector"][0]
+            if vector_field["type"] == DataType.FLOAT16_VECTOR:
+                self._dtypes[taxo_level] = np.dtype(np.float16)
+            else:
+                self._dtypes[taxo_level] = np.dtype(np.float32)
+        return self._dtypes[taxo_level]
+
+    @staticmethod
+    def _create_schema_index(
+        dims: dict[str, int],
+        index_params: dict[str, dict[str, Any]] | None = None,
+        local: bool = True,
+        vector_dtype: dict[str, str] | None = None,
+    ) -> dict[str, tuple]:
+        """Create the schema and index parameters for the Milvus database.
+
+        Args:
+            dims: The dimensions of the embeddings for each taxonomy level.
+            index_params: The vector index for each taxonomy level, as dictionaries with the keys
+                `index_type` and `params`. Defaults to the `FLAT` index for all levels.
+            local: Whether the database is a local Milvus Lite database, which only supports some
+                index types.
+            vector_dtype: The dtype of the vectors for each taxonomy level. `"float16"` and
+                `"int8"` use the `FLOAT16_VECTOR` field type. Defaults to `FLOAT_VECTOR`.
+
+        Returns:
+            dict[str, tuple]: A dictionary of (CollectionSchema, IndexParams) for each taxonomy
+                level.
+        """
+        from pymilvus import DataType
+        from pymilvus import MilvusClient
+
+        res = {}
+        for taxo_level in TAXONOMY_LEVELS:
+            # Create schema for the collection and add fields to the schema
+            schema = MilvusClient.create_schema(
+                auto_id=False,
+                enable_dynamic_field=True,
+                description=f"The collection of embeddings on the taxonomy level {taxo_level}",
+            )
+            schema.add_field(
+                field_name="id",
+                datatype=DataType.VARCHAR,
+                max_length=20,
+                is_primary=True,
+                description="The unique identifier of the DNA sequence. The length limit is 20.",
+            )
+            dtype = (vector_dtype or {}).get(taxo_level, "float32")
+            if dtype == "int8":
+                logger.warning(
+                    f"Milvus does not support int8 vectors, store the vectors of {taxo_level} as "
+                    "float16 instead"
+                )
+                warnings.warn(
+                    f"Milvus does not support int8 vectors, store the vectors of {taxo_level} as "
+                    "float16 instead"
+                )
+            schema.add_field(
+                field_name="vector",
+                datatype=DataType.FLOAT_VECTOR if dtype == "float32" else DataType.FLOAT16_VECTOR,
+                dim=dims[taxo_level],
+                description="The embedding vector of the DNA sequence",
+            )
+            schema.add_field(
+                field_name=taxo_level,
+                datatype=DataType.VARCHAR,
+                max_length=100,
+                description=f"The {taxo_level} of the DNA sequence. The length limit is 100.",
+            )
+
+            # Set up index parameters and add indexes
+            # Note: local mode only support FLAT, HNSW, AUTOINDEX
+            vector_index = (index_params or {}).get(taxo_level, {})
+            index_type = vector_index.get("index_type", "FLAT")
+            if local and index_type not in LOCAL_INDEX_TYPES:
+                logger.warning(
+                    f"Index type {index_type} of {taxo_level} may not be supported by Milvus Lite, "
+                    f"supported types are {LOCAL_INDEX_TYPES}. Use a Milvus server instead."
+                )
+                warnings.warn(
+                    f"Index type {index_type} of {taxo_level} may not be supported by Milvus Lite, "
+                    f"supported types are {LOCAL_INDEX_TYPES}. Use a Milvus server instead."
+                )
+
+            ## Use auto indexing for `id` and taxo_level field https://milvus.io/docs/index-scalar-fields.md#Auto-indexing
+            collection_index_params = MilvusClient.prepare_index_params()
+            collection_index_params.add_index(field_name="id")
+            collection_index_params.add_index(
+                field_name="vector",
+                index_type=index_type,
+                metric_type="COSINE",
+                params=vector_index.get("params", {}),
+            )
+            collection_index_params.add_index(field_name=taxo_level)
+
+            res[taxo_level] = (schema, collection_index_params)
+
+        return res
+
+    @staticmethod
+    def _get_batch_params(data: list) -> tuple[int, int, int]:
+        """Calculate the size of the data, total number of items, and the number of items per batch.
+
+        Milvus has a limit on the size of the data (i.e. `MAX_BATCH_SIZE_BYTES`) that can be
+        inserted, searched or queried at once. So the data needs to be split into batches when it
+        exceeds the limit.
+
+        The size is estimated from the vector dimension and dtype of the first item, plus an upper
+        bound (i.e. `MAX_METADATA_SIZE_BYTES`) for the metadata fields when the items are
+        dictionaries. All items of the data are assumed to have the same vector dimension, which is
+        the case for the embeddings of a taxonomy level. So the estimate is independent of the
+        number of items.
+
+        For more information, see the Milvus documentation: https://milvus.io/docs/limitations.md.
+
+        Args:
+            data: The list of embeddings, either the vectors or the dictionaries containing the
+                vector and metadata of each item.
+
+        Returns:
+            tuple[int, int, int]: The estimated size of the data in bytes, the total number of
+                items, and the number of items per batch.
+        """
+        num_items = len(data)
+        if num_items == 0:
+            return 0, 0, 1
+
+        item = data[0]
+        if isinstance(item, dict):
+            vector = item["vector"]
+            metadata_size = MAX_METADATA_SIZE_BYTES
+        else:
+            vector = item
+            metadata_size = 0
+        # plain lists are sent as float32 by Milvus
+        itemsize = vector.dtype.itemsize if hasattr(vector, "dtype") else 4
+        item_size = len(vector) * itemsize + metadata_size
+
+        size_of_data = item_size * num_items
+        if size_of_data <= MAX_BATCH_SIZE_BYTES:
+            return size_of_data, num_items, num_items
+        else:
+            items_per_batch = max(1, MAX_BATCH_SIZE_BYTES // item_size)
+            return size_of_data, num_items, items_per_batch
+
+
+class NumpyVectorStore(VectorStoreBase):
+    """In-process vector store for exact cosine search with NumPy.
+
+    The database is a directory in a compact memory-mapped format:
+
+    - `manifest.json`: the number of sequences, the dimensions and the dtypes of the vectors of
+        each taxonomy level, and the taxonomy levels with full precision vectors,
+    - `vectors/{taxo_level}.npy`: the full precision float32 embedding matrix of the taxonomy
+        levels stored in reduced precision, if they are rescored,
+    - `normalized/{taxo_level}.npy`: the L2-normalised copy of each embedding matrix in the dtype
+        of the taxonomy level, so the cosine similarity of the queries is a matrix product,
+    - `scales/{taxo_level}.npy`: the scale of each vector of the `int8` taxonomy levels,
+    - `columns/{field}.npy`: a fixed-width string column for each of the
+        [`METADATA_FIELDS`][taxotagger.embeddings.METADATA_FIELDS].
+
+    The files are opened with memory mapping, so opening a database only reads the manifest and
+    the pages of the matrices are loaded lazily by the operating system during the search.
+
+    The search runs blocked matrix products over the normalised matrix and keeps the running
+    top-k hits, so the memory for the scores is bounded. There is no inter-process communication,
+    which makes it faster than Milvus Lite for small and medium reference databases.
+
+    The normalised matrices of large taxonomy levels, e.g. species and genus, can be stored in
+    reduced precision to cut the memory bandwidth of the search: `float16` halves the size, and
+    `int8` with a scale per vector quarters it. For these levels, the top
+    `limit * rescore_factor` candidates are rescored with the full precision vectors, of which
+    only the rows of the candidates are read. The full precision vectors are only stored if the
+    `rescore_factor` is greater than 1 when the collections are created, as they take more space
+    on disk than the reduced precision vectors they are rescoring.
+
+    The inserted embeddings are staged on disk and written to the database by
+    [`flush`][taxotagger.vector_stores.NumpyVectorStore.flush]. The files of the database are
+    replaced atomically, so other processes with the database open keep their old version.
+
+    Only the exact search is supported, so `index_params` are ignored, and the `filter` search
+    parameter is not supported.
+    """
+
+    name = "numpy"
+    extension = ".npdb"
+    format_version = 2
+
+    query_block_size = 1024
+    """The number of query vectors scored at a time."""
+
+    reference_block_size = 16384
+    """The number of reference vectors scored at a time."""
+
+    def __init__(self, db_path: str, rescore_factor: int = 4) -> None:
+        """Open the database, memory-mapping the existing embeddings if there are any.
+
+        Args:
+            db_path: The path to the database directory.
+            rescore_factor: The number of candidates per hit that are rescored with the full
+                precision vectors for the taxonomy levels stored in reduced precision. Defaults to
+                `4`. Use `1` to disable the rescoring, and to not store the full precision vectors
+                of new collections.
+        """
+        if not is_local(db_path):
+            raise ValueError(f"The numpy vector store only supports local databases, got {db_path}")
+        self.db_path = Path(db_path)
+        self.rescore_factor = rescore_factor
+        self._count = 0
+        self._dims: dict[str, int] = {}
+        self._dtypes: dict[str, np.dtype] = {}
+        # the taxonomy levels with full precision vectors for the rescoring
+        self._full_precision: list[str] = []
+        self._vectors: dict[str, np.ndarray] = {}
+        self._normalized: dict[str, np.ndarray] = {}
+        self._scales: dict[str, np.ndarray] = {}
+        self._columns: dict[str, np.ndarray] = {}
+        # the batches inserted since the last flush
+        self._staged_count = 0
+        self._staged_columns: list[np.ndarray] = []
+        self._replace = False
+        if (self.db_path / "manifest.json").exists():
+            self._open()
+
+    def __len__(self) -> int:
+        return self._count
+
+    def create_collections(
+        self,
+        dims: dict[str, int],
+        index_params: dict[str, dict[str, Any]],
+        vector_dtype: dict[str, str] | None = None,
+    ) -> None:
+        """Create an empty collection for each taxonomy level, replacing the existing embeddings.
+
+        The existing embeddings are replaced when the inserted embeddings are flushed.
+
+        Args:
+            dims: The dimensions of the embeddings for each taxonomy level.
+            index_params: Ignored, the search is always exact.
+            vector_dtype: The dtype of the normalised vectors for each taxonomy level,
+                `"float32"`, `"float16"` or `"int8"`. The full precision vectors of the reduced
+                precision levels are kept for the rescoring if `rescore_factor` is greater than 1.
+                Defaults to `"float32"`.
+        """
+        if index_params:
+            logger.warning("The numpy vector store only supports exact search, ignore index_params")
+        self._discard_staged()
+        self._dims = {taxo_level: dims[taxo_level] for taxo_level in TAXONOMY_LEVELS}
+        self._dtypes = {
+            taxo_level: np.dtype((vector_dtype or {}).get(taxo_level, "float32"))
+            for taxo_level in TAXONOMY_LEVELS
+        }
+        self._full_precision = [
+            taxo_level
+            for taxo_level, dtype in self._dtypes.items()
+            if dtype != np.float32 and self.rescore_factor > 1
+        ]
+        self._replace = True
+
+    def insert(self, batch: EmbeddingBatch) -> None:
+        """Stage the embeddings for all taxonomy levels, they are written by `flush`.
+
+        Args:
+            batch: The embeddings and metadata of the sequences.
+        """
+        if not self._dims:
+            raise ValueError(f"No collections in {self.db_path}, call create_collections first")
+        staging_dir = self.db_path / "staging"
+        staging_dir.mkdir(parents=True, exist_ok=True)
+        for taxo_level in TAXONOMY_LEVELS:
+            vectors = np.asarray(batch.vectors[taxo_level], dtype=np.float32)
+            normalized, scales = _quantize(l2_normalize(vectors), self._dtypes[taxo_level])
+            if taxo_level in self._full_precision:
+                with open(staging_dir / f"{taxo_level}.vectors", "ab") as fh:
+                    vectors.tofile(fh)
+            with open(staging_dir / f"{taxo_level}.normalized", "ab") as fh:
+                normalized.tofile(fh)
+            if scales is not None:
+                with open(staging_dir / f"{taxo_level}.scales", "ab") as fh:
+                    scales.tofile(fh)
+        self._staged_columns.append(batch.metadata.astype(str))
+        self._staged_count += len(batch)
+
+    def search(
+        self,
+        taxo_level: str,
+        vectors: np.ndarray,
+        output_fields: list[str],
+        limit: int = 10,
+        **kwargs: Any,
+    ) -> list[list[dict]]:
+        """Search the top `limit` most cosine-similar reference vectors of the query vectors.
+
+        Staged embeddings are flushed first.
+
+        Args:
+            taxo_level: The taxonomy level of the collection.
+            vectors: The query vectors with shape `(n_queries, n_features)`.
+            output_fields: The metadata fields to include in the search results.
+            limit: The number of hits to return for each query. Defaults to 10.
+            kwargs: Other search parameters. `filter` is not supported, and the others, e.g.
+                `timeout` or `search_params`, are ignored.
+
+        Returns:
+            The hits of each query vector, most similar first.
+
+        Raises:
+            ValueError: If a `filter` expression is given, which the numpy vector store does not
+                support, or the collection of the taxonomy level does not exist.
+        """
+        if kwargs.get("filter"):
+            raise ValueError(
+                f"The numpy vector store does not support filter expressions, got {kwargs['filter']}"
+            )
+        self.flush()
+        if taxo_level not in self._normalized:
+            raise ValueError(f"Collection {taxo_level} does not exist in {self.db_path}")
+
+        queries = l2_normalize(np.asarray(vectors, dtype=np.float32))
+        rescore = (
+            self._dtypes[taxo_level] != np.float32
+            and taxo_level in self._vectors
+            and self.rescore_factor > 1
+        )
+        scores, indices = _top_k_cosine(
+            queries,
+            self._normalized[taxo_level],
+            limit * self.rescore_factor if rescore else limit,
+            self.query_block_size,
+            self.reference_block_size,
+            self._scales.get(taxo_level),
+        )
+        if rescore:
+            scores, indices = self._rescore(taxo_level, queries, indices, limit)
+
+        ids = self._columns["id"][indices].tolist()
+        fields = {
+            field: self._columns[field][indices].tolist()
+            for field in output_fields
+            if field in ("id", taxo_level, "SH_id")
+        }
+        return [
+            [
+                {
+                    "id": ids[q][j],
+                    "distance": score,
+                    "entity": {field: values[q][j] for field, values in fields.items()},
+                }
+                for j, score in enumerate(query_scores)
+            ]
+            for q, query_scores in enumerate(scores.tolist())
+        ]
+
+    def index_size(self, taxo_level: str) -> int:
+        """Get the size in bytes on disk of the vectors of a taxonomy level.
+
+        Args:
+            taxo_level: The taxonomy level of the collection.
+
+        Returns:
+            The total size of the files of the normalised matrix, the scales and the full
+                precision vectors of the taxonomy level.
+        """
+        self.flush()
+        return sum(
+            path.stat().st_size
+            for path in (
+                self.db_path / subdir / f"{taxo_level}.npy"
+                for subdir in ("normalized", "scales", "vectors")
+            )
+            if path.exists()
+        )
+
+    def flush(self) -> None:
+        """Write the staged embeddings to the database and memory-map the new files."""
+        if not self._replace and self._staged_count == 0:
+            return
+        self.db_path.mkdir(parents=True, exist_ok=True)
+        staging_dir = self.db_path / "staging"
+        # keep the existing rows unless the collections are recreated
+        old_count = 0 if self._replace else self._count
+        count = old_count + self._staged_count
+
+        for taxo_level, dim in self._dims.items():
+            dtype = self._dtypes[taxo_level]
+            # (directory, current arrays, dtype, shape of a row)
+            files: list[tuple[str, dict[str, np.ndarray], np.dtype, tuple[int, ...]]] = [
+                ("normalized", self._normalized, dtype, (dim,)),
+            ]
+            if taxo_level in self._full_precision:
+                files.append(("vectors", self._vectors, np.dtype(np.float32), (dim,)))
+            if dtype == np.int8:
+                files.append(("scales", self._scales, np.dtype(np.float32), ()))
+            for subdir, old, file_dtype, row_shape in files:
+                (self.db_path / subdir).mkdir(exist_ok=True)
+                staged_file = staging_dir / f"{taxo_level}.{subdir}"
+                staged: np.ndarray
+                if self._staged_count:
+                    shape = (self._staged_count,) + row_shape
+                    staged = np.memmap(staged_file, dtype=file_dtype, mode="r", shape=shape)
+                else:
+                    staged = np.empty((0,) + row_shape, dtype=file_dtype)
+                _replace_npy(
+                    self.db_path / subdir / f"{taxo_level}.npy",
+                    [old[taxo_level][:old_count]] if old_count else [],
+                    staged,
+                )
+
+        (self.db_path / "columns").mkdir(exist_ok=True)
+        staged_metadata = (
+            np.concatenate(self._staged_columns)
+            if self._staged_columns
+            else np.empty((0, len(METADATA_FIELDS)), dtype=str)
+        )
+        for j, field in enumerate(METADATA_FIELDS):
+            column = staged_metadata[:, j]
+            if old_count:
+                column = np.concatenate([self._columns[field][:old_count], column])
+            _replace_npy(self.db_path / "columns" / f"{field}.npy", [], column)
+
+        # the manifest is written last, it marks the database as complete
+        manifest = {
+            "format_version": self.format_version,
+            "count": count,
+            "dims": self._dims,
+            "dtypes": {taxo_level: dtype.name for taxo_level, dtype in self._dtypes.items()},
+            "full_precision": self._full_precision,
+        }
+        tmp_manifest = self.db_path / "manifest.json.tmp"
+        tmp_manifest.write_text(json.dumps(manifest, indent=2))
+        os.replace(tmp_manifest, self.db_path / "manifest.json")
+        # remove the files of the previous collections that are not used anymore
+        for taxo_level, dtype in self._dtypes.items():
+            if taxo_level not in self._full_precision:
+                (self.db_path / "vectors" / f"{taxo_level}.npy").unlink(missing_ok=True)
+            if dtype != np.int8:
+                (self.db_path / "scales" / f"{taxo_level}.npy").unlink(missing_ok=True)
+
+        self._discard_staged()
+        self._replace = False
+        self._open()
+        logger.debug(f"Wrote {count} sequences to the database {self.db_path}")
+
+    def close(self) -> None:
+        """Write the staged embeddings to the database and release the memory maps."""
+        self.flush()
+        self._vectors, self._normalized, self._scales, self._columns = {}, {}, {}, {}
+
+    def _rescore(
+        self, taxo_level: str, queries: np.ndarray, candidates: np.ndarray, limit: int
+    ) -> tuple[np.ndarray, np.ndarray]:
+        """Rescore the candidates of each query with the full precision vectors.
+
+        Args:
+            taxo_level: The taxonomy level of the collection.
+            queries: The normalised query vectors.
+            candidates: The indices of the candidate reference vectors of each query.
+            limit: The number of hits to keep for each query.
+
+        Returns:
+            The exact cosine similarities and the indices of the top `limit` candidates of each
+                query, in descending order of the similarities.
+        """
+        k = min(limit, candidates.shape[1])
+        top_scores = np.empty((len(queries), k), dtype=np.float32)
+        top_indices = np.empty((len(queries), k), dtype=np.int64)
+        for q, (query, rows) in enumerate(zip(queries, candidates)):
+            # read the rows in file order
+            sorted_rows = np.sort(rows)
+            scores = l2_normalize(self._vectors[taxo_level][sorted_rows]) @ query
+            order = np.argsort(-scores, kind="stable")[:k]
+            top_scores[q] = scores[order]
+            top_indices[q] = sorted_rows[order]
+        return top_scores, top_indices
+
+    def _open(self) -> None:
+        """Memory-map the files of the database."""
+        manifest = json.loads((self.db_path / "manifest.json").read_text())
+        if manifest["format_version"] not in (1, self.format_version):
+            raise ValueError(
+                f"Unsupported format version {manifest['format_version']} of {self.db_path}"
+            )
+        self._count = manifest["count"]
+        self._dims = manifest["dims"]
+        self._dtypes = {
+            taxo_level: np.dtype(dtype) for taxo_level, dtype in manifest["dtypes"].items()
+        }
+        # the databases of format version 1 store the full precision vectors of all levels
+        self._full_precision = manifest.get("full_precision", list(self._dims))
+        self._vectors = {
+            taxo_level: np.load(self.db_path / "vectors" / f"{taxo_level}.npy", mmap_mode="r")
+            for taxo_level in self._full_precision
+        }
+        self._normalized = {
+            taxo_level: np.load(self.db_path / "normalized" / f"{taxo_level}.npy", mmap_mode="r")
+            for taxo_level in self._dims
+        }
+        self._scales = {
+            taxo_level: np.load(self.db_path / "scales" / f"{taxo_level}.npy", mmap_mode="r")
+            for taxo_level, dtype in self._dtypes.items()
+            if dtype == np.int8
+        }
+        self._columns = {
+            field: np.load(self.db_path / "columns" / f"{field}.npy", mmap_mode="r")
+            for field in METADATA_FIELDS
+        }
+
+    def _discard_staged(self) -> None:
+        """Remove the staged embeddings."""
+        shutil.rmtree(self.db_path / "staging", ignore_errors=True)
+        self._staged_count = 0
+        self._staged_columns = []
+
+
+def _replace_npy(path: Path, parts: list[np.ndarray], last: np.ndarray) -> None:
+    """Atomically replace a `.npy` file with the concatenation of the arrays.
+
+    The arrays are copied into a memory-mapped file, so they are not concatenated in memory.
+    """
+    arrays = parts + [last]
+    shape = (sum(len(a) for a in arrays),) + last.shape[1:]
+    if last.dtype.kind == "U":
+        dtype = np.result_type(*arrays)
+    else:
+        dtype = last.dtype
+    tmp_path = path.with_name(path.name + ".tmp")
+    if shape[0] == 0:
+        with open(tmp_path, "wb") as fh:
+            np.save(fh, np.empty(shape, dtype=dtype))
+        os.replace(tmp_path, path)
+        return
+    out = np.lib.format.open_memmap(tmp_path, mode="w+", dtype=dtype, shape=shape)
+    start = 0
+    for array in arrays:
+        out[start : start + len(array)] = array
+        start += len(array)
+    out.flush()
+    del out
+    os.replace(tmp_path, path)
+
+
+def _quantize(vectors: np.ndarray, dtype: np.dtype) -> tuple[np.ndarray, np.ndarray | None]:
+    """Convert normalised float32 vectors to the storage dtype.
+
+    For `int8`, each vector is scaled so that its largest absolute value maps to 127, and the
+    scale is returned to restore the dot products.
+
+    Returns:
+        The converted vectors, and the scale of each vector for `int8` or `None` otherwise.
+    """
+    if dtype != np.int8:
+        return vectors.astype(dtype), None
+    scales = np.abs(vectors).max(axis=1) / 127
+    scales[scales == 0] = 1
+    quantized = np.round(vectors / scales[:, None]).astype(np.int8)
+    return quantized, scales.astype(np.float32)
+
+
+def _top_k_cosine(
+    queries: np.ndarray,
+    references: np.ndarray,
+    k: int,
+    query_block_size: int,
+    reference_block_size: int,
+    scales: np.ndarray | None = None,
+) -> tuple[np.ndarray, np.ndarray]:
+    """Find the top `k` reference vectors with the largest dot product for each query vector.
+
+    The vectors are expected to be normalised, so the dot product is the cosine similarity.
+    The reference vectors can be stored in reduced precision, with the `scales` of `int8`
+    vectors from `_quantize`.
+
+    Returns:
+        The scores and the indices of the top `k` reference vectors with shape
+            `(n_queries, min(k, n_references))`, in descending order of the scores.
+    """
+    n_queries, n_references = len(queries), len(references)
+    k = min(k, n_references)
+    top_scores = np.empty((n_queries, k), dtype=np.float32)
+    top_indices = np.empty((n_queries, k), dtype=np.int64)
+    if k == 0:
+        return top_scores, top_indices
+
+    for q_start in range(0, n_queries, query_block_size):
+        query_block = queries[q_start : q_start + query_block_size]
+        best_scores = np.full((len(query_block), 0), -np.inf, dtype=np.float32)
+        best_indices = np.empty((len(query_block), 0), dtype=np.int64)
+
+        for r_start in range(0, n_references, reference_block_size):
+            block = np.asarray(references[r_start : r_start + reference_block_size], np.float32)
+            scores = query_block @ block.T
+            if scales is not None:
+                scores *= scales[r_start : r_start + reference_block_size]
+            indices = np.arange(r_start, r_start + scores.shape[1])
+            # merge the block scores with the running top-k
+            scores = np.concatenate([best_scores, scores], axis=1)
+            indices = np.concatenate(
+                [best_indices, np.broadcast_to(indices, (len(query_block), len(indices)))], axis=1
+            )
+            if scores.shape[1] > k:
+                part = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+                scores = np.take_along_axis(scores, part, axis=1)
+                indices = np.take_along_axis(indices, part, axis=1)
+            best_scores, best_indices = scores, indices
+
+        order = np.argsort(-best_scores, axis=1, kind="stable")
+        top_scores[q_start : q_start + len(query_block)] = np.take_along_axis(
+            best_scores, order, axis=1
+        )
+        top_indices[q_start : q_start + len(query_block)] = np.take_along_axis(
+            best_indices, order, axis=1
+        )
+    return top_scores, top_indices
@@ -0,0 +1,129 @@
+import numpy as np
+import pytest
+from taxotagger.cache import EmbeddingCache
+from taxotagger.cache import SearchResultCache
+from taxotagger.cache import file_checksum
+from taxotagger.cache import sequence_hash
+from taxotagger.config import ProjectConfig
+
+
+def make_vectors(n, offset=0):
+    return {
+        "phylum": np.arange(offset, offset + n * 3, dtype=np.float32).reshape(n, 3),
+        "class": np.arange(offset, offset + n * 5, dtype=np.float32).reshape(n, 5),
+    }
+
+
+@pytest.fixture
+def cache(tmp_path):
+    return EmbeddingCache(tmp_path / "cache", max_size=1024 * 1024)
+
+
+def test_sequence_hash():
+    assert sequence_hash("acgt") == sequence_hash("ACGT")
+    assert sequence_hash("ACGT") != sequence_hash("ACGA")
+
+
+def test_file_checksum(tmp_path):
+    file = tmp_path / "model.pt"
+    file.write_bytes(b"model")
+    checksum = file_checksum(file)
+    assert checksum == file_checksum(file)
+    file.write_bytes(b"another model")
+    assert file_checksum(file) != checksum
+
+
+def test_for_model_settings(tmp_path):
+    (tmp_path / "MycoAI-CNN.pt").write_bytes(b"model")
+    config = ProjectConfig(mycoai_home=str(tmp_path))
+    EmbeddingCache.for_model(config, "MycoAI-CNN").put(["h1"], make_vectors(1))
+    assert EmbeddingCache.for_model(config, "MycoAI-CNN").get(["h1"])[0] == [0]
+
+    # the quantized model and bfloat16 inference give different embeddings
+    for settings in ({"quantize": "dynamic-int8"}, {"inference_dtype": "bfloat16"}):
+        other_config = ProjectConfig(mycoai_home=str(tmp_path), **settings)
+        assert EmbeddingCache.for_model(other_config, "MycoAI-CNN").get(["h1"]) == ([], {})
+
+
+def test_get_empty_cache(cache):
+    assert cache.get(["h1", "h2"]) == ([], {})
+
+
+def test_put_and_get(cache):
+    vectors = make_vectors(3)
+    cache.put(["h1", "h2", "h3"], vectors)
+
+    hit_indices, hit_vectors = cache.get(["h0", "h3", "h1"])
+    assert hit_indices == [1, 2]
+    np.testing.assert_array_equal(hit_vectors["phylum"], vectors["phylum"][[2, 0]])
+    np.testing.assert_array_equal(hit_vectors["class"], vectors["class"][[2, 0]])
+
+
+def test_get_across_segments(cache):
+    vectors1 = make_vectors(2)
+    vectors2 = make_vectors(2, offset=100)
+    cache.put(["h1", "h2"], vectors1)
+    cache.put(["h3", "h4"], vectors2)
+
+    hit_indices, hit_vectors = cache.get(["h4", "h1"])
+    assert hit_indices == [0, 1]
+    np.testing.assert_array_equal(hit_vectors["phylum"][0], vectors2["phylum"][1])
+    np.testing.assert_array_equal(hit_vectors["phylum"][1], vectors1["phylum"][0])
+
+
+def test_evict_least_recently_used(tmp_path):
+    # each segment of 2 sequences takes 2 * (3 + 5) * 4 = 64 bytes
+    cache = EmbeddingCache(tmp_path / "cache", max_size=128)
+    cache.put(["h1", "h2"], make_vectors(2))
+    cache.put(["h3", "h4"], make_vectors(2))
+    cache.get(["h1"])  # make the first segment the most recently used
+    cache.put(["h5", "h6"], make_vectors(2))
+
+    hit_indices, _ = cache.get(["h1", "h3", "h5"])
+    assert hit_indices == [0, 2]
+
+
+def test_clear(cache):
+    cache.put(["h1"], make_vectors(1))
+    cache.clear()
+    assert cache.get(["h1"]) == ([], {})
+    assert list(cache.cache_dir.iterdir()) == [cache.cache_dir / "index.sqlite"]
+
+
+def test_search_result_cache():
+    cache = SearchResultCache(max_size=10)
+    hits = [{"id": "seq1", "distance": 1.0, "entity": {"phylum": "Ascomycota"}}]
+    key = ("db", "phylum", "h1", "{}")
+    assert cache.get(key) is None
+
+    cache.put(key, hits)
+    result = cache.get(key)
+    assert result == hits
+    # the cached result is not affected by changes to the returned copy
+    result[0]["id"] = "changed"
+    assert cache.get(key) == hits
+
+
+def test_search_result_cache_evicts_least_recently_used():
+    cache = SearchResultCache(max_size=2)
+    cache.put(("db", "phylum", "h1", "{}"), [])
+    cache.put(("db", "phylum", "h2", "{}"), [])
+    cache.get(("db", "phylum", "h1", "{}"))
+    cache.put(("db", "phylum", "h3", "{}"), [])
+
+    assert len(cache) == 2
+    assert cache.get(("db", "phylum", "h2", "{}")) is None
+    assert cache.get(("db", "phylum", "h1", "{}")) == []
+
+
+def test_search_result_cache_invalidate():
+    cache = SearchResultCache(max_size=10)
+    cache.put(("db1", "phylum", "h1", "{}"), [])
+    cache.put(("db2", "phylum", "h1", "{}"), [])
+
+    cache.invalidate("db1")
+    assert cache.get(("db1", "phylum", "h1", "{}")) is None
+    assert cache.get(("db2", "phylum", "h1", "{}")) == []
+
+    cache.invalidate()
+    assert len(cache) == 0
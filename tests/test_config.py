@@ -1,4 +1,6 @@
 import os
+import pytest
+from pydantic import ValidationError
 from taxotagger.config import ProjectConfig
 from taxotagger.defaults import DEFAULT_CACHE_DIR
 from taxotagger.defaults import ENV_MYCOAI_HOME
@@ -9,6 +11,14 @@ def test_default_config():
     assert config.mycoai_home == os.path.expanduser(DEFAULT_CACHE_DIR)
     assert config.device == "cpu"
     assert config.force_reload is False
+    assert config.batch_size == 64
+    assert config.encode_workers == 1
+    assert config.pipeline_queue_size == 2
+    assert config.inference_backend == "eager"
+    assert config.inference_dtype == "float32"
+    assert config.num_threads is None
+    assert config.quantize is None
+    assert config.db_idle_timeout == 600
     assert config.log_level == "INFO"
     assert config.log_file == ""
     assert config.log_to_console is True
@@ -30,6 +40,26 @@ def test_force_reload():
     assert config.force_reload is True
 
 
+def test_batch_size():
+    config = ProjectConfig(batch_size=8)
+    assert config.batch_size == 8
+
+
+def test_batch_size_invalid():
+    with pytest.raises(ValidationError):
+        ProjectConfig(batch_size=0)
+
+
+def test_encode_workers_invalid():
+    with pytest.raises(ValidationError):
+        ProjectConfig(encode_workers=0)
+
+
+def test_inference_backend_invalid():
+    with pytest.raises(ValidationError):
+        ProjectConfig(inference_backend="onnx")
+
+
 def test_log_level():
     config = ProjectConfig(log_level="DEBUG")
     assert config.log_level == "DEBUG"
@@ -0,0 +1,82 @@
+import numpy as np
+import pytest
+from taxotagger.defaults import TAXONOMY_LEVELS
+from taxotagger.embeddings import EmbeddingBatch
+
+
+HEADERS = [
+    ["seq1", "Fungi", "p1", "c1", "o1", "f1", "g1", "s1", "SH1"],
+    ["seq2", "Fungi", "p2", "c2", "o2", "f2", "g2", "s2", ""],
+]
+
+
+@pytest.fixture
+def batch():
+    vectors = {
+        taxo_level: np.arange(2 * (i + 2), dtype=np.float32).reshape(2, i + 2)
+        for i, taxo_level in enumerate(TAXONOMY_LEVELS)
+    }
+    return EmbeddingBatch(HEADERS, vectors)
+
+
+def test_embedding_batch_properties(batch):
+    assert len(batch) == 2
+    assert list(batch.ids) == ["seq1", "seq2"]
+    assert batch.dims == {taxo_level: i + 2 for i, taxo_level in enumerate(TAXONOMY_LEVELS)}
+    assert list(batch.labels("genus")) == ["g1", "g2"]
+
+
+def test_embedding_batch_to_records(batch):
+    records = batch.to_records("class")
+    assert records[0]["id"] == "seq1"
+    assert records[0]["class"] == "c1"
+    assert records[0]["SH_id"] == "SH1"
+    assert records[1]["SH_id"] == ""
+    np.testing.assert_array_equal(records[1]["vector"], batch.vectors["class"][1])
+    # the record vectors are views of the embedding matrix
+    assert np.shares_memory(records[1]["vector"], batch.vectors["class"])
+
+
+def test_embedding_batch_to_dict(batch):
+    result = batch.to_dict()
+    assert list(result.keys()) == TAXONOMY_LEVELS
+    assert all(len(records) == 2 for records in result.values())
+
+
+def test_embedding_batch_select(batch):
+    selected = batch.select(["genus", "phylum"])
+    assert list(selected.vectors) == ["genus", "phylum"]
+    assert selected.vectors["genus"] is batch.vectors["genus"]
+    assert list(selected.to_dict()) == ["phylum", "genus"]
+
+
+def test_embedding_batch_mismatched_vectors():
+    with pytest.raises(ValueError, match="does not match"):
+        EmbeddingBatch(HEADERS, {"phylum": np.zeros((3, 2), dtype=np.float32)})
+
+
+def test_embedding_batch_concatenate(batch):
+    empty = EmbeddingBatch(np.empty((0, 9), dtype=object), {})
+    result = EmbeddingBatch.concatenate([batch, empty, batch.select(TAXONOMY_LEVELS)])
+    assert list(result.ids) == ["seq1", "seq2", "seq1", "seq2"]
+    assert result.dims == batch.dims
+    np.testing.assert_array_equal(result.vectors["species"][2:], batch.vectors["species"])
+
+
+def test_embedding_batch_concatenate_invalid(batch):
+    with pytest.raises(ValueError, match="No embeddings"):
+        EmbeddingBatch.concatenate([])
+    with pytest.raises(ValueError, match="different dimensions"):
+        EmbeddingBatch.concatenate([batch, batch.select(["genus"])])
+
+
+def test_embedding_batch_save_load(batch, tmp_path):
+    path = tmp_path / "embeddings.npz"
+    batch.save(path)
+    loaded = EmbeddingBatch.load(path)
+    assert loaded.metadata.dtype == object
+    assert loaded.metadata.tolist() == batch.metadata.tolist()
+    assert list(loaded.vectors) == list(batch.vectors)
+    for taxo_level, vectors in batch.vectors.items():
+        np.testing.assert_array_equal(loaded.vectors[taxo_level], vectors)
+        assert loaded.vectors[taxo_level].dtype == np.float32
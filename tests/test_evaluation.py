@@ -0,0 +1,32 @@
+import pytest
+from taxotagger.evaluation import recall_at_k
+
+
+def hits(*ids):
+    return [{"id": id} for id in ids]
+
+
+def test_recall_at_k_exact():
+    expected = [hits("a", "b"), hits("c", "d")]
+    assert recall_at_k(expected, expected) == 1.0
+
+
+def test_recall_at_k_partial():
+    expected = [hits("a", "b"), hits("c", "d")]
+    actual = [hits("b", "x"), hits("d", "c")]
+    assert recall_at_k(expected, actual) == 0.75
+
+
+def test_recall_at_k_top_k():
+    expected = [hits("a", "b", "c")]
+    actual = [hits("a", "c", "b")]
+    assert recall_at_k(expected, actual, k=2) == 0.5
+
+
+def test_recall_at_k_no_expected_hits():
+    assert recall_at_k([hits()], [hits("a")]) == 1.0
+
+
+def test_recall_at_k_mismatched_queries():
+    with pytest.raises(ValueError, match="number of queries"):
+        recall_at_k([hits("a")], [])
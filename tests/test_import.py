@@ -0,0 +1,65 @@
+import os
+import subprocess
+import sys
+from pathlib import Path
+import pytest
+import taxotagger
+
+
+SRC_DIR = Path(__file__).resolve().parents[1] / "src"
+
+# The heavy dependencies that must only be imported on first use of the models or databases
+HEAVY_MODULES = ["torch", "mycoai", "pymilvus", "httpx"]
+
+# The maximum cumulative time in seconds of a cold `import taxotagger`, as reported by
+# `python -X importtime`
+IMPORT_TIME_BUDGET = 1.0
+
+
+def run_python(*args: str) -> subprocess.CompletedProcess:
+    """Run a fresh Python interpreter with the source tree of the package on the path."""
+    env = os.environ.copy()
+    env["PYTHONPATH"] = os.pathsep.join(filter(None, [str(SRC_DIR), env.get("PYTHONPATH")]))
+    return subprocess.run(
+        [sys.executable, *args], capture_output=True, text=True, env=env, check=True
+    )
+
+
+@pytest.mark.parametrize(
+    "statement",
+    [
+        "import taxotagger",
+        "from taxotagger import ProjectConfig",
+        "from taxotagger import TaxoTagger",
+    ],
+)
+def test_import_does_not_import_heavy_modules(statement):
+    result = run_python(
+        "-c",
+        f"import sys; {statement}; "
+        f"print(','.join(m for m in {HEAVY_MODULES!r} if m in sys.modules))",
+    )
+    assert result.stdout.strip() == ""
+
+
+def test_import_time_budget():
+    result = run_python("-X", "importtime", "-c", "import taxotagger")
+    # the lines are "import time: self [us] | cumulative [us] | module"
+    cumulative = [
+        int(line.split("|")[1])
+        for line in result.stderr.splitlines()
+        if line.split("|")[-1].strip() == "taxotagger"
+    ]
+    assert len(cumulative) == 1
+    assert cumulative[0] / 1e6 < IMPORT_TIME_BUDGET
+
+
+def test_lazy_attributes():
+    from taxotagger.logger import setup_logging
+    from taxotagger.taxotagger import TaxoTagger
+
+    assert taxotagger.TaxoTagger is TaxoTagger
+    assert taxotagger.setup_logging is setup_logging
+    assert set(taxotagger.__all__) <= set(dir(taxotagger))
+    with pytest.raises(AttributeError, match="has no attribute 'InvalidName'"):
+        taxotagger.InvalidName
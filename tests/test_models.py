@@ -1,12 +1,27 @@
 import os
+import types
+import numpy as np
+import pandas as pd
 import pytest
+import torch
+from mycoai import data
 from taxotagger import ProjectConfig
 from taxotagger.models import ModelFactory
 from taxotagger.models import MycoAIBERTEmbedModel
 from taxotagger.models import MycoAICNNEmbedModel
+from taxotagger.models import _get_model_memory
+from taxotagger.models import _MycoAIEmbedModel
+from taxotagger.models import _records_to_data
+from taxotagger.models import _token_budget_batches
+from taxotagger.utils import iter_fasta
+from taxotagger.utils import write_fasta
 from . import DATA_DIR
 
 
+QUERY_FASTA = str(DATA_DIR / "query.fasta")
+DATABASE_FASTA = str(DATA_DIR / "database.fasta")
+
+
 if os.getenv("CI"):
     pytest.skip("Skipping tests in this file on CI environment", allow_module_level=True)
 
@@ -29,3 +44,172 @@ def test_get_model_mycoai_bert(config):
 def test_get_model_invalid(config):
     with pytest.raises(ValueError, match="Invalid model id"):
         ModelFactory.get_model("InvalidModel", config)
+
+
+def test_get_model_cached(config):
+    ModelFactory.evict()
+    model = ModelFactory.get_model("MycoAI-CNN", config)
+    assert ModelFactory.get_model("MycoAI-CNN", config) is model
+    assert ModelFactory.cached_models() == [("MycoAI-CNN", "cpu")]
+
+
+def test_get_model_cached_other_config(config):
+    ModelFactory.evict()
+    model = ModelFactory.get_model("MycoAI-CNN", config)
+    other_config = ProjectConfig(mycoai_home=str(DATA_DIR), batch_size=2)
+    other_model = ModelFactory.get_model("MycoAI-CNN", other_config)
+    # the cached model keeps its configuration and shares its weights with the copy
+    assert other_model is not model
+    assert other_model.model is model.model
+    assert other_model._config is other_config
+    assert model._config is config
+    assert ModelFactory.get_model("MycoAI-CNN", config) is model
+
+
+def test_get_model_cache_disabled(config):
+    ModelFactory.evict()
+    config.model_cache_max_memory = 0
+    model = ModelFactory.get_model("MycoAI-CNN", config)
+    assert ModelFactory.get_model("MycoAI-CNN", config) is not model
+    assert ModelFactory.cached_models() == []
+
+
+def test_evict(config):
+    ModelFactory.get_model("MycoAI-CNN", config)
+    ModelFactory.get_model("MycoAI-BERT", config)
+    ModelFactory.evict("MycoAI-CNN")
+    assert ModelFactory.cached_models() == [("MycoAI-BERT", "cpu")]
+    ModelFactory.evict()
+    assert ModelFactory.cached_models() == []
+
+
+def test_records_to_data(tmp_path):
+    records = list(iter_fasta(QUERY_FASTA))
+    records.append(("KY106088_copy", records[0][1].lower()))
+    fasta_file = tmp_path / "repeated.fasta"
+    write_fasta(records, fasta_file)
+
+    expected = data.Data(str(fasta_file), tax_parser=None, allow_duplicates=False).data
+    pd.testing.assert_frame_equal(_records_to_data(records).data, expected)
+
+
+@pytest.mark.parametrize("model_id", ["MycoAI-CNN", "MycoAI-BERT"])
+def test_parse_and_encode_fasta_parallel(config, model_id):
+    model = ModelFactory.get_model(model_id, config)
+    headers, encoded_data = model.parse_and_encode_fasta(QUERY_FASTA)
+
+    config.encode_workers = 2
+    parallel_headers, parallel_encoded_data = model.parse_and_encode_fasta(QUERY_FASTA)
+    assert parallel_headers.tolist() == headers.tolist()
+    assert torch.equal(parallel_encoded_data.sequences, encoded_data.sequences)
+    assert torch.equal(parallel_encoded_data.taxonomies, encoded_data.taxonomies)
+
+
+@pytest.mark.parametrize("model_id", ["MycoAI-CNN", "MycoAI-BERT"])
+def test_encode_records(config, model_id):
+    model = ModelFactory.get_model(model_id, config)
+    headers, encoded_data = model.parse_and_encode_fasta(QUERY_FASTA)
+
+    records_headers, records_encoded_data = model.encode_records(list(iter_fasta(QUERY_FASTA)))
+    assert records_headers.tolist() == headers.tolist()
+    assert torch.equal(records_encoded_data.sequences, encoded_data.sequences)
+
+
+@pytest.mark.parametrize(
+    "lengths, max_tokens, expected",
+    [
+        ([3, 10, 5, 10, 1], 20, [[1, 3], [2, 0, 4]]),
+        ([3, 10, 5, 10, 1], 5, [[1], [3], [2], [0], [4]]),
+        ([0, 0], 4, [[0, 1]]),
+        ([], 10, []),
+    ],
+)
+def test_token_budget_batches(lengths, max_tokens, expected):
+    batches = _token_budget_batches(np.array(lengths, dtype=int), max_tokens)
+    assert [batch.tolist() for batch in batches] == expected
+
+
+@pytest.mark.parametrize("max_batch_tokens", [None, 1, 2000])
+def test_bert_length_bucketed_batches(config, max_batch_tokens):
+    model = ModelFactory.get_model("MycoAI-BERT", config)
+    _, encoded_data = model.parse_and_encode_fasta(QUERY_FASTA)
+    # fixed size batches of sequences padded to the longest sequence of all
+    model._iter_batches = types.MethodType(_MycoAIEmbedModel._iter_batches, model)
+    expected = model.infer(encoded_data, batch_size=2)
+    del model._iter_batches
+
+    config.max_batch_tokens = max_batch_tokens
+    result = model.infer(encoded_data, batch_size=2)
+    assert len(result) == len(expected)
+    for output, expected_output in zip(result, expected):
+        np.testing.assert_allclose(output, expected_output, atol=1e-4)
+
+
+@pytest.mark.parametrize("model_id", ["MycoAI-CNN", "MycoAI-BERT"])
+@pytest.mark.parametrize(
+    "backend, dtype, atol",
+    [("trace", "float32", 1e-4), ("compile", "float32", 1e-4), ("eager", "bfloat16", 5e-2)],
+)
+def test_infer_optimized(config, model_id, backend, dtype, atol):
+    model = ModelFactory.get_model(model_id, config)
+    assert not model.model.training
+    _, encoded_data = model.parse_and_encode_fasta(QUERY_FASTA)
+    expected = model.infer(encoded_data)
+
+    config.inference_backend = backend
+    config.inference_dtype = dtype
+    config.num_threads = 2
+    result = model.infer(encoded_data)
+    assert torch.get_num_threads() == 2
+    for output, expected_output in zip(result, expected):
+        assert output.dtype == np.float32
+        np.testing.assert_allclose(output, expected_output, atol=atol)
+
+
+def test_inference_model_checks_two_batches(config):
+    model = ModelFactory.get_model("MycoAI-CNN", config)
+    _, encoded_data = model.parse_and_encode_fasta(DATABASE_FASTA)
+    config.inference_backend = "trace"
+    model._optimized = None
+    encoded_batches = []
+
+    def iter_batches(self, encoded_data, batch_size):
+        for rows, x in _MycoAIEmbedModel._iter_batches(self, encoded_data, batch_size):
+            encoded_batches.append(rows)
+            yield rows, x
+
+    model._iter_batches = types.MethodType(iter_batches, model)
+    model._inference_model(encoded_data, batch_size=2)
+    del model._iter_batches
+    assert len(encoded_batches) == 2
+    assert model._optimized is not None
+
+
+# The minimum fraction of sequences whose top-1 prediction of the quantized model is the same as
+# that of the float32 model, at each taxonomy level
+QUANTIZED_TOP1_AGREEMENT = 0.98
+
+
+@pytest.mark.parametrize("model_id", ["MycoAI-CNN", "MycoAI-BERT"])
+def test_quantized_model(config, tmp_path, model_id):
+    model = ModelFactory.get_model(model_id, config)
+    _, encoded_data = model.parse_and_encode_fasta(DATABASE_FASTA)
+    expected = model.infer(encoded_data)
+
+    # keep the quantized copy out of the test data directory
+    (tmp_path / f"{model_id}.pt").symlink_to(DATA_DIR / f"{model_id}.pt")
+    quantized_config = ProjectConfig(mycoai_home=str(tmp_path), quantize="dynamic-int8")
+    quantized_model = ModelFactory.get_model(model_id, quantized_config)
+    assert quantized_model is not model
+    assert (tmp_path / f"{model_id}.dynamic-int8.pt").exists()
+    assert _get_model_memory(quantized_model) < _get_model_memory(model)
+
+    result = quantized_model.infer(encoded_data)
+    for output, expected_output in zip(result, expected):
+        agreement = np.mean(output.argmax(axis=1) == expected_output.argmax(axis=1))
+        assert agreement >= QUANTIZED_TOP1_AGREEMENT
+
+    # the cached quantized copy is loaded instead of quantizing again
+    ModelFactory.evict(model_id)
+    reloaded_model = ModelFactory.get_model(model_id, quantized_config)
+    np.testing.assert_array_equal(reloaded_model.infer(encoded_data)[0], result[0])
@@ -0,0 +1,68 @@
+import threading
+import time
+import pytest
+from taxotagger.pipeline import Pipeline
+
+
+def test_run():
+    pipeline = Pipeline([("double", lambda x: 2 * x), ("square", lambda x: x * x)])
+    assert list(pipeline.run(range(5))) == [0, 4, 16, 36, 64]
+    assert list(pipeline.timings) == ["read", "double", "square", "consume", "total"]
+
+
+def test_run_empty():
+    pipeline = Pipeline([("double", lambda x: 2 * x)])
+    assert list(pipeline.run([])) == []
+
+
+def test_run_stages_overlap():
+    def slow(x):
+        time.sleep(0.05)
+        return x
+
+    pipeline = Pipeline([("a", slow), ("b", slow), ("c", slow)])
+    assert list(pipeline.run(range(10))) == list(range(10))
+    # the stages take 0.5s each, 1.5s in total if run one after another
+    assert pipeline.timings["a"] >= 0.5
+    assert pipeline.timings["total"] < 1.2
+
+
+def test_run_stage_error():
+    def fail(x):
+        if x == 3:
+            raise KeyError("stage error")
+        return x
+
+    with pytest.raises(KeyError, match="stage error"):
+        list(Pipeline([("fail", fail)]).run(range(10)))
+
+
+def test_run_source_error():
+    def source():
+        yield 1
+        raise RuntimeError("source error")
+
+    with pytest.raises(RuntimeError, match="source error"):
+        list(Pipeline([("identity", lambda x: x)]).run(source()))
+
+
+def test_run_backpressure():
+    produced = []
+
+    def source():
+        for i in range(1000):
+            produced.append(i)
+            yield i
+
+    outputs = Pipeline([("identity", lambda x: x)], queue_size=2).run(source())
+    assert next(outputs) == 0
+    time.sleep(0.2)
+    # at most queue_size items wait in each queue, plus one item in each thread
+    assert len(produced) <= 8
+    outputs.close()
+    assert not any(t.name.startswith("pipeline-") for t in threading.enumerate())
+
+
+def test_invalid_queue_size():
+    with pytest.raises(ValueError, match="Invalid queue size"):
+        Pipeline([], queue_size=0)
@@ -0,0 +1,89 @@
+import numpy as np
+import pytest
+from src.taxotagger.embeddings import EmbeddingBatch
+from src.taxotagger.embeddings import l2_normalize
+from src.taxotagger.projection import Projection
+
+
+def make_batch(n=100, n_features=50, rank=5, seed=0):
+    rng = np.random.default_rng(seed)
+    # low-rank non-negative vectors, like the logits of a taxonomy level
+    vectors = np.abs(rng.standard_normal((n, rank)) @ rng.standard_normal((rank, n_features)))
+    metadata = [[f"seq{i}"] + [""] * 8 for i in range(n)]
+    return EmbeddingBatch(metadata, {"species": vectors.astype(np.float32)})
+
+
+def cosine(vectors):
+    vectors = l2_normalize(vectors)
+    return vectors @ vectors.T
+
+
+def test_fit_pca():
+    batch = make_batch()
+    projection = Projection.fit(batch, {"species": 10})
+    assert projection.method == "pca"
+    assert projection.dims == {"species": 10}
+
+    projected = projection.transform(batch)
+    assert projected.vectors["species"].shape == (100, 10)
+    assert projected.vectors["species"].dtype == np.float32
+    assert list(projected.ids) == list(batch.ids)
+
+
+def test_pca_preserves_cosine_of_low_rank_vectors():
+    rng = np.random.default_rng(0)
+    vectors = (rng.standard_normal((100, 5)) @ rng.standard_normal((5, 50))).astype(np.float32)
+    batch = EmbeddingBatch([[f"seq{i}"] + [""] * 8 for i in range(100)], {"species": vectors})
+
+    projected = Projection.fit(batch, {"species": 5}).transform(batch)
+    np.testing.assert_allclose(cosine(projected.vectors["species"]), cosine(vectors), atol=1e-4)
+
+
+def test_fit_random():
+    batch = make_batch()
+    projection = Projection.fit(batch, {"species": 20}, method="random", seed=1)
+    assert projection.dims == {"species": 20}
+    assert projection.transform(batch).vectors["species"].shape == (100, 20)
+    # the random projection is reproducible
+    other = Projection.fit(batch, {"species": 20}, method="random", seed=1)
+    np.testing.assert_array_equal(projection.components["species"], other.components["species"])
+
+
+def test_fit_invalid_method():
+    with pytest.raises(ValueError, match="Invalid projection method"):
+        Projection.fit(make_batch(), {"species": 10}, method="umap")
+
+
+def test_fit_dims_not_smaller():
+    with pytest.warns(UserWarning, match="is not projected"):
+        projection = Projection.fit(make_batch(), {"species": 50})
+    assert projection.dims == {}
+    batch = make_batch()
+    assert projection.transform(batch).vectors["species"].shape == (100, 50)
+
+
+def test_fit_pca_more_components_than_samples():
+    with pytest.warns(UserWarning, match="can fit at most 20 components"):
+        projection = Projection.fit(make_batch(n=20), {"species": 30})
+    assert projection.dims == {"species": 20}
+
+
+def test_save_load(tmp_path):
+    batch = make_batch()
+    projection = Projection.fit(batch, {"species": 10})
+    path = tmp_path / "db.projection.npz"
+    projection.save(path)
+
+    loaded = Projection.load(path)
+    assert loaded.method == "pca"
+    np.testing.assert_array_equal(loaded.components["species"], projection.components["species"])
+    np.testing.assert_array_equal(
+        loaded.transform(batch).vectors["species"], projection.transform(batch).vectors["species"]
+    )
+
+
+def test_load_invalid_method(tmp_path):
+    path = tmp_path / "db.projection.npz"
+    np.savez(path, method=np.array("svd"), species=np.eye(3, dtype=np.float32))
+    with pytest.raises(ValueError, match="Invalid projection method svd"):
+        Projection.load(path)
@@ -0,0 +1,84 @@
+import numpy as np
+import pytest
+from taxotagger.embeddings import EmbeddingBatch
+from taxotagger.sharding import fasta_shards
+from taxotagger.sharding import main
+from taxotagger.sharding import merge_shards
+from taxotagger.sharding import split_cpus
+from taxotagger.utils import iter_fasta
+from . import DATA_DIR
+
+
+DATABASE_FASTA = str(DATA_DIR / "database.fasta")
+
+
+@pytest.mark.parametrize("n_shards", [1, 2, 3, 7, 100])
+def test_fasta_shards(n_shards):
+    shards = fasta_shards(DATABASE_FASTA, n_shards)
+    assert len(shards) == n_shards
+    assert shards[0][0] == 0
+    assert all(end == start for (_, end), (start, _) in zip(shards, shards[1:]))
+
+    records = [
+        record
+        for byte_range in shards
+        for record in iter_fasta(DATABASE_FASTA, byte_range=byte_range)
+    ]
+    assert records == list(iter_fasta(DATABASE_FASTA))
+
+
+def test_fasta_shards_multiline_records(tmp_path):
+    fasta_file = tmp_path / "test.fasta"
+    fasta_file.write_text("text\n>seq1\nAAAA\nCC\n>seq2\nGG>\n>seq3\nTT\n")
+    for n_shards in range(1, 12):
+        records = [
+            record
+            for byte_range in fasta_shards(fasta_file, n_shards)
+            for record in iter_fasta(fasta_file, byte_range=byte_range)
+        ]
+        assert records == [("seq1", "AAAACC"), ("seq2", "GG>"), ("seq3", "TT")]
+
+
+def test_fasta_shards_empty_file(tmp_path):
+    fasta_file = tmp_path / "empty.fasta"
+    fasta_file.touch()
+    assert fasta_shards(fasta_file, 2) == [(0, 0), (0, 0)]
+
+
+def test_fasta_shards_invalid(tmp_path):
+    with pytest.raises(ValueError, match="Invalid number of shards"):
+        fasta_shards(DATABASE_FASTA, 0)
+    gz_file = tmp_path / "test.fasta.gz"
+    gz_file.write_bytes(b"\x1f\x8b")
+    with pytest.raises(ValueError, match="gzip-compressed"):
+        fasta_shards(gz_file, 2)
+
+
+def test_split_cpus():
+    groups = split_cpus(2)
+    assert len(groups) == 2
+    if groups[0] is not None:
+        assert sorted(groups[0] + groups[1]) == sorted(set(groups[0] + groups[1]))
+
+
+def test_merge_shards(tmp_path, capsys):
+    metadata = [[f"seq{i}"] + [""] * 8 for i in range(3)]
+    vectors = np.arange(6, dtype=np.float32).reshape(3, 2)
+    shard_files = [tmp_path / "shard_0.npz", tmp_path / "shard_1.npz"]
+    EmbeddingBatch(metadata[:2], {"phylum": vectors[:2]}).save(shard_files[0])
+    EmbeddingBatch(metadata[2:], {"phylum": vectors[2:]}).save(shard_files[1])
+
+    batch = merge_shards(shard_files)
+    assert list(batch.ids) == ["seq0", "seq1", "seq2"]
+    np.testing.assert_array_equal(batch.vectors["phylum"], vectors)
+
+    output_file = tmp_path / "merged.npz"
+    main(["merge", *map(str, shard_files), "--output", str(output_file)])
+    assert "Merged 3 sequences of 2 shards" in capsys.readouterr().out
+    assert list(EmbeddingBatch.load(output_file).ids) == ["seq0", "seq1", "seq2"]
+
+
+def test_main_shards(capsys):
+    main(["shards", DATABASE_FASTA, "--n-shards", "2"])
+    lines = capsys.readouterr().out.splitlines()
+    assert [line.split("\t")[0] for line in lines] == ["0", "1"]
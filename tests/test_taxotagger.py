@@ -1,7 +1,13 @@
 import os
+import time
+import numpy as np
 import pytest
 from src.taxotagger.config import ProjectConfig
+from src.taxotagger.defaults import TAXONOMY_LEVELS
 from src.taxotagger.taxotagger import TaxoTagger
+from src.taxotagger.utils import iter_fasta
+from src.taxotagger.utils import write_fasta
+from src.taxotagger.vector_stores import NumpyVectorStore
 from . import DATA_DIR
 
 
@@ -34,6 +40,68 @@ def test_embed(taxotagger):
     assert result["phylum"][1]["id"] == "KY106087"
 
 
+@pytest.mark.order(1)
+def test_embed_batch_size(taxotagger):
+    result_single = taxotagger.embed(QUERY_FASTA, MODEL_ID, batch_size=1)
+    result_batched = taxotagger.embed(QUERY_FASTA, MODEL_ID, batch_size=2)
+
+    for taxo_level in result_single:
+        assert len(result_single[taxo_level]) == len(result_batched[taxo_level])
+        for single, batched in zip(result_single[taxo_level], result_batched[taxo_level]):
+            assert single["id"] == batched["id"]
+            assert single["vector"].shape == batched["vector"].shape
+            assert np.allclose(single["vector"], batched["vector"], atol=1e-5)
+
+
+@pytest.mark.order(1)
+def test_embed_as_batch(taxotagger):
+    records = taxotagger.embed(QUERY_FASTA, MODEL_ID)
+    batch = taxotagger.embed(QUERY_FASTA, MODEL_ID, as_batch=True)
+
+    assert list(batch.ids) == ["KY106088", "KY106087"]
+    assert batch.vectors["species"].dtype == np.float32
+    assert batch.vectors["species"].shape == (2, records["species"][0]["vector"].shape[0])
+    assert batch.vectors["species"].flags["C_CONTIGUOUS"]
+    np.testing.assert_allclose(batch.vectors["phylum"][1], records["phylum"][1]["vector"])
+
+
+@pytest.mark.order(1)
+def test_embed_levels(taxotagger):
+    expected = taxotagger.embed(QUERY_FASTA, MODEL_ID, as_batch=True)
+    batch = taxotagger.embed(QUERY_FASTA, MODEL_ID, as_batch=True, levels=["genus", "phylum"])
+
+    assert list(batch.vectors) == ["genus", "phylum"]
+    assert list(batch.ids) == list(expected.ids)
+    for taxo_level in batch.vectors:
+        np.testing.assert_array_equal(batch.vectors[taxo_level], expected.vectors[taxo_level])
+
+    result = taxotagger.embed(QUERY_FASTA, MODEL_ID, levels=["genus"])
+    assert list(result) == ["genus"]
+
+
+@pytest.mark.order(1)
+def test_embed_iter(taxotagger):
+    expected = taxotagger.embed(QUERY_FASTA, MODEL_ID, as_batch=True)
+    chunks = list(taxotagger.embed_iter(QUERY_FASTA, MODEL_ID, chunk_size=1, as_batch=True))
+
+    assert len(chunks) == 2
+    assert [chunk.ids[0] for chunk in chunks] == list(expected.ids)
+    for i, chunk in enumerate(chunks):
+        np.testing.assert_allclose(
+            chunk.vectors["species"][0], expected.vectors["species"][i], atol=1e-5
+        )
+
+
+@pytest.mark.order(1)
+def test_embed_sharded(taxotagger):
+    expected = taxotagger.embed(DATABASE_FASTA, MODEL_ID, as_batch=True)
+    batch = taxotagger.embed_sharded(DATABASE_FASTA, MODEL_ID, n_shards=3, as_batch=True)
+
+    assert list(batch.ids) == list(expected.ids)
+    for taxo_level, vectors in expected.vectors.items():
+        np.testing.assert_allclose(batch.vectors[taxo_level], vectors, atol=1e-5)
+
+
 @pytest.mark.order(3)
 def test_search(taxotagger):
     result = taxotagger.search(QUERY_FASTA, model_id=MODEL_ID, limit=3)
@@ -49,3 +117,232 @@ def test_create_db(taxotagger):
     taxotagger.create_db(DATABASE_FASTA, MODEL_ID)
     expected_output = DATA_DIR / "MycoAI-CNN.db"
     assert expected_output.exists()
+
+
+@pytest.mark.order(4)
+def test_search_reuses_store(config):
+    with TaxoTagger(config) as tagger:
+        tagger.search(QUERY_FASTA, model_id=MODEL_ID, limit=1)
+        db_path = os.path.join(config.mycoai_home, f"{MODEL_ID}.db")
+        store = tagger._get_store(db_path)
+        tagger.search(QUERY_FASTA, model_id=MODEL_ID, limit=1)
+        assert tagger._get_store(db_path) is store
+    assert tagger._stores == {}
+
+
+@pytest.mark.order(4)
+def test_idle_store_is_closed(config):
+    config.db_idle_timeout = 0
+    with TaxoTagger(config) as tagger:
+        db_path = os.path.join(config.mycoai_home, f"{MODEL_ID}.db")
+        store = tagger._get_store(db_path)
+        time.sleep(0.01)
+        assert tagger._get_store(db_path) is not store
+
+
+@pytest.mark.order(4)
+def test_idle_store_is_closed_without_calls(config, tmp_path):
+    config.db_idle_timeout = 0.1
+    with TaxoTagger(config) as tagger:
+        db_path = str(tmp_path / "test.npdb")
+        with tagger._use_store(db_path, NumpyVectorStore):
+            # the store in use is not closed
+            time.sleep(0.3)
+            assert db_path in tagger._stores
+        time.sleep(0.3)
+        assert tagger._stores == {}
+        assert tagger._idle_timer is None
+
+
+@pytest.mark.order(4)
+def test_search_concurrent(taxotagger):
+    expected = taxotagger.search(QUERY_FASTA, model_id=MODEL_ID, limit=3)
+    result = taxotagger.search(QUERY_FASTA, model_id=MODEL_ID, max_workers=6, limit=3)
+
+    assert list(result.keys()) == list(expected.keys())
+    for taxo_level in expected:
+        assert [[hit["id"] for hit in hits] for hits in result[taxo_level]] == [
+            [hit["id"] for hit in hits] for hits in expected[taxo_level]
+        ]
+
+
+@pytest.mark.order(4)
+def test_search_pipeline_chunks(config):
+    expected = TaxoTagger(config).search(QUERY_FASTA, model_id=MODEL_ID, limit=3)
+    config.chunk_size = 1
+    config.pipeline_queue_size = 1
+    result = TaxoTagger(config).search(QUERY_FASTA, model_id=MODEL_ID, limit=3)
+
+    for taxo_level in expected:
+        assert [[hit["id"] for hit in hits] for hits in result[taxo_level]] == [
+            [hit["id"] for hit in hits] for hits in expected[taxo_level]
+        ]
+
+
+@pytest.mark.order(5)
+def test_search_numpy_vector_store(config, tmp_path):
+    expected = TaxoTagger(config).search(QUERY_FASTA, model_id=MODEL_ID, limit=3)
+
+    config.vector_store = "numpy"
+    db_name = str(tmp_path / f"{MODEL_ID}.npdb")
+    with TaxoTagger(config) as tagger:
+        tagger.create_db(DATABASE_FASTA, MODEL_ID, db_name=db_name)
+    # reopen the database from disk
+    with TaxoTagger(config) as tagger:
+        result = tagger.search(QUERY_FASTA, model_id=MODEL_ID, db_name=db_name, limit=3)
+
+    for taxo_level in expected:
+        for hits, expected_hits in zip(result[taxo_level], expected[taxo_level]):
+            assert [hit["id"] for hit in hits] == [hit["id"] for hit in expected_hits]
+            assert [hit["entity"] for hit in hits] == [hit["entity"] for hit in expected_hits]
+            np.testing.assert_allclose(
+                [hit["distance"] for hit in hits],
+                [hit["distance"] for hit in expected_hits],
+                atol=1e-4,
+            )
+
+
+@pytest.mark.order(1)
+def test_embed_with_embedding_cache(config):
+    expected = TaxoTagger(config).embed(QUERY_FASTA, MODEL_ID, as_batch=True)
+
+    config.embedding_cache = True
+    tagger = TaxoTagger(config)
+    first = tagger.embed(QUERY_FASTA, MODEL_ID, as_batch=True)  # fills the cache
+    second = tagger.embed(QUERY_FASTA, MODEL_ID, as_batch=True)  # reads from the cache
+
+    for batch in (first, second):
+        assert list(batch.ids) == list(expected.ids)
+        for taxo_level, vectors in expected.vectors.items():
+            np.testing.assert_allclose(batch.vectors[taxo_level], vectors, atol=1e-5)
+
+
+@pytest.mark.order(1)
+def test_embed_with_embedding_cache_repeated_sequence(tmp_path):
+    # a new cache directory, so the repeated sequence is not in the cache
+    (tmp_path / f"{MODEL_ID}.pt").symlink_to(DATA_DIR / f"{MODEL_ID}.pt")
+    records = list(iter_fasta(QUERY_FASTA))
+    fasta_file = str(tmp_path / "repeated.fasta")
+    write_fasta([*records, ("KY106088_copy", records[0][1])], fasta_file)
+
+    config = ProjectConfig(mycoai_home=str(tmp_path))
+    expected = TaxoTagger(config).embed(fasta_file, MODEL_ID, as_batch=True)
+    assert list(expected.ids) == ["KY106088", "KY106087"]
+
+    config.embedding_cache = True
+    tagger = TaxoTagger(config)
+    first = tagger.embed(fasta_file, MODEL_ID, as_batch=True)  # fills the cache
+    second = tagger.embed(fasta_file, MODEL_ID, as_batch=True)  # reads from the cache
+
+    for batch in (first, second):
+        assert list(batch.ids) == list(expected.ids)
+        for taxo_level, vectors in expected.vectors.items():
+            np.testing.assert_allclose(batch.vectors[taxo_level], vectors, atol=1e-5)
+
+
+@pytest.mark.order(4)
+def test_search_with_search_cache(config):
+    config.search_cache_size = 100
+    tagger = TaxoTagger(config)
+    expected = tagger.search(QUERY_FASTA, model_id=MODEL_ID, limit=3)
+    assert len(tagger._search_cache) == 2 * len(expected)
+
+    result = tagger.search(QUERY_FASTA, model_id=MODEL_ID, limit=3)
+    assert result == expected
+
+    # different search parameters are cached separately
+    tagger.search(QUERY_FASTA, model_id=MODEL_ID, limit=1)
+    assert len(tagger._search_cache) == 4 * len(expected)
+
+
+@pytest.mark.order(4)
+def test_search_with_search_cache_repeated_sequence(config, tmp_path):
+    records = list(iter_fasta(QUERY_FASTA))
+    fasta_file = str(tmp_path / "repeated.fasta")
+    write_fasta([*records, ("KY106088_copy", records[0][1])], fasta_file)
+
+    config.search_cache_size = 100
+    tagger = TaxoTagger(config)
+    expected = tagger.search(fasta_file, model_id=MODEL_ID, limit=3)
+    # the repeated sequence is searched and cached once
+    assert len(tagger._search_cache) == 2 * len(expected)
+    for hits in expected.values():
+        assert len(hits) == 3
+        assert hits[2] == hits[0]
+
+    assert tagger.search(fasta_file, model_id=MODEL_ID, limit=3) == expected
+
+
+@pytest.mark.order(5)
+def test_create_db_invalidates_search_cache(config):
+    config.search_cache_size = 100
+    tagger = TaxoTagger(config)
+    tagger.search(QUERY_FASTA, model_id=MODEL_ID, limit=3)
+    tagger.create_db(DATABASE_FASTA, MODEL_ID)
+    assert len(tagger._search_cache) == 0
+
+
+@pytest.mark.order(6)
+def test_benchmark_index(taxotagger):
+    hnsw = {"index_type": "HNSW", "params": {"M": 8, "efConstruction": 64}}
+    report = taxotagger.benchmark_index(
+        DATABASE_FASTA, QUERY_FASTA, {"species": hnsw}, model_id=MODEL_ID, limit=3
+    )
+    assert list(report.keys()) == TAXONOMY_LEVELS
+    for taxo_level in TAXONOMY_LEVELS:
+        assert 0 <= report[taxo_level]["recall"] <= 1
+        assert report[taxo_level]["latency_ms"] > 0
+    # the FLAT index gives the same results as the baseline
+    assert report["phylum"]["recall"] == 1
+
+
+@pytest.mark.order(6)
+def test_benchmark_precision(taxotagger):
+    report = taxotagger.benchmark_precision(
+        DATABASE_FASTA,
+        QUERY_FASTA,
+        {"genus": "float16", "species": "int8"},
+        model_id=MODEL_ID,
+        limit=3,
+    )
+    assert list(report.keys()) == TAXONOMY_LEVELS
+    for taxo_level, ratio in (("species", 3), ("genus", 1.9)):
+        baseline_size = report[taxo_level]["baseline_index_size_mb"]
+        assert report[taxo_level]["index_size_mb_without_rescoring"] < baseline_size / ratio
+        # the float32 vectors for the rescoring are stored as well
+        assert report[taxo_level]["index_size_mb"] > baseline_size
+    assert report["species"]["recall"] >= report["species"]["recall_without_rescoring"]
+    # the float32 levels give the same results as the baseline
+    assert report["phylum"]["recall"] == 1
+    assert report["phylum"]["index_size_mb"] == report["phylum"]["baseline_index_size_mb"]
+
+
+@pytest.mark.order(6)
+def test_create_db_with_projection(config, tmp_path):
+    config.vector_store = "numpy"
+    db_name = str(tmp_path / f"{MODEL_ID}.npdb")
+    with TaxoTagger(config) as tagger:
+        tagger.create_db(DATABASE_FASTA, MODEL_ID, db_name=db_name, projection_dims={"species": 8})
+        assert os.path.exists(f"{db_name}.projection.npz")
+        result = tagger.search(QUERY_FASTA, model_id=MODEL_ID, db_name=db_name, limit=3)
+        assert tagger._get_store(db_name)._dims["species"] == 8
+    assert all(len(hits) == 3 for hits in result["species"])
+
+    # rebuilding the database without projection removes the projection
+    with TaxoTagger(config) as tagger:
+        tagger.create_db(DATABASE_FASTA, MODEL_ID, db_name=db_name)
+    assert not os.path.exists(f"{db_name}.projection.npz")
+
+
+@pytest.mark.order(6)
+def test_benchmark_projection(taxotagger):
+    report = taxotagger.benchmark_projection(
+        DATABASE_FASTA, QUERY_FASTA, {"species": 8}, model_id=MODEL_ID, limit=3
+    )
+    assert list(report.keys()) == TAXONOMY_LEVELS
+    assert report["species"]["dims"] == 8
+    assert report["species"]["baseline_dims"] == 14742
+    assert 0 <= report["species"]["recall"] <= 1
+    # the levels without projection give the same results as the baseline
+    assert report["phylum"]["recall"] == 1
+    assert report["phylum"]["dims"] == report["phylum"]["baseline_dims"]
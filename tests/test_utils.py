@@ -1,8 +1,15 @@
+import gzip
+import io
 from pathlib import Path
 import pytest
+from taxotagger.utils import _split_fasta_records
 from taxotagger.utils import download_from_url
+from taxotagger.utils import iter_fasta
+from taxotagger.utils import iter_fasta_chunks
 from taxotagger.utils import parse_fasta
 from taxotagger.utils import parse_unite_fasta_header
+from taxotagger.utils import parse_unite_fasta_headers
+from taxotagger.utils import write_fasta
 
 
 ################################################################################
@@ -97,6 +104,39 @@ def test_parse_unite_fasta_header_empty():
     assert result == expected
 
 
+UNITE_HEADERS = [
+    ">MH855962|k__Fungi;p__Basidiomycota;c__Agaricomycetes;o__Corticiales;f__Corticiaceae;g__Waitea;s__Waitea_circinata|SH1011630.09FU",
+    "MH855963|k__Fungi;p__Basidiomycota;c__Agaricomycetes;o__Corticiales;f__Corticiaceae;g__Waitea;s__Waitea_circinata|SH1011630.09FU",
+    "MH855964|k__Fungi;p__Ascomycota;s__Species;g__Genus",
+    "MH855965",
+    ">",
+    ">>MH855966||SH1|extra",
+    "MH855967|k__Fungi;k__Plantae;x__Unknown;s__",
+    "",
+]
+
+
+@pytest.mark.parametrize(
+    "headers",
+    [
+        UNITE_HEADERS,
+        UNITE_HEADERS[:2],
+        # headers with three sections each, the fast path of the parser
+        ["a|k__F;p__P|SH1", ">b|k__F;p__P|SH2", "c||"],
+        # the total number of sections fits three per header, but not each header
+        ["a|k__F|SH1|extra", "b|k__G"],
+        ["a|b|c|d", "e", "f|g"],
+        [],
+    ],
+)
+def test_parse_unite_fasta_headers(headers):
+    expected = [parse_unite_fasta_header(header) for header in headers]
+    result = parse_unite_fasta_headers(headers)
+    assert result.shape == (len(headers), 9)
+    assert result.dtype == object
+    assert result.tolist() == expected
+
+
 ################################################################################
 # Test parse_fasta function
 ################################################################################
@@ -148,3 +188,97 @@ def test_parse_fasta_duplicate_headers():
     fasta_data = ">seq1\nAAATTT\n>seq2\nCCCGGG\n>seq1\nTTTAAA\n"
     with pytest.raises(ValueError, match="Duplicate FASTA header found: `seq1`"):
         parse_fasta(fasta_data)
+
+
+################################################################################
+# Test iter_fasta function
+################################################################################
+
+
+def test_iter_fasta_multiline_sequences():
+    fasta_data = ">seq1 description \r\nAAA TTT\r\nCCC\r\n\r\n>seq2\nGGG\n"
+    result = list(iter_fasta(fasta_data))
+    assert result == [("seq1 description", "AAATTTCCC"), ("seq2", "GGG")]
+
+
+def test_iter_fasta_skips_text_before_first_record():
+    fasta_data = "comment line\nanother > line\n>seq1\nAAATTT\n"
+    assert list(iter_fasta(fasta_data)) == [("seq1", "AAATTT")]
+
+
+def test_iter_fasta_empty(tmp_path):
+    fasta_file = tmp_path / "empty.fasta"
+    fasta_file.touch()
+    assert list(iter_fasta(fasta_file)) == []
+    assert list(iter_fasta("")) == []
+
+
+def test_iter_fasta_gzip(tmp_path):
+    fasta_file = tmp_path / "test.fasta.gz"
+    with gzip.open(fasta_file, "wt") as fh:
+        fh.write(">seq1\nAAATTT\n>seq2\nCCCGGG\n")
+    assert list(iter_fasta(fasta_file)) == [("seq1", "AAATTT"), ("seq2", "CCCGGG")]
+
+
+def test_iter_fasta_binary_file_handle():
+    fh = io.BytesIO(b">seq1\nAAATTT\n>seq2\nCCCGGG\n")
+    assert list(iter_fasta(fh)) == [("seq1", "AAATTT"), ("seq2", "CCCGGG")]
+
+
+def test_iter_fasta_invalid_type():
+    with pytest.raises(TypeError, match="Invalid input data type"):
+        list(iter_fasta(123))
+
+
+@pytest.mark.parametrize("block_size", [1, 2, 3, 5, 8, 100])
+def test_split_fasta_records_across_blocks(block_size):
+    data = b"x>y\n>seq1\nAAAA\nCC\n>seq2\nGG\n"
+    blocks = [data[i : i + block_size] for i in range(0, len(data), block_size)]
+    records = [record.rstrip(b"\n") for record in _split_fasta_records(blocks)]
+    assert records == [b"seq1\nAAAA\nCC", b"seq2\nGG"]
+
+
+################################################################################
+# Test iter_fasta_chunks function
+################################################################################
+
+
+def test_iter_fasta_chunks():
+    fasta_data = ">seq1\nAAATTT\n>seq2\nCCCGGG\n>seq3\nTTTAAA\n"
+    chunks = list(iter_fasta_chunks(fasta_data, chunk_size=2))
+    assert chunks == [[("seq1", "AAATTT"), ("seq2", "CCCGGG")], [("seq3", "TTTAAA")]]
+
+
+def test_iter_fasta_chunks_duplicate_headers_across_chunks():
+    fasta_data = ">seq1\nAAATTT\n>seq2\nCCCGGG\n>seq1\nTTTAAA\n"
+    with pytest.raises(ValueError, match="Duplicate FASTA header found: `seq1`"):
+        list(iter_fasta_chunks(fasta_data, chunk_size=2))
+
+
+def test_write_fasta(tmp_path):
+    fasta_file = tmp_path / "test.fasta"
+    records = [("seq1", "AAATTT"), ("seq2", "CCCGGG")]
+    write_fasta(records, fasta_file)
+    assert fasta_file.read_text() == ">seq1\nAAATTT\n>seq2\nCCCGGG\n"
+    assert parse_fasta(fasta_file) == dict(records)
+
+
+def test_iter_fasta_byte_range(tmp_path):
+    fasta_file = tmp_path / "test.fasta"
+    fasta_file.write_text(">seq1\nAAATTT\n>seq2\nCCCGGG\n>seq3\nTTTAAA\n")
+    assert list(iter_fasta(fasta_file, byte_range=(0, 13))) == [("seq1", "AAATTT")]
+    assert list(iter_fasta(fasta_file, byte_range=(13, 100))) == [
+        ("seq2", "CCCGGG"),
+        ("seq3", "TTTAAA"),
+    ]
+    assert list(iter_fasta(fasta_file, byte_range=(13, 13))) == []
+
+
+def test_iter_fasta_byte_range_invalid(tmp_path):
+    with pytest.raises(ValueError, match="FASTA file"):
+        list(iter_fasta(">seq1\nAAA\n", byte_range=(0, 5)))
+    fasta_file = tmp_path / "test.fasta.gz"
+    with gzip.open(fasta_file, "wt") as fh:
+        fh.write(">seq1\nAAATTT\n")
+    with pytest.raises(ValueError, match="gzip-compressed"):
+        list(iter_fasta(fasta_file, byte_range=(0, 5)))
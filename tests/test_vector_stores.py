@@ -0,0 +1,304 @@
+import numpy as np
+import pytest
+from pymilvus import DataType
+from src.taxotagger.config import ProjectConfig
+from src.taxotagger.defaults import MAX_BATCH_SIZE_BYTES
+from src.taxotagger.defaults import MAX_METADATA_SIZE_BYTES
+from src.taxotagger.defaults import TAXONOMY_LEVELS
+from src.taxotagger.embeddings import EmbeddingBatch
+from src.taxotagger.vector_stores import MilvusVectorStore
+from src.taxotagger.vector_stores import NumpyVectorStore
+from src.taxotagger.vector_stores import VectorStoreFactory
+from src.taxotagger.vector_stores import _quantize
+
+
+DIMS = {taxo_level: 8 for taxo_level in TAXONOMY_LEVELS}
+
+
+def make_batch(n, seed=0, prefix="seq"):
+    rng = np.random.default_rng(seed)
+    metadata = [
+        [f"{prefix}{i}", "Fungi", "p", "c", "o", "f", "g", f"s{i}", f"SH{i}"] for i in range(n)
+    ]
+    vectors = {
+        taxo_level: rng.standard_normal((n, dim)).astype(np.float32)
+        for taxo_level, dim in DIMS.items()
+    }
+    return EmbeddingBatch(metadata, vectors)
+
+
+def exact_top_k(queries, references, k):
+    queries = queries / np.linalg.norm(queries, axis=1, keepdims=True)
+    references = references / np.linalg.norm(references, axis=1, keepdims=True)
+    return np.argsort(-(queries @ references.T), axis=1, kind="stable")[:, :k]
+
+
+def test_get_store(tmp_path):
+    config = ProjectConfig(vector_store="numpy", rescore_factor=2)
+    store = VectorStoreFactory.get_store(str(tmp_path / "test.npdb"), config)
+    assert isinstance(store, NumpyVectorStore)
+    assert store.rescore_factor == 2
+
+
+def test_get_store_class_invalid():
+    with pytest.raises(ValueError, match="Invalid vector store"):
+        VectorStoreFactory.get_store_class("faiss")
+
+
+def test_numpy_store_search(tmp_path):
+    store = NumpyVectorStore(str(tmp_path / "test.npdb"))
+    store.create_collections(DIMS, {})
+    reference = make_batch(50)
+    store.insert(reference)
+    queries = make_batch(5, seed=1, prefix="query")
+
+    results = store.search("species", queries.vectors["species"], ["species"], limit=3)
+
+    expected = exact_top_k(queries.vectors["species"], reference.vectors["species"], 3)
+    assert len(results) == 5
+    for hits, indices in zip(results, expected):
+        assert [hit["id"] for hit in hits] == [f"seq{i}" for i in indices]
+        assert [hit["entity"] for hit in hits] == [{"species": f"s{i}"} for i in indices]
+        distances = [hit["distance"] for hit in hits]
+        assert distances == sorted(distances, reverse=True)
+        assert all(-1 <= d <= 1 for d in distances)
+
+
+def test_numpy_store_search_blocks(tmp_path):
+    store = NumpyVectorStore(str(tmp_path / "test.npdb"))
+    store.query_block_size = 2
+    store.reference_block_size = 7
+    store.create_collections(DIMS, {})
+    # insert in several batches
+    references = [make_batch(20, seed=i, prefix=f"seq{i}_") for i in range(3)]
+    for batch in references:
+        store.insert(batch)
+    queries = make_batch(5, seed=10, prefix="query")
+
+    results = store.search("genus", queries.vectors["genus"], [], limit=4)
+
+    all_vectors = np.concatenate([batch.vectors["genus"] for batch in references])
+    all_ids = np.concatenate([batch.ids for batch in references])
+    expected = exact_top_k(queries.vectors["genus"], all_vectors, 4)
+    assert [[hit["id"] for hit in hits] for hits in results] == all_ids[expected].tolist()
+
+
+def test_numpy_store_limit_larger_than_collection(tmp_path):
+    store = NumpyVectorStore(str(tmp_path / "test.npdb"))
+    store.create_collections(DIMS, {})
+    store.insert(make_batch(3))
+    results = store.search("phylum", make_batch(2).vectors["phylum"], ["phylum"], limit=10)
+    assert [len(hits) for hits in results] == [3, 3]
+    # the query vectors are the reference vectors
+    assert [hits[0]["id"] for hits in results] == ["seq0", "seq1"]
+    assert results[0][0]["distance"] == pytest.approx(1.0, abs=1e-5)
+
+
+def test_numpy_store_persistence(tmp_path):
+    db_path = str(tmp_path / "test.npdb")
+    store = NumpyVectorStore(db_path)
+    store.create_collections(DIMS, {})
+    store.insert(make_batch(10))
+    queries = make_batch(2, seed=1).vectors["class"]
+    expected = store.search("class", queries, ["class", "SH_id"], limit=5)
+    store.close()
+
+    reopened = NumpyVectorStore(db_path)
+    assert reopened.search("class", queries, ["class", "SH_id"], limit=5) == expected
+
+
+def test_numpy_store_memory_mapped(tmp_path):
+    db_path = str(tmp_path / "test.npdb")
+    store = NumpyVectorStore(db_path)
+    store.create_collections(DIMS, {})
+    store.insert(make_batch(10))
+    store.close()
+
+    reopened = NumpyVectorStore(db_path)
+    assert len(reopened) == 10
+    assert isinstance(reopened._normalized["species"], np.memmap)
+    assert isinstance(reopened._columns["id"], np.memmap)
+    np.testing.assert_allclose(
+        np.linalg.norm(reopened._normalized["species"], axis=1), 1, rtol=1e-5
+    )
+    # float32 levels are not stored twice
+    assert reopened._vectors == {}
+    assert not (tmp_path / "test.npdb" / "vectors" / "species.npy").exists()
+
+
+def test_numpy_store_insert_after_reopen(tmp_path):
+    db_path = str(tmp_path / "test.npdb")
+    store = NumpyVectorStore(db_path)
+    store.create_collections(DIMS, {})
+    store.insert(make_batch(5))
+    store.close()
+
+    store = NumpyVectorStore(db_path)
+    store.insert(make_batch(5, seed=1, prefix="new"))
+    store.flush()
+    assert len(store) == 10
+    assert store._columns["id"].tolist() == [f"seq{i}" for i in range(5)] + [
+        f"new{i}" for i in range(5)
+    ]
+
+
+def test_numpy_store_create_collections_replaces(tmp_path):
+    db_path = str(tmp_path / "test.npdb")
+    store = NumpyVectorStore(db_path)
+    store.create_collections(DIMS, {})
+    store.insert(make_batch(5))
+    store.flush()
+    # another process keeps the old version open
+    old = NumpyVectorStore(db_path)
+
+    store.create_collections(DIMS, {})
+    store.insert(make_batch(3, prefix="new"))
+    store.flush()
+    assert len(store) == 3
+    assert store._columns["id"].tolist() == ["new0", "new1", "new2"]
+    assert old._columns["id"].tolist() == [f"seq{i}" for i in range(5)]
+
+
+@pytest.mark.parametrize("dtype", ["float16", "int8"])
+def test_numpy_store_reduced_precision(tmp_path, dtype):
+    db_path = str(tmp_path / "test.npdb")
+    store = NumpyVectorStore(db_path)
+    store.create_collections(DIMS, {}, {"genus": dtype, "species": dtype})
+    reference = make_batch(50)
+    store.insert(reference)
+    store.close()
+
+    reopened = NumpyVectorStore(db_path)
+    assert reopened._normalized["species"].dtype == np.dtype(dtype)
+    assert reopened._normalized["phylum"].dtype == np.float32
+    assert reopened._vectors["species"].dtype == np.float32
+    assert "phylum" not in reopened._vectors
+    # the full precision vectors kept for the rescoring are part of the size on disk
+    assert reopened.index_size("species") > reopened.index_size("phylum")
+    assert ("species" in reopened._scales) == (dtype == "int8")
+
+    # rescoring with the full precision vectors gives the exact similarities
+    results = reopened.search("species", reference.vectors["species"][:5], [], limit=3)
+    expected = exact_top_k(reference.vectors["species"][:5], reference.vectors["species"], 3)
+    assert [[hit["id"] for hit in hits] for hits in results] == [
+        [f"seq{i}" for i in indices] for indices in expected
+    ]
+    assert results[0][0]["distance"] == pytest.approx(1.0, abs=1e-5)
+
+    # without rescoring, the similarities are approximate
+    unscored = NumpyVectorStore(db_path, rescore_factor=1)
+    results = unscored.search("species", reference.vectors["species"][:5], [], limit=1)
+    assert [hits[0]["id"] for hits in results] == [f"seq{i}" for i in range(5)]
+    assert results[0][0]["distance"] == pytest.approx(1.0, abs=2e-2)
+
+
+@pytest.mark.parametrize("dtype", ["float16", "int8"])
+def test_numpy_store_reduced_precision_without_rescoring(tmp_path, dtype):
+    db_path = str(tmp_path / "test.npdb")
+    store = NumpyVectorStore(db_path, rescore_factor=1)
+    store.create_collections(DIMS, {}, {"species": dtype})
+    reference = make_batch(50)
+    store.insert(reference)
+    store.close()
+
+    reopened = NumpyVectorStore(db_path)
+    assert reopened._vectors == {}
+    assert not (tmp_path / "test.npdb" / "vectors" / "species.npy").exists()
+    assert reopened.index_size("species") < reopened.index_size("phylum")
+    # no rescoring without the full precision vectors
+    results = reopened.search("species", reference.vectors["species"][:5], [], limit=1)
+    assert [hits[0]["id"] for hits in results] == [f"seq{i}" for i in range(5)]
+    assert results[0][0]["distance"] == pytest.approx(1.0, abs=2e-2)
+
+
+def test_quantize_int8():
+    rng = np.random.default_rng(0)
+    vectors = rng.standard_normal((10, 32)).astype(np.float32)
+    vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+    quantized, scales = _quantize(vectors, np.dtype(np.int8))
+    assert quantized.dtype == np.int8
+    assert np.abs(quantized).max(axis=1).tolist() == [127] * 10
+    np.testing.assert_allclose(quantized * scales[:, None], vectors, atol=scales.max())
+
+
+def test_numpy_store_insert_without_collections(tmp_path):
+    store = NumpyVectorStore(str(tmp_path / "test.npdb"))
+    with pytest.raises(ValueError, match="call create_collections first"):
+        store.insert(make_batch(1))
+
+
+def test_numpy_store_filter_not_supported(tmp_path):
+    store = NumpyVectorStore(str(tmp_path / "test.npdb"))
+    store.create_collections(DIMS, {})
+    store.insert(make_batch(3))
+    with pytest.raises(ValueError, match="does not support filter"):
+        store.search("phylum", make_batch(1).vectors["phylum"], [], filter='phylum == "p"')
+
+
+def test_numpy_store_remote_uri():
+    with pytest.raises(ValueError, match="only supports local databases"):
+        NumpyVectorStore("http://localhost:19530")
+
+
+def test_get_batch_params_small():
+    data = [np.zeros(18, dtype=np.float32) for _ in range(10)]
+    size_of_data, num_items, items_per_batch = MilvusVectorStore._get_batch_params(data)
+    assert size_of_data == 10 * 18 * 4
+    assert num_items == 10
+    assert items_per_batch == 10
+
+
+def test_get_batch_params_split():
+    vector = np.zeros(14742, dtype=np.float32)
+    data = [{"id": f"seq{i}", "vector": vector, "species": "s"} for i in range(2000)]
+    size_of_data, num_items, items_per_batch = MilvusVectorStore._get_batch_params(data)
+    assert num_items == 2000
+    assert size_of_data > MAX_BATCH_SIZE_BYTES
+    assert items_per_batch < num_items
+    assert items_per_batch * (14742 * 4 + MAX_METADATA_SIZE_BYTES) <= MAX_BATCH_SIZE_BYTES
+
+
+def test_get_batch_params_empty():
+    assert MilvusVectorStore._get_batch_params([]) == (0, 0, 1)
+
+
+def test_create_schema_index_default_flat():
+    res = MilvusVectorStore._create_schema_index(DIMS)
+    for taxo_level in TAXONOMY_LEVELS:
+        _, index_params = res[taxo_level]
+        vector_index = [index for index in index_params if index.field_name == "vector"][0]
+        assert vector_index.index_type == "FLAT"
+
+
+def test_create_schema_index_custom():
+    hnsw = {"index_type": "HNSW", "params": {"M": 16, "efConstruction": 200}}
+    res = MilvusVectorStore._create_schema_index(DIMS, {"species": hnsw})
+    _, index_params = res["species"]
+    vector_index = [index for index in index_params if index.field_name == "vector"][0]
+    assert vector_index.index_type == "HNSW"
+    _, index_params = res["genus"]
+    vector_index = [index for index in index_params if index.field_name == "vector"][0]
+    assert vector_index.index_type == "FLAT"
+
+
+def test_create_schema_index_unsupported_local():
+    with pytest.warns(UserWarning, match="may not be supported by Milvus Lite"):
+        MilvusVectorStore._create_schema_index(DIMS, {"species": {"index_type": "IVF_PQ"}})
+
+
+def test_create_schema_index_float16():
+    res = MilvusVectorStore._create_schema_index(DIMS, vector_dtype={"species": "float16"})
+    schema, _ = res["species"]
+    vector_field = [field for field in schema.fields if field.name == "vector"][0]
+    assert vector_field.dtype == DataType.FLOAT16_VECTOR
+    schema, _ = res["genus"]
+    vector_field = [field for field in schema.fields if field.name == "vector"][0]
+    assert vector_field.dtype == DataType.FLOAT_VECTOR
+
+
+def test_create_schema_index_int8_falls_back_to_float16():
+    with pytest.warns(UserWarning, match="does not support int8"):
+        res = MilvusVectorStore._create_schema_index(DIMS, vector_dtype={"species": "int8"})
+    schema, _ = res["species"]
+    vector_field = [field for field in schema.fields if field.name == "vector"][0]
+    assert vector_field.dtype == DataType.FLOAT16_VECTOR